@@ -1,8 +1,13 @@
 from app.agent.llm import llm_client
 from app.agent.tools import TOOLS
+from app.config import settings
 from app.services.venue_service import VenueService
 from app.services.reservation_service import ReservationService
+from app.services.hold_service import HoldService
+from app.services.waitlist_service import WaitlistService
+from app.services.availability import NoAvailabilityError, slot_floor
 from typing import Dict, Any, List
+from datetime import datetime
 import json
 
 
@@ -26,8 +31,12 @@ SYSTEM_PROMPT = """You are GoodFoods AI, a friendly and helpful restaurant reser
 
 **Tool Usage:**
 - Use search_venues to find restaurants matching user criteria
+- Put restaurant names or features the user mentions (e.g., "that Tandoor place", "rooftop cocktails") in the text parameter of search_venues
 - When user mentions a restaurant name from your recommendations, extract the venue_id from the search results and use get_venue_details
+- Use search_available_venues when the user already gave a date/time and party size; it only returns places with a free table
 - Use check_availability before booking
+- Use hold_table once the user has picked a restaurant, time and party size, then ask for contact details
+- If a time is fully booked, offer join_waitlist as well as other times
 - Use create_reservation only after confirming all details with user
 
 **Important: Handling Restaurant Inquiries:**
@@ -73,6 +82,8 @@ class Agent:
         self.db = db
         self.venue_service = VenueService(db)
         self.reservation_service = ReservationService(db)
+        self.hold_service = HoldService(db)
+        self.waitlist_service = WaitlistService(db)
     
     async def process_message(self, session_id: str, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -100,7 +111,7 @@ class Agent:
                 tool_results.append(result)
                 
                 # Collect venue data for structured response
-                if tool_call["name"] == "search_venues" and result.get("venues"):
+                if tool_call["name"] in ("search_venues", "search_available_venues") and result.get("venues"):
                     venues_data = result["venues"]
             
             # Format response with tool results
@@ -147,14 +158,33 @@ class Agent:
             # Handle optional parameters
             cuisine = arguments.get("cuisine") if arguments.get("cuisine") else None
             city = arguments.get("city") if arguments.get("city") else None
+            text = arguments.get("text") if arguments.get("text") else None
+            # Whole slots, so open-now searches within one share a cache entry
+            open_at = slot_floor(datetime.now()).isoformat() if arguments.get("open_now") else None
             
-            venues = self.venue_service.search_venues(
+            venues = self.venue_service.recommend_venues(
                 cuisine=cuisine,
                 city=city,
+                text=text,
+                open_at=open_at,
                 limit=10
             )
             return {"venues": [self._venue_to_dict(v) for v in venues]}
         
+        elif tool_name == "search_available_venues":
+            venues = self.venue_service.find_available_venues(
+                datetime_str=arguments["datetime"],
+                party_size=arguments["party_size"],
+                cuisine=arguments.get("cuisine") or None,
+                city=arguments.get("city") or None,
+                text=arguments.get("text") or None,
+                limit=10
+            )
+            return {"venues": [
+                {**self._venue_to_dict(v), "remaining_seats": v.remaining_seats}
+                for v in venues
+            ]}
+        
         elif tool_name == "get_venue_details":
             venue = self.venue_service.get_venue(arguments["venue_id"])
             if venue:
@@ -169,22 +199,63 @@ class Agent:
             )
             return {"available": available}
         
+        elif tool_name == "hold_table":
+            try:
+                hold = self.hold_service.create_hold(
+                    session_id=session_id,
+                    venue_id=arguments["venue_id"],
+                    datetime_str=arguments["datetime"],
+                    party_size=arguments["party_size"]
+                )
+            except NoAvailabilityError:
+                return {"message": "Sorry, that time is no longer available. Would you like to try another time?"}
+            except ValueError:
+                return {"error": "Venue not found"}
+            return {
+                "message": f"I'm holding a table for {hold.party_size} for the next {settings.hold_ttl_minutes} minutes. What name, phone number and email should I put the booking under?",
+                "hold_id": hold.id,
+                "expires_at": hold.expires_at.isoformat()
+            }
+        
         elif tool_name == "create_reservation":
-            reservation = self.reservation_service.create_reservation(
-                session_id=session_id,
-                venue_id=arguments["venue_id"],
-                datetime_str=arguments["datetime"],
-                party_size=arguments["party_size"],
-                contact_name=arguments["contact_name"],
-                contact_phone=arguments["contact_phone"],
-                contact_email=arguments["contact_email"],
-                notes=arguments.get("notes")
-            )
+            try:
+                reservation = self.reservation_service.create_reservation(
+                    session_id=session_id,
+                    venue_id=arguments["venue_id"],
+                    datetime_str=arguments["datetime"],
+                    party_size=arguments["party_size"],
+                    contact_name=arguments["contact_name"],
+                    contact_phone=arguments["contact_phone"],
+                    contact_email=arguments["contact_email"],
+                    notes=arguments.get("notes"),
+                    hold_id=arguments.get("hold_id")
+                )
+            except NoAvailabilityError:
+                return {"message": "Sorry, that time is no longer available. Would you like to try another time?"}
             return {
                 "message": f"Reservation confirmed! Your booking ID is {reservation.booking_id}",
                 "reservation": self._reservation_to_dict(reservation)
             }
         
+        elif tool_name == "join_waitlist":
+            try:
+                entry = self.waitlist_service.join_waitlist(
+                    session_id=session_id,
+                    venue_id=arguments["venue_id"],
+                    datetime_str=arguments["datetime"],
+                    party_size=arguments["party_size"],
+                    contact_name=arguments["contact_name"],
+                    contact_phone=arguments["contact_phone"],
+                    contact_email=arguments["contact_email"]
+                )
+            except ValueError as e:
+                return {"message": str(e)}
+            position = self.waitlist_service.position(entry)
+            return {
+                "message": f"You're #{position} on the waitlist. If a table opens up it's booked for you automatically and we'll email you.",
+                "waitlist_id": entry.id
+            }
+        
         return {"error": "Unknown tool"}
     
     def _venue_to_dict(self, venue) -> Dict[str, Any]:
@@ -198,8 +269,8 @@ class Agent:
             "city": venue.city,
             "image": venue.image,
             "tags": venue.tags or [],
-            "distance_km": 2.5,  # Mock distance for now
-            "score": 0.9
+            "distance_km": venue.distance_km,
+            "score": venue.score
         }
     
     def _reservation_to_dict(self, reservation) -> Dict[str, Any]:
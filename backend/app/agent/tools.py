@@ -18,12 +18,53 @@ TOOLS = [
                     "city": {
                         "type": "string",
                         "description": "City or location. Leave empty if not specified."
+                    },
+                    "text": {
+                        "type": "string",
+                        "description": "Free-text keywords matched against restaurant names, descriptions, features and addresses (e.g., 'Tandoor', 'rooftop cocktails'). Leave empty if not specified."
+                    },
+                    "open_now": {
+                        "type": "boolean",
+                        "description": "Only return restaurants that are open right now. Set when the user asks for places open now."
                     }
                 },
                 "required": []
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_available_venues",
+            "description": "Find restaurants that have a free table for a party at a specific date and time, in one step. Use this instead of search_venues plus check_availability when the user already gave a date/time and party size.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "datetime": {
+                        "type": "string",
+                        "description": "Date and time in ISO format (e.g., 2024-12-25T19:00:00)"
+                    },
+                    "party_size": {
+                        "type": "integer",
+                        "description": "Number of people"
+                    },
+                    "cuisine": {
+                        "type": "string",
+                        "description": "Type of cuisine (e.g., Italian, Indian). Leave empty if not specified."
+                    },
+                    "city": {
+                        "type": "string",
+                        "description": "City or location. Leave empty if not specified."
+                    },
+                    "text": {
+                        "type": "string",
+                        "description": "Free-text keywords for names or features. Leave empty if not specified."
+                    }
+                },
+                "required": ["datetime", "party_size"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -66,6 +107,31 @@ TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "hold_table",
+            "description": "Hold a table for a few minutes while collecting the customer's contact details. Use this as soon as the user has picked a restaurant, time and party size; create_reservation then converts the hold.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "venue_id": {
+                        "type": "string",
+                        "description": "The unique ID of the venue"
+                    },
+                    "datetime": {
+                        "type": "string",
+                        "description": "Date and time in ISO format (e.g., 2024-12-25T19:00:00)"
+                    },
+                    "party_size": {
+                        "type": "integer",
+                        "description": "Number of people"
+                    }
+                },
+                "required": ["venue_id", "datetime", "party_size"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -101,6 +167,47 @@ TOOLS = [
                     "notes": {
                         "type": "string",
                         "description": "Special requests or notes"
+                    },
+                    "hold_id": {
+                        "type": "string",
+                        "description": "ID returned by hold_table for this booking, if any"
+                    }
+                },
+                "required": ["venue_id", "datetime", "party_size", "contact_name", "contact_phone", "contact_email"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "join_waitlist",
+            "description": "Put the customer on the waitlist for a restaurant and time that is fully booked. They get a reservation and an email automatically if a table frees up.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "venue_id": {
+                        "type": "string",
+                        "description": "The unique ID of the venue"
+                    },
+                    "datetime": {
+                        "type": "string",
+                        "description": "Date and time in ISO format"
+                    },
+                    "party_size": {
+                        "type": "integer",
+                        "description": "Number of people"
+                    },
+                    "contact_name": {
+                        "type": "string",
+                        "description": "Customer's full name"
+                    },
+                    "contact_phone": {
+                        "type": "string",
+                        "description": "Customer's phone number"
+                    },
+                    "contact_email": {
+                        "type": "string",
+                        "description": "Customer's email address"
                     }
                 },
                 "required": ["venue_id", "datetime", "party_size", "contact_name", "contact_phone", "contact_email"]
@@ -11,6 +11,44 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./goodfoods.db"
     
+    # Venue search
+    venue_index_enabled: bool = True
+    geo_default_radius_km: float = 10.0
+    text_search_candidates: int = 200
+    search_cache_enabled: bool = True
+    search_cache_size: int = 1024
+    search_cache_ttl_seconds: float = 60.0
+    catalog_version_poll_seconds: float = 1.0
+    
+    # Availability
+    slot_minutes: int = 15
+    dining_duration_minutes: int = 90
+    availability_search_candidates: int = 100
+    
+    # Booking writes
+    booking_retry_attempts: int = 5
+    booking_retry_backoff_seconds: float = 0.02
+    sqlite_busy_timeout_ms: int = 5000
+    hold_ttl_minutes: int = 10
+    booking_id_node_lease_seconds: float = 300.0
+    hold_sweep_interval_seconds: float = 60.0
+    waitlist_promotion_scan: int = 50
+    batch_reservation_max_items: int = 500
+    idempotency_ttl_hours: float = 24.0
+    idempotency_cache_size: int = 4096
+    
+    # Reservation reminders
+    reminder_lead_hours: str = "24,2"
+    reminder_batch_size: int = 500
+    reminder_refill_seconds: float = 300.0
+    
+    # Admin export
+    export_batch_size: int = 1000
+    
+    # Venue digests
+    digest_batch_size: int = 1000
+    digest_flush_venues: int = 50
+    
     # API Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
@@ -28,6 +66,24 @@ class Settings(BaseSettings):
     smtp_from_email: str = "noreply@goodfoods.com"
     smtp_from_name: str = "GoodFoods Reservations"
     
+    # SMTP connection pool
+    smtp_start_tls: bool = True
+    smtp_pool_size: int = 4
+    smtp_noop_after_seconds: float = 30.0
+    smtp_max_idle_seconds: float = 240.0
+    smtp_max_messages_per_connection: int = 100
+    smtp_timeout_seconds: float = 30.0
+    
+    # Email outbox
+    email_outbox_workers: int = 4
+    email_outbox_batch_size: int = 50
+    email_outbox_send_batch: int = 20
+    email_outbox_poll_seconds: float = 5.0
+    email_outbox_lease_seconds: float = 300.0
+    email_outbox_max_attempts: int = 8
+    email_outbox_backoff_seconds: float = 30.0
+    email_outbox_backoff_max_seconds: float = 3600.0
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -35,6 +91,10 @@ class Settings(BaseSettings):
     @property
     def cors_origins_list(self) -> List[str]:
         return [origin.strip() for origin in self.cors_origins.split(",")]
+    
+    @property
+    def reminder_lead_minutes(self) -> List[int]:
+        return [round(float(hours) * 60) for hours in self.reminder_lead_hours.split(",") if hours.strip()]
 
 
 settings = Settings()
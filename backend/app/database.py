@@ -1,15 +1,30 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON, Boolean
+from sqlalchemy import create_engine, event, delete, insert, select, update, Column, Integer, String, Float, DateTime, JSON, Boolean, ForeignKey, Index
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.sql import func
 from datetime import datetime
+from typing import Callable, TypeVar
 from app.config import settings
+import random
+import time
 
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
 )
 
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the writer; busy_timeout makes a
+        # writer from another worker wait for the lock instead of failing
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -34,6 +49,70 @@ class Venue(Base):
     email = Column(String)
     description = Column(String)
     is_active = Column(Boolean, default=True)
+    
+    # Not persisted: filled in per request by geo searches, ranking and
+    # availability searches
+    distance_km = None
+    score = None
+    remaining_seats = None
+
+
+class VenueCuisine(Base):
+    """
+    One row per (venue, cuisine), denormalized with is_active and rating so
+    cuisine lookups are answered from the composite index alone
+    """
+    __tablename__ = "venue_cuisines"
+    
+    venue_id = Column(String, ForeignKey("venues.id", ondelete="CASCADE"), primary_key=True)
+    cuisine = Column(String, primary_key=True)  # Normalized (lowercase)
+    is_active = Column(Boolean, nullable=False, default=True)
+    rating = Column(Float, nullable=False, default=0.0)
+
+
+class VenueTag(Base):
+    """
+    One row per (venue, tag), same layout as VenueCuisine
+    """
+    __tablename__ = "venue_tags"
+    
+    venue_id = Column(String, ForeignKey("venues.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)  # Normalized (lowercase)
+    is_active = Column(Boolean, nullable=False, default=True)
+    rating = Column(Float, nullable=False, default=0.0)
+
+
+Index(
+    "ix_venue_cuisines_lookup",
+    VenueCuisine.cuisine, VenueCuisine.is_active, VenueCuisine.rating.desc(), VenueCuisine.venue_id
+)
+Index(
+    "ix_venue_tags_lookup",
+    VenueTag.tag, VenueTag.is_active, VenueTag.rating.desc(), VenueTag.venue_id
+)
+
+
+class AppCounter(Base):
+    """
+    Named counters shared by all workers, plus a few integer settings that
+    stored data depends on (see ensure_occupancy_layout)
+    """
+    __tablename__ = "app_counters"
+    
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class BookingIdNode(Base):
+    """
+    A booking ID node number leased by a running process; a node is only
+    handed out again once its lease has run out
+    """
+    __tablename__ = "booking_id_nodes"
+    
+    node = Column(Integer, primary_key=True, autoincrement=False)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
 
 
 class Reservation(Base):
@@ -53,6 +132,338 @@ class Reservation(Base):
     notes = Column(String)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Position in the changes feed; reassigned on every insert or update
+    change_seq = Column(Integer, index=True)
+
+
+# A session's bookings in (datetime, id) order, which keyset paging walks;
+# status comes last so filtering on it keeps that order
+Index(
+    "ix_reservations_session_datetime_id_status",
+    Reservation.session_id, Reservation.datetime, Reservation.id, Reservation.status
+)
+# Admin listing: walks (datetime, id) newest first; status rides along in the index
+Index(
+    "ix_reservations_datetime_id_status",
+    Reservation.datetime.desc(), Reservation.id.desc(), Reservation.status
+)
+
+
+class ReservationHold(Base):
+    """
+    Seats set aside for a session for a few minutes while it finishes
+    booking. Holds take slot capacity like reservations; the row is deleted
+    when the hold is converted, released or expires.
+    """
+    __tablename__ = "reservation_holds"
+    
+    id = Column(String, primary_key=True)
+    venue_id = Column(String, nullable=False)
+    session_id = Column(String, nullable=False, index=True)
+    datetime = Column(DateTime, nullable=False)
+    party_size = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+def _utcnow() -> datetime:
+    # Column defaults on models with a `datetime` column can't name the class
+    return datetime.utcnow()
+
+
+class WaitlistEntry(Base):
+    """
+    A party waiting for a table at a venue and time that was full; promoted
+    to a reservation when a cancellation frees enough seats
+    """
+    __tablename__ = "waitlist_entries"
+    
+    id = Column(String, primary_key=True)
+    venue_id = Column(String, nullable=False)
+    session_id = Column(String, nullable=False, index=True)
+    datetime = Column(DateTime, nullable=False)
+    party_size = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="waiting")  # waiting, promoted, cancelled
+    contact_name = Column(String, nullable=False)
+    contact_phone = Column(String, nullable=False)
+    contact_email = Column(String, nullable=False)
+    notes = Column(String)
+    reservation_id = Column(String)  # Set on promotion
+    # Set in Python: waiters are served in this order, and server_default
+    # only has second resolution on SQLite
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+
+
+# Serves "who is waiting for this venue and time, oldest first" from the index
+Index(
+    "ix_waitlist_entries_slot",
+    WaitlistEntry.venue_id, WaitlistEntry.datetime, WaitlistEntry.status, WaitlistEntry.created_at
+)
+
+
+class IdempotencyKey(Base):
+    """
+    Response stored for a client-supplied Idempotency-Key, so retries of a
+    request replay it instead of running again
+    """
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)  # "<scope>:<client key>"
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False, default=200)
+    response = Column(JSON, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class EmailOutbox(Base):
+    """
+    An email to send, written in the same transaction as the booking change
+    it reports; background workers deliver it and retry on failure
+    """
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)  # An EmailService.builders key, e.g. reservation_confirmation
+    recipient = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)  # Arguments for the EmailService builder
+    status = Column(String, nullable=False, default="pending")  # pending, sending, sent, skipped, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=_utcnow)
+    claimed_by = Column(String)
+    last_error = Column(String)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    sent_at = Column(DateTime)
+
+
+# Workers pick up due messages: pending ones, and "sending" ones whose lease ran out
+Index("ix_email_outbox_due", EmailOutbox.status, EmailOutbox.next_attempt_at)
+
+
+class ReminderSchedule(Base):
+    """
+    A reminder email due some time before a reservation; handed to the email
+    outbox once due, or cancelled along with the reservation
+    """
+    __tablename__ = "reminder_schedule"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    reservation_id = Column(String, nullable=False, index=True)
+    lead_minutes = Column(Integer, nullable=False)  # How long before the reservation it goes out
+    due_at = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, queued, skipped, cancelled
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    queued_at = Column(DateTime)
+
+
+# The scheduler claims pending reminders in due_at order; the rest never enter the range
+Index("ix_reminder_schedule_due", ReminderSchedule.status, ReminderSchedule.due_at)
+
+
+class SlotOccupancy(Base):
+    """
+    Seats taken per venue per fixed-size time slot, maintained alongside
+    reservations so availability never has to scan them
+    """
+    __tablename__ = "venue_slot_occupancy"
+    
+    venue_id = Column(String, primary_key=True)
+    slot_start = Column(DateTime, primary_key=True)
+    seated = Column(Integer, nullable=False, default=0)
+
+
+def normalize_term(value: str) -> str:
+    return value.strip().lower()
+
+
+def sync_venue_terms(connection, venues):
+    """
+    Rewrite the venue_cuisines / venue_tags rows for the given venues
+    """
+    venues = list(venues)
+    if not venues:
+        return
+    venue_ids = [v.id for v in venues]
+    connection.execute(delete(VenueCuisine).where(VenueCuisine.venue_id.in_(venue_ids)))
+    connection.execute(delete(VenueTag).where(VenueTag.venue_id.in_(venue_ids)))
+    
+    cuisine_rows = []
+    tag_rows = []
+    for v in venues:
+        common = {"venue_id": v.id, "is_active": bool(v.is_active), "rating": v.rating or 0.0}
+        for cuisine in {normalize_term(c) for c in (v.cuisine or [])}:
+            cuisine_rows.append({**common, "cuisine": cuisine})
+        for tag in {normalize_term(t) for t in (v.tags or [])}:
+            tag_rows.append({**common, "tag": tag})
+    
+    if cuisine_rows:
+        connection.execute(insert(VenueCuisine), cuisine_rows)
+    if tag_rows:
+        connection.execute(insert(VenueTag), tag_rows)
+
+
+def bump_counter(connection, name: str, amount: int = 1) -> int:
+    """
+    Increment a counter inside the caller's transaction and return its new value
+    """
+    result = connection.execute(
+        update(AppCounter).where(AppCounter.name == name).values(value=AppCounter.value + amount)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(AppCounter).values(name=name, value=amount))
+    return read_counter(connection, name)
+
+
+def read_counter(connection, name: str) -> int:
+    value = connection.execute(select(AppCounter.value).where(AppCounter.name == name)).scalar()
+    return value or 0
+
+
+# The catalog version changes whenever venues are written, from any process
+# (API workers, seed_data.py, scripts). Caches key on it to spot stale data.
+CATALOG_VERSION = "catalog_version"
+
+# Called as hook(before, after) once a transaction that bumped the catalog
+# version commits
+catalog_commit_hooks = []
+
+
+def _bump_catalog_version(session: Session, connection):
+    after = bump_counter(connection, CATALOG_VERSION)
+    # (version before this transaction's first bump, version after its last)
+    before, _ = session.info.get("catalog_versions", (after - 1, None))
+    session.info["catalog_versions"] = (before, after)
+
+
+@event.listens_for(Venue, "after_insert")
+@event.listens_for(Venue, "after_update")
+def _sync_terms_on_write(mapper, connection, target):
+    sync_venue_terms(connection, [target])
+    Session.object_session(target).info["catalog_dirty"] = True
+
+
+@event.listens_for(Venue, "after_delete")
+def _sync_terms_on_delete(mapper, connection, target):
+    Session.object_session(target).info["catalog_dirty"] = True
+    connection.execute(delete(VenueCuisine).where(VenueCuisine.venue_id == target.id))
+    connection.execute(delete(VenueTag).where(VenueTag.venue_id == target.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _sync_terms_on_bulk_write(state):
+    """
+    Keep term rows in step with UPDATE / DELETE statements against venues
+
+    Covers session.execute(update(Venue)) as well as Query.update() and
+    their delete counterparts. Only the venues the statement touches are
+    rewritten; its WHERE may stop matching once the values change, so their
+    ids are read before it runs.
+    """
+    mapper = state.bind_mapper
+    if not (state.is_update or state.is_delete) or mapper is None or mapper.class_ is not Venue:
+        return
+    session = state.session
+    if isinstance(state.parameters, list):
+        # Bulk write by primary key, one parameter set per venue
+        venue_ids = [params["id"] for params in state.parameters]
+    else:
+        where = state.statement.whereclause
+        ids = select(Venue.id) if where is None else select(Venue.id).where(where)
+        venue_ids = session.execute(ids).scalars().all()
+    result = state.invoke_statement()
+
+    connection = session.connection()
+    for i in range(0, len(venue_ids), 500):
+        chunk = venue_ids[i:i + 500]
+        if state.is_delete:
+            connection.execute(delete(VenueCuisine).where(VenueCuisine.venue_id.in_(chunk)))
+            connection.execute(delete(VenueTag).where(VenueTag.venue_id.in_(chunk)))
+        else:
+            sync_venue_terms(connection, connection.execute(
+                select(Venue.id, Venue.is_active, Venue.rating, Venue.cuisine, Venue.tags)
+                .where(Venue.id.in_(chunk))
+            ))
+    _bump_catalog_version(session, connection)
+    return result
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_catalog_on_flush(session, flush_context):
+    if session.info.pop("catalog_dirty", False):
+        _bump_catalog_version(session, session.connection())
+
+
+@event.listens_for(Session, "after_commit")
+def _catalog_committed(session):
+    session.info.pop("catalog_dirty", None)
+    versions = session.info.pop("catalog_versions", None)
+    if versions:
+        for hook in catalog_commit_hooks:
+            hook(*versions)
+
+
+# Sequence numbers for the reservations changes feed. Allocating one
+# updates the counter row, which stays locked until the transaction ends,
+# so transactions commit in sequence order and a reader that has seen N
+# will never later find a new row below N.
+RESERVATION_CHANGE_SEQ = "reservations_change_seq"
+
+
+def next_change_seqs(connection, count: int) -> range:
+    """
+    Allocate `count` consecutive change sequence numbers
+    """
+    last = bump_counter(connection, RESERVATION_CHANGE_SEQ, amount=count)
+    return range(last - count + 1, last + 1)
+
+
+@event.listens_for(Reservation, "before_insert")
+@event.listens_for(Reservation, "before_update")
+def _stamp_change_seq(mapper, connection, target):
+    target.change_seq = next_change_seqs(connection, 1)[0]
+
+
+@event.listens_for(Session, "after_rollback")
+def _catalog_rolled_back(session):
+    session.info.pop("catalog_dirty", None)
+    session.info.pop("catalog_versions", None)
+
+
+# Postgres serialization failure, deadlock detected, lock not available
+_CONTENTION_SQLSTATES = {"40001", "40P01", "55P03"}
+
+T = TypeVar("T")
+
+
+def is_lock_contention(error: OperationalError) -> bool:
+    """
+    True if the error means "try again", not "this will never work"
+    """
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    if code in _CONTENTION_SQLSTATES:
+        return True
+    # SQLite: "database is locked" / "database table is locked"
+    return "is locked" in str(error.orig)
+
+
+def run_with_retries(db: Session, work: Callable[[], T]) -> T:
+    """
+    Run a unit of work that ends in commit, retrying it on lock contention
+
+    The session is rolled back after any failure, so `work` always starts
+    from a clean transaction. Retries back off exponentially with jitter.
+    """
+    attempts = max(1, settings.booking_retry_attempts)
+    for attempt in range(attempts):
+        try:
+            return work()
+        except OperationalError as error:
+            db.rollback()
+            if attempt + 1 >= attempts or not is_lock_contention(error):
+                raise
+            time.sleep(settings.booking_retry_backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5))
+        except Exception:
+            db.rollback()
+            raise
 
 
 def get_db():
@@ -64,4 +475,11 @@ def get_db():
 
 
 def init_db():
+    from app.migrations import run_migrations
+    from app.services.availability import ensure_occupancy_layout
+    
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with engine.begin() as connection:
+        ensure_occupancy_layout(connection)
+
@@ -2,7 +2,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.database import init_db
-from app.routers import agent, reservations
+from app.routers import agent, reservations, venues
+from app.services.booking_ids import booking_ids
+from app.services.email_outbox import email_outbox
+from app.services.hold_service import hold_sweeper
+from app.services.reminders import reminder_scheduler
 
 app = FastAPI(
     title="GoodFoods API",
@@ -17,16 +21,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
 
 # Initialize database
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    booking_ids.start()
+    hold_sweeper.start()
+    email_outbox.start()
+    reminder_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await hold_sweeper.stop()
+    await reminder_scheduler.stop()
+    await email_outbox.stop()
+    booking_ids.stop()
 
 # Include routers
 app.include_router(agent.router, prefix="/api/agent", tags=["agent"])
 app.include_router(reservations.router, prefix="/api/reservations", tags=["reservations"])
+app.include_router(venues.router, prefix="/api/venues", tags=["venues"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,182 @@
+"""
+Lightweight, idempotent schema migrations
+
+`Base.metadata.create_all` only creates missing tables, so anything that
+touches existing tables or data lives here. Each migration runs once and is
+recorded in the schema_migrations table.
+"""
+from sqlalchemy import Column, DateTime, MetaData, String, Table, bindparam, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import func
+from app.database import (
+    CATALOG_VERSION, RESERVATION_CHANGE_SEQ, AppCounter, ReminderSchedule, Reservation, Venue,
+    next_change_seqs, sync_venue_terms
+)
+from app.services.reminders import reminder_rows
+from datetime import datetime
+
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+
+def _backfill_venue_terms(connection):
+    """
+    Populate venue_cuisines / venue_tags from the JSON columns
+    """
+    columns = select(Venue.id, Venue.cuisine, Venue.tags, Venue.rating, Venue.is_active)
+    last_id = ""
+    while True:
+        batch = connection.execute(
+            columns.where(Venue.id > last_id).order_by(Venue.id).limit(1000)
+        ).all()
+        if not batch:
+            break
+        sync_venue_terms(connection, batch)
+        last_id = batch[-1].id
+
+
+def _create_venues_fts(connection):
+    """
+    FTS5 index over venue name, description, tags and address (SQLite only)
+
+    External-content table keyed on venues.rowid, kept in sync by triggers.
+    venues has a string primary key, so a VACUUM may renumber rowids; run
+    `INSERT INTO venues_fts(venues_fts) VALUES('rebuild')` afterwards.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    columns = "name, description, tags, address"
+    new_values = "new.name, new.description, new.tags, new.address"
+    old_values = "old.name, old.description, old.tags, old.address"
+    for statement in [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS venues_fts USING fts5(
+            {columns}, content='venues', content_rowid='rowid', tokenize='porter unicode61'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS venues_fts_ai AFTER INSERT ON venues BEGIN
+            INSERT INTO venues_fts(rowid, {columns}) VALUES (new.rowid, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS venues_fts_ad AFTER DELETE ON venues BEGIN
+            INSERT INTO venues_fts(venues_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS venues_fts_au AFTER UPDATE ON venues BEGIN
+            INSERT INTO venues_fts(venues_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO venues_fts(rowid, {columns}) VALUES (new.rowid, {new_values});
+        END""",
+        "INSERT INTO venues_fts(venues_fts) VALUES ('rebuild')",
+    ]:
+        connection.execute(text(statement))
+
+
+def _seed_catalog_version(connection):
+    """
+    Create the catalog version counter row up front so bumps never race on insert
+    """
+    exists = connection.execute(select(AppCounter.name).where(AppCounter.name == CATALOG_VERSION)).first()
+    if not exists:
+        connection.execute(AppCounter.__table__.insert().values(name=CATALOG_VERSION, value=0))
+
+
+def _backfill_slot_occupancy(connection):
+    from app.services.availability import rebuild_occupancy
+    rebuild_occupancy(connection)
+
+
+LISTING_INDEXES = {"ix_reservations_session_datetime_id_status", "ix_reservations_datetime_id_status"}
+
+
+def _create_reservation_indexes(connection):
+    """
+    create_all() doesn't add new indexes to an existing reservations table
+    """
+    for index in Reservation.__table__.indexes:
+        if index.name in LISTING_INDEXES:
+            index.create(connection, checkfirst=True)
+
+
+def _add_reservation_change_seq(connection):
+    """
+    Add reservations.change_seq and number existing rows by (updated_at, id)
+    """
+    columns = {c["name"] for c in inspect(connection).get_columns("reservations")}
+    if "change_seq" not in columns:
+        connection.execute(text("ALTER TABLE reservations ADD COLUMN change_seq INTEGER"))
+    
+    exists = connection.execute(select(AppCounter.name).where(AppCounter.name == RESERVATION_CHANGE_SEQ)).first()
+    if not exists:
+        connection.execute(AppCounter.__table__.insert().values(name=RESERVATION_CHANGE_SEQ, value=0))
+    
+    stamp = (
+        update(Reservation.__table__)
+        .where(Reservation.__table__.c.id == bindparam("b_id"))
+        .values(change_seq=bindparam("b_change_seq"))
+    )
+    while True:
+        batch = connection.execute(
+            select(Reservation.id)
+            .where(Reservation.change_seq.is_(None))
+            .order_by(Reservation.updated_at, Reservation.id)
+            .limit(1000)
+        ).scalars().all()
+        if not batch:
+            break
+        connection.execute(stamp, [
+            {"b_id": reservation_id, "b_change_seq": change_seq}
+            for reservation_id, change_seq in zip(batch, next_change_seqs(connection, len(batch)))
+        ])
+    for index in Reservation.__table__.indexes:
+        if index.name == "ix_reservations_change_seq":
+            index.create(connection, checkfirst=True)
+
+
+def _backfill_reminder_schedule(connection):
+    """
+    Schedule reminders for confirmed reservations booked before reminders existed
+    """
+    now = datetime.now()  # Reservation times are local, see reminder_rows
+    after = None
+    while True:
+        statement = (
+            select(Reservation.id, Reservation.datetime)
+            .where(Reservation.status == "confirmed", Reservation.datetime > now)
+            .order_by(Reservation.id)
+            .limit(1000)
+        )
+        if after is not None:
+            statement = statement.where(Reservation.id > after)
+        batch = connection.execute(statement).all()
+        if not batch:
+            break
+        rows = reminder_rows(batch, now)
+        if rows:
+            connection.execute(ReminderSchedule.__table__.insert(), rows)
+        after = batch[-1].id
+
+
+MIGRATIONS = [
+    ("0001_venue_terms_backfill", _backfill_venue_terms),
+    ("0002_venues_fts", _create_venues_fts),
+    ("0003_catalog_version_counter", _seed_catalog_version),
+    ("0004_slot_occupancy_backfill", _backfill_slot_occupancy),
+    ("0005_reservation_listing_indexes", _create_reservation_indexes),
+    ("0006_reservation_change_seq", _add_reservation_change_seq),
+    ("0007_reminder_schedule_backfill", _backfill_reminder_schedule),
+]
+
+
+def run_migrations(engine: Engine):
+    _metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+        for version, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f"Applying migration {version}...")
+            migrate(connection)
+            connection.execute(schema_migrations.insert().values(version=version))
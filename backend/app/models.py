@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -36,6 +36,10 @@ class RecommendRequest(BaseModel):
     datetime: Optional[str] = None
     party_size: Optional[int] = None
     prefs: Optional[Dict[str, Any]] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_km: Optional[float] = None
+    text: Optional[str] = None
 
 
 # Reservation Models
@@ -46,13 +50,46 @@ class ContactInfo(BaseModel):
 
 
 class CreateReservationRequest(BaseModel):
+    venue_id: str
+    datetime: str
+    party_size: int = Field(ge=1)
+    contact: ContactInfo
+    notes: Optional[str] = None
+    hold_id: Optional[str] = None
+
+
+class HoldRequest(BaseModel):
+    venue_id: str
+    datetime: str
+    party_size: int = Field(ge=1)
+
+
+class HoldResponse(BaseModel):
+    id: str
     venue_id: str
     datetime: str
     party_size: int
+    expires_at: str
+
+
+class JoinWaitlistRequest(BaseModel):
+    venue_id: str
+    datetime: str
+    party_size: int = Field(ge=1)
     contact: ContactInfo
     notes: Optional[str] = None
 
 
+class WaitlistResponse(BaseModel):
+    id: str
+    venue_id: str
+    datetime: str
+    party_size: int
+    status: str
+    position: Optional[int] = None  # Place in line while waiting
+    reservation_id: Optional[str] = None  # Set once promoted
+
+
 class ReservationResponse(BaseModel):
     id: str
     venue_id: str
@@ -65,6 +102,23 @@ class ReservationResponse(BaseModel):
     booking_id: str
 
 
+class BatchReservationRequest(BaseModel):
+    items: List[CreateReservationRequest]
+
+
+class BatchReservationItemResult(BaseModel):
+    index: int
+    success: bool
+    reservation: Optional[ReservationResponse] = None
+    error: Optional[str] = None
+
+
+class BatchReservationResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchReservationItemResult]
+
+
 # Venue Models
 class VenueResponse(BaseModel):
     id: str
@@ -34,11 +34,17 @@ async def recommend_venues(request: RecommendRequest, db: Session = Depends(get_
         from app.services.venue_service import VenueService
         venue_service = VenueService(db)
         
-        venues = venue_service.search_venues(
+        venues = venue_service.recommend_venues(
             cuisine=request.cuisine,
             city=request.city,
             party_size=request.party_size,
-            price_tier=request.prefs.get("price_tier") if request.prefs else None
+            price_tier=request.prefs.get("price_tier") if request.prefs else None,
+            prefs=request.prefs,
+            latitude=request.latitude,
+            longitude=request.longitude,
+            radius_km=request.radius_km,
+            text=request.text,
+            open_at=request.datetime
         )
         
         venues_data = [
@@ -52,8 +58,8 @@ async def recommend_venues(request: RecommendRequest, db: Session = Depends(get_
                 "city": v.city,
                 "image": v.image,
                 "tags": v.tags or [],
-                "distance_km": 2.5,
-                "score": 0.9
+                "distance_km": v.distance_km,
+                "score": v.score
             }
             for v in venues
         ]
@@ -62,3 +68,12 @@ async def recommend_venues(request: RecommendRequest, db: Session = Depends(get_
     except Exception as e:
         print(f"Recommendation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search-cache/stats")
+async def search_cache_stats():
+    """
+    Hit/miss counters of the venue search result cache
+    """
+    from app.services.venue_service import search_cache
+    return search_cache.stats()
@@ -1,20 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import CreateReservationRequest, ReservationResponse, ContactInfo
-from app.services.reservation_service import ReservationService
+from typing import Iterator, List, Optional
+from app.database import SessionLocal, get_db
+from app.models import (
+    CreateReservationRequest, ReservationResponse, ContactInfo, HoldRequest, HoldResponse,
+    JoinWaitlistRequest, WaitlistResponse, BatchReservationRequest, BatchReservationItemResult,
+    BatchReservationResponse
+)
+from app.config import settings
+from app.services.availability import NoAvailabilityError, parse_datetime
+from app.services.hold_service import HoldService
+from app.services.idempotency import StoredResponse, fingerprint, idempotency_store
+from app.services.reservation_service import EXPORT_COLUMNS, ReservationService
+from app.services.waitlist_service import WaitlistService
+from datetime import datetime
+import csv
+import io
+import json
 
 router = APIRouter()
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _reservation_response(r) -> ReservationResponse:
+    return ReservationResponse(
+        id=r.id,
+        venue_id=r.venue_id,
+        venue_name=r.venue_name,
+        datetime=r.datetime.isoformat(),
+        party_size=r.party_size,
+        status=r.status,
+        contact=ContactInfo(
+            name=r.contact_name,
+            phone=r.contact_phone,
+            email=r.contact_email
+        ),
+        notes=r.notes,
+        booking_id=r.booking_id
+    )
+
+
+def _admin_reservation(r) -> dict:
+    # Validate email before adding
+    email = r.contact_email if '@' in r.contact_email else 'invalid@example.com'
+    
+    return {
+        "id": r.id,
+        "venue_id": r.venue_id,
+        "venue_name": r.venue_name,
+        "datetime": r.datetime.isoformat(),
+        "party_size": r.party_size,
+        "status": r.status,
+        "contact": {
+            "name": r.contact_name,
+            "phone": r.contact_phone,
+            "email": email
+        },
+        "notes": r.notes,
+        "booking_id": r.booking_id
+    }
+
+
+def _replay(stored: StoredResponse, request_hash: str) -> JSONResponse:
+    if stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    return JSONResponse(
+        status_code=stored.status_code,
+        content=stored.body,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
 
 @router.post("/create", response_model=ReservationResponse)
 async def create_reservation(
     request: CreateReservationRequest,
     session_id: str = Query(default="default_session"),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
     """
     Create a new reservation
+    
+    With an Idempotency-Key header, retries of the same request return the
+    original response instead of booking again.
     """
     try:
         # Get session ID from query parameter or use default
@@ -22,8 +98,172 @@ async def create_reservation(
             # Try to get from request body if available
             session_id = getattr(request, 'session_id', 'default_session')
         
+        on_booked = None
+        if idempotency_key:
+            key = f"create:{session_id}:{idempotency_key}"
+            request_hash = fingerprint(request.model_dump())
+            stored = idempotency_store.lookup(db, key)
+            if stored is not None:
+                return _replay(stored, request_hash)
+            
+            def record_response(reservation):
+                idempotency_store.record(
+                    db, key, request_hash, _reservation_response(reservation).model_dump()
+                )
+            on_booked = record_response
+        
+        service = ReservationService(db)
+        try:
+            reservation = service.create_reservation(
+                session_id=session_id,
+                venue_id=request.venue_id,
+                datetime_str=request.datetime,
+                party_size=request.party_size,
+                contact_name=request.contact.name,
+                contact_phone=request.contact.phone,
+                contact_email=request.contact.email,
+                notes=request.notes,
+                hold_id=request.hold_id,
+                on_booked=on_booked
+            )
+        except IntegrityError:
+            # A concurrent retry with the same key committed first
+            stored = idempotency_store.lookup(db, key) if idempotency_key else None
+            if stored is None:
+                raise
+            return _replay(stored, request_hash)
+        
+        return _reservation_response(reservation)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NoAvailabilityError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        print(f"Reservation creation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_model=BatchReservationResponse)
+async def create_reservations_batch(
+    request: BatchReservationRequest,
+    session_id: str = Query(default="default_session"),
+    db: Session = Depends(get_db)
+):
+    """
+    Create many reservations in one transaction, with a result per item
+    """
+    if len(request.items) > settings.batch_reservation_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.batch_reservation_max_items} reservations per batch"
+        )
+    try:
         service = ReservationService(db)
-        reservation = service.create_reservation(
+        results = service.create_reservations_batch(
+            session_id=session_id,
+            items=[
+                dict(
+                    venue_id=item.venue_id,
+                    datetime_str=item.datetime,
+                    party_size=item.party_size,
+                    contact_name=item.contact.name,
+                    contact_phone=item.contact.phone,
+                    contact_email=item.contact.email,
+                    notes=item.notes
+                )
+                for item in request.items
+            ]
+        )
+        items = [
+            BatchReservationItemResult(
+                index=index,
+                success=result.reservation is not None,
+                reservation=_reservation_response(result.reservation) if result.reservation else None,
+                error=result.error
+            )
+            for index, result in enumerate(results)
+        ]
+        created = sum(item.success for item in items)
+        return BatchReservationResponse(created=created, failed=len(items) - created, results=items)
+    except Exception as e:
+        print(f"Batch reservation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/holds", response_model=HoldResponse)
+async def create_hold(
+    request: HoldRequest,
+    session_id: str = Query(default="default_session"),
+    db: Session = Depends(get_db)
+):
+    """
+    Hold seats for a few minutes; pass the hold ID to /create to convert it
+    """
+    try:
+        hold = HoldService(db).create_hold(
+            session_id=session_id,
+            venue_id=request.venue_id,
+            datetime_str=request.datetime,
+            party_size=request.party_size
+        )
+        return HoldResponse(
+            id=hold.id,
+            venue_id=hold.venue_id,
+            datetime=hold.datetime.isoformat(),
+            party_size=hold.party_size,
+            expires_at=hold.expires_at.isoformat()
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except NoAvailabilityError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        print(f"Hold creation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/holds/{hold_id}")
+async def release_hold(hold_id: str, db: Session = Depends(get_db)):
+    """
+    Release a hold before it expires
+    """
+    try:
+        if not HoldService(db).release_hold(hold_id):
+            raise HTTPException(status_code=404, detail="Hold not found")
+        return {"success": True, "released_id": hold_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Hold release error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _waitlist_response(service: WaitlistService, entry) -> WaitlistResponse:
+    return WaitlistResponse(
+        id=entry.id,
+        venue_id=entry.venue_id,
+        datetime=entry.datetime.isoformat(),
+        party_size=entry.party_size,
+        status=entry.status,
+        position=service.position(entry) if entry.status == "waiting" else None,
+        reservation_id=entry.reservation_id
+    )
+
+
+@router.post("/waitlist", response_model=WaitlistResponse)
+async def join_waitlist(
+    request: JoinWaitlistRequest,
+    session_id: str = Query(default="default_session"),
+    db: Session = Depends(get_db)
+):
+    """
+    Wait for a table at a full venue and time
+    """
+    try:
+        service = WaitlistService(db)
+        entry = service.join_waitlist(
             session_id=session_id,
             venue_id=request.venue_id,
             datetime_str=request.datetime,
@@ -33,66 +273,74 @@ async def create_reservation(
             contact_email=request.contact.email,
             notes=request.notes
         )
-        
-        return ReservationResponse(
-            id=reservation.id,
-            venue_id=reservation.venue_id,
-            venue_name=reservation.venue_name,
-            datetime=reservation.datetime.isoformat(),
-            party_size=reservation.party_size,
-            status=reservation.status,
-            contact=ContactInfo(
-                name=reservation.contact_name,
-                phone=reservation.contact_phone,
-                email=reservation.contact_email
-            ),
-            notes=reservation.notes,
-            booking_id=reservation.booking_id
-        )
+        return _waitlist_response(service, entry)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Reservation creation error: {e}")
+        print(f"Waitlist join error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/waitlist/{entry_id}", response_model=WaitlistResponse)
+async def get_waitlist_entry(entry_id: str, db: Session = Depends(get_db)):
+    """
+    Status of a waitlist entry and its place in line
+    """
+    service = WaitlistService(db)
+    entry = service.get_entry(entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+    return _waitlist_response(service, entry)
+
+
+@router.delete("/waitlist/{entry_id}")
+async def leave_waitlist(entry_id: str, db: Session = Depends(get_db)):
+    """
+    Leave the waitlist
+    """
+    if not WaitlistService(db).leave_waitlist(entry_id):
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+    return {"success": True, "cancelled_id": entry_id}
+
+
 @router.get("/", response_model=list[ReservationResponse])
 async def get_reservations(
+    response: Response,
     session_id: str = Query(default="default_session"),
+    limit: Optional[int] = Query(default=None, ge=1),
+    cursor: Optional[str] = Query(default=None),
     db: Session = Depends(get_db)
 ):
     """
-    Get all reservations for a session
+    Get reservations for a session, newest first
+    
+    With a limit, the X-Next-Cursor header carries the cursor for the next
+    page while there is one.
     """
     try:
         service = ReservationService(db)
-        reservations = service.get_reservations(session_id)
+        page = service.get_reservations(session_id, limit=limit, cursor=cursor)
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
         
         return [
-            ReservationResponse(
-                id=r.id,
-                venue_id=r.venue_id,
-                venue_name=r.venue_name,
-                datetime=r.datetime.isoformat(),
-                party_size=r.party_size,
-                status=r.status,
-                contact=ContactInfo(
-                    name=r.contact_name,
-                    phone=r.contact_phone,
-                    email=r.contact_email
-                ),
-                notes=r.notes,
-                booking_id=r.booking_id
-            )
-            for r in reservations
+            _reservation_response(r)
+            for r in page.items
         ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Get reservations error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/{reservation_id}/cancel")
-async def cancel_reservation(reservation_id: str, db: Session = Depends(get_db)):
+async def cancel_reservation(
+    reservation_id: str,
+    db: Session = Depends(get_db)
+):
     """
-    Cancel a reservation
+    Cancel a reservation, promoting waitlisted parties into the freed seats
     """
     try:
         service = ReservationService(db)
@@ -111,43 +359,133 @@ async def cancel_reservation(reservation_id: str, db: Session = Depends(get_db))
 
 @router.get("/admin")
 async def get_all_reservations_admin(
-    limit: int = Query(default=100),
+    response: Response,
+    limit: int = Query(default=100, ge=1),
+    cursor: Optional[str] = Query(default=None),
     db: Session = Depends(get_db)
 ):
     """
     Get all reservations (admin view)
-    Returns recent reservations across all sessions
+    Returns recent reservations across all sessions; pass the X-Next-Cursor
+    header of a response as `cursor` for the page after it
     """
     try:
         service = ReservationService(db)
-        reservations = service.get_all_reservations(limit=limit)
+        page = service.get_all_reservations(limit=limit, cursor=cursor)
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
         
         result = []
-        for r in reservations:
+        for r in page.items:
             try:
-                # Validate email before adding
-                email = r.contact_email if '@' in r.contact_email else 'invalid@example.com'
-                
-                result.append({
-                    "id": r.id,
-                    "venue_id": r.venue_id,
-                    "venue_name": r.venue_name,
-                    "datetime": r.datetime.isoformat(),
-                    "party_size": r.party_size,
-                    "status": r.status,
-                    "contact": {
-                        "name": r.contact_name,
-                        "phone": r.contact_phone,
-                        "email": email
-                    },
-                    "notes": r.notes,
-                    "booking_id": r.booking_id
-                })
+                result.append(_admin_reservation(r))
             except Exception as e:
                 print(f"Skipping invalid reservation {r.id}: {e}")
                 continue
         
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Admin reservations error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/admin/changes")
+async def get_reservation_changes(
+    since: Optional[str] = Query(default=None, description="Cursor from the previous poll"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Reservations created, cancelled or modified since the last poll
+    
+    Start without `since` to read every change from the beginning, then
+    send back the returned cursor each time. Poll again right away while
+    has_more is true.
+    """
+    try:
+        batch = ReservationService(db).get_changes(since=since, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "changes": [
+            {
+                **_admin_reservation(r),
+                "updated_at": r.updated_at.isoformat() if r.updated_at else None,
+                "change_seq": r.change_seq
+            }
+            for r in batch.rows
+        ],
+        "cursor": batch.cursor,
+        "has_more": batch.has_more
+    }
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _export_chunks(
+    export_format: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    statuses: Optional[List[str]]
+) -> Iterator[str]:
+    """
+    One chunk of NDJSON or CSV per batch of rows
+    
+    Runs after the endpoint has returned, so it opens its own session
+    rather than borrowing the request's.
+    """
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == "csv":
+            writer.writerow(EXPORT_FIELDS)
+        
+        for batch in ReservationService(db).export_reservations(start=start, end=end, statuses=statuses):
+            for row in batch:
+                values = [_export_value(value) for value in row]
+                if export_format == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+@router.get("/admin/export")
+async def export_reservations_admin(
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[str] = Query(default=None, description="ISO date/datetime, inclusive"),
+    end: Optional[str] = Query(default=None, description="ISO date/datetime, exclusive"),
+    status: Optional[str] = Query(default=None, description="Comma-separated statuses")
+):
+    """
+    Export reservations as NDJSON or CSV, streamed
+    
+    Rows are read in batches through a server-side cursor and written out
+    as they arrive, so an export of any size uses flat memory.
+    """
+    try:
+        start_datetime = parse_datetime(start) if start else None
+        end_datetime = parse_datetime(end) if end else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+    
+    return StreamingResponse(
+        _export_chunks(format, start_datetime, end_datetime, statuses),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="reservations.{format}"'}
+    )
@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import get_db, Venue
+from app.services.availability import AvailabilityEngine
+from app.services.venue_service import VenueService
+from datetime import date
+from typing import Optional
+
+router = APIRouter()
+
+MAX_CALENDAR_DAYS = 31
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@router.get("/search")
+async def search_venues(
+    response: Response,
+    cuisine: Optional[str] = Query(default=None),
+    city: Optional[str] = Query(default=None),
+    party_size: Optional[int] = Query(default=None, ge=1),
+    price_tier: Optional[int] = Query(default=None, ge=1, le=4),
+    tags: Optional[str] = Query(default=None, description="Comma-separated tags, all required"),
+    open_at: Optional[str] = Query(default=None, description="Only venues open at this ISO datetime"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None),
+    db: Session = Depends(get_db)
+):
+    """
+    Browse venues matching the filters, best rated first
+    
+    The X-Next-Cursor header carries the cursor for the next page while
+    there is one.
+    """
+    try:
+        page = VenueService(db).search_venues_page(
+            limit=limit,
+            cursor=cursor,
+            cuisine=cuisine,
+            city=city,
+            party_size=party_size,
+            price_tier=price_tier,
+            tags=[t.strip() for t in tags.split(",") if t.strip()] if tags else None,
+            open_at=open_at
+        )
+        if page.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+        
+        return {
+            "venues": [
+                {
+                    "id": v.id,
+                    "name": v.name,
+                    "cuisine": v.cuisine,
+                    "rating": v.rating,
+                    "capacity": v.capacity,
+                    "price_tier": v.price_tier,
+                    "city": v.city,
+                    "image": v.image,
+                    "tags": v.tags or []
+                }
+                for v in page.items
+            ]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Venue search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/availability")
+async def get_availability_calendar(
+    venue_ids: str = Query(..., description="Comma-separated venue IDs"),
+    start: date = Query(..., description="First day (YYYY-MM-DD)"),
+    days: int = Query(default=7, ge=1, le=MAX_CALENDAR_DAYS),
+    db: Session = Depends(get_db)
+):
+    """
+    Remaining capacity for every bookable slot over a date range
+    
+    Each slot reports the seats still free for a booking starting then and
+    lasting the configured dining duration.
+    """
+    try:
+        ids = [v.strip() for v in venue_ids.split(",") if v.strip()]
+        venues = db.query(Venue).filter(Venue.id.in_(ids), Venue.is_active == True).all()
+        if not venues:
+            raise HTTPException(status_code=404, detail="Venue not found")
+        
+        calendar = AvailabilityEngine(db).calendar(venues, start, days)
+        
+        return {
+            "slot_minutes": settings.slot_minutes,
+            "dining_duration_minutes": settings.dining_duration_minutes,
+            "venues": [
+                {
+                    "venue_id": v.id,
+                    "capacity": v.capacity,
+                    "slots": [
+                        {"start": slot.isoformat(), "remaining": remaining}
+                        for slot, remaining in calendar[v.id]
+                    ]
+                }
+                for v in venues
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Availability calendar error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
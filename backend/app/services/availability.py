@@ -0,0 +1,320 @@
+from sqlalchemy import bindparam, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import AppCounter, Reservation, ReservationHold, SlotOccupancy, Venue, bump_counter
+from app.services.venue_index import venue_hours
+from collections import deque
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+
+class NoAvailabilityError(Exception):
+    """
+    The venue cannot seat the party at the requested time
+    """
+
+
+def parse_datetime(datetime_str: str) -> datetime:
+    """
+    Parse an ISO datetime the way reservations store it (wall-clock, no tzinfo)
+    """
+    return datetime.fromisoformat(datetime_str.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def slot_floor(dt: datetime) -> datetime:
+    dt = dt.replace(tzinfo=None, second=0, microsecond=0)
+    return dt - timedelta(minutes=dt.minute % settings.slot_minutes)
+
+
+def covered_slots(dt: datetime, duration_minutes: Optional[int] = None) -> List[datetime]:
+    """
+    Start times of every slot a booking at `dt` occupies
+    """
+    duration = timedelta(minutes=duration_minutes or settings.dining_duration_minutes)
+    step = timedelta(minutes=settings.slot_minutes)
+    end = dt.replace(tzinfo=None) + duration
+    slot = slot_floor(dt)
+    slots = []
+    while slot < end:
+        slots.append(slot)
+        slot += step
+    return slots
+
+
+class AvailabilityEngine:
+    """
+    Slot-based availability on top of the venue_slot_occupancy counters
+
+    Each booking occupies every slot overlapping [start, start + dining
+    duration). A check reads just those slot rows, so it costs O(slots
+    covered) no matter how many reservations the venue has.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def seated(self, venue_id: str, slots: List[datetime]) -> Dict[datetime, int]:
+        rows = self.db.execute(
+            select(SlotOccupancy.slot_start, SlotOccupancy.seated).where(
+                SlotOccupancy.venue_id == venue_id,
+                SlotOccupancy.slot_start.in_(slots)
+            )
+        ).all()
+        return {row.slot_start: row.seated for row in rows}
+
+    def peak_seated(self, venue_ids: List[str], dt: datetime) -> Dict[str, int]:
+        """
+        Highest seat count over a booking at `dt`, for many venues in one query
+        """
+        rows = self.db.execute(
+            select(SlotOccupancy.venue_id, func.max(SlotOccupancy.seated).label("peak"))
+            .where(
+                SlotOccupancy.venue_id.in_(venue_ids),
+                SlotOccupancy.slot_start.in_(covered_slots(dt))
+            )
+            .group_by(SlotOccupancy.venue_id)
+        ).all()
+        return {row.venue_id: row.peak for row in rows}
+
+    def remaining(self, venue: Venue, dt: datetime) -> int:
+        """
+        Seats still free for the whole dining duration starting at `dt`
+        """
+        seated = self.seated(venue.id, covered_slots(dt))
+        return venue.capacity - max(seated.values(), default=0)
+
+    def is_available(self, venue: Venue, dt: datetime, party_size: int) -> bool:
+        if party_size > venue.capacity:
+            return False
+        if not venue_hours(venue).can_seat(dt, settings.dining_duration_minutes):
+            return False
+        return self.remaining(venue, dt) >= party_size
+
+    def calendar(
+        self,
+        venues: List[Venue],
+        start: date,
+        days: int
+    ) -> Dict[str, List[Tuple[datetime, int]]]:
+        """
+        Remaining seats for a booking starting at each open slot in
+        [start, start + days), per venue
+
+        One range query fetches the occupancy rows for all venues in slot
+        order; each venue is then swept once with a sliding-window maximum
+        over the dining duration, keeping the starts its compiled hours
+        can seat.
+        """
+        duration = settings.dining_duration_minutes
+        step = timedelta(minutes=settings.slot_minutes)
+        window = len(covered_slots(datetime.combine(start, datetime.min.time())))
+        range_start = datetime.combine(start, datetime.min.time())
+        range_end = range_start + timedelta(days=days)
+        
+        rows = self.db.execute(
+            select(SlotOccupancy.venue_id, SlotOccupancy.slot_start, SlotOccupancy.seated)
+            .where(
+                SlotOccupancy.venue_id.in_([v.id for v in venues]),
+                SlotOccupancy.slot_start >= range_start,
+                SlotOccupancy.slot_start < range_end + window * step
+            )
+            .order_by(SlotOccupancy.venue_id, SlotOccupancy.slot_start)
+        )
+        occupancy = {
+            venue_id: {row.slot_start: row.seated for row in group}
+            for venue_id, group in groupby(rows, key=lambda row: row.venue_id)
+        }
+        
+        result = {}
+        for venue in venues:
+            seated = occupancy.get(venue.id, {})
+            hours = venue_hours(venue)
+            
+            # Sliding-window max of seated over the next `window` slots
+            slots: List[Tuple[datetime, int]] = []
+            peak: deque = deque()  # (index, seated), seated decreasing
+            timeline = int((range_end - range_start) / step) + window
+            for i in range(timeline):
+                slot = range_start + i * step
+                count = seated.get(slot, 0)
+                while peak and peak[-1][1] <= count:
+                    peak.pop()
+                peak.append((i, count))
+                first = i - window + 1
+                if first < 0:
+                    continue
+                while peak[0][0] < first:
+                    peak.popleft()
+                slot_start = range_start + first * step
+                if hours.can_seat(slot_start, duration):
+                    slots.append((slot_start, max(venue.capacity - peak[0][1], 0)))
+            result[venue.id] = slots
+        return result
+
+    def claim(self, venue: Venue, dt: datetime, party_size: int):
+        """
+        Atomically take `party_size` seats in every slot the booking covers
+
+        Missing counter rows are created first (ON CONFLICT DO NOTHING, so
+        concurrent creators don't collide), then a single conditional UPDATE
+        adds the party to the slots that still have room. The row locks it
+        takes make concurrent claims on the same slots queue up behind each
+        other and re-check the condition, so the capacity can't be exceeded
+        however many workers book at once. If any slot is full, fewer rows
+        match than the booking covers and NoAvailabilityError is raised, as
+        it is when the booking falls outside the venue's hours.
+
+        Runs in the caller's transaction; the caller commits, or rolls back
+        on error.
+        """
+        if party_size < 1:
+            raise ValueError(f"Party size must be at least 1, got {party_size}")
+        if not venue_hours(venue).can_seat(dt, settings.dining_duration_minutes):
+            raise NoAvailabilityError(f"{venue.name} is closed at {dt:%Y-%m-%d %H:%M}")
+        slots = covered_slots(dt)
+        self._ensure_slots([(venue.id, slot) for slot in slots])
+        result = self.db.execute(
+            update(SlotOccupancy)
+            .where(
+                SlotOccupancy.venue_id == venue.id,
+                SlotOccupancy.slot_start.in_(slots),
+                SlotOccupancy.seated + party_size <= venue.capacity
+            )
+            .values(seated=SlotOccupancy.seated + party_size)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(slots):
+            raise NoAvailabilityError(
+                f"{venue.name} has no table for {party_size} at {dt:%Y-%m-%d %H:%M}"
+            )
+
+    def claim_batch(self, bookings: List[Tuple[Venue, datetime, int]]) -> List[bool]:
+        """
+        Claim seats for many bookings at once; returns which of them fit
+
+        Every slot involved is locked up front (SELECT ... FOR UPDATE; on
+        SQLite the INSERT that creates missing rows already holds the write
+        lock), bookings are accepted in order while capacity lasts, and the
+        new totals are written with one executemany UPDATE. The statement
+        count doesn't grow with the batch. Bookings must already have been
+        checked against the venues' hours.
+
+        Runs in the caller's transaction; the caller commits.
+        """
+        for _, _, party_size in bookings:
+            if party_size < 1:
+                raise ValueError(f"Party size must be at least 1, got {party_size}")
+        slots_of = [covered_slots(dt) for _, dt, _ in bookings]
+        keys = sorted({(venue.id, slot) for (venue, _, _), slots in zip(bookings, slots_of) for slot in slots})
+        if not keys:
+            return []
+        self._ensure_slots(keys)
+        rows = self.db.execute(
+            select(SlotOccupancy.venue_id, SlotOccupancy.slot_start, SlotOccupancy.seated)
+            .where(tuple_(SlotOccupancy.venue_id, SlotOccupancy.slot_start).in_(keys))
+            .order_by(SlotOccupancy.venue_id, SlotOccupancy.slot_start)
+            .with_for_update()
+        )
+        seated = {(row.venue_id, row.slot_start): row.seated for row in rows}
+
+        added: Dict[Tuple[str, datetime], int] = {}
+        fits = []
+        for (venue, _, party_size), slots in zip(bookings, slots_of):
+            ok = all(
+                seated[(venue.id, slot)] + added.get((venue.id, slot), 0) + party_size <= venue.capacity
+                for slot in slots
+            )
+            if ok:
+                for slot in slots:
+                    added[(venue.id, slot)] = added.get((venue.id, slot), 0) + party_size
+            fits.append(ok)
+
+        if added:
+            table = SlotOccupancy.__table__
+            self.db.connection().execute(
+                table.update()
+                .where(table.c.venue_id == bindparam("b_venue_id"), table.c.slot_start == bindparam("b_slot_start"))
+                .values(seated=table.c.seated + bindparam("b_seated")),
+                [
+                    {"b_venue_id": venue_id, "b_slot_start": slot, "b_seated": n}
+                    for (venue_id, slot), n in added.items()
+                ]
+            )
+        return fits
+
+    def _ensure_slots(self, keys: List[Tuple[str, datetime]]):
+        rows = [{"venue_id": venue_id, "slot_start": slot, "seated": 0} for venue_id, slot in keys]
+        dialect = self.db.bind.dialect.name
+        if dialect == "sqlite":
+            self.db.execute(sqlite_insert(SlotOccupancy).on_conflict_do_nothing(), rows)
+        elif dialect == "postgresql":
+            self.db.execute(pg_insert(SlotOccupancy).on_conflict_do_nothing(), rows)
+        else:
+            existing = set(self.db.execute(
+                select(SlotOccupancy.venue_id, SlotOccupancy.slot_start)
+                .where(tuple_(SlotOccupancy.venue_id, SlotOccupancy.slot_start).in_(keys))
+            ).tuples())
+            missing = [row for row in rows if (row["venue_id"], row["slot_start"]) not in existing]
+            if missing:
+                self.db.execute(insert(SlotOccupancy), missing)
+
+    def release(self, venue_id: str, dt: datetime, party_size: int):
+        """
+        Give back the seats taken by `claim`
+        """
+        self.db.execute(
+            update(SlotOccupancy)
+            .where(SlotOccupancy.venue_id == venue_id, SlotOccupancy.slot_start.in_(covered_slots(dt)))
+            .values(seated=SlotOccupancy.seated - party_size)
+        )
+
+
+def rebuild_occupancy(connection):
+    """
+    Recompute all slot counters from confirmed reservations and holds
+    """
+    connection.execute(delete(SlotOccupancy))
+    counts: Dict[tuple, int] = {}
+    reservations = connection.execute(
+        select(Reservation.venue_id, Reservation.datetime, Reservation.party_size)
+        .where(Reservation.status == "confirmed")
+    ).all()
+    holds = connection.execute(
+        select(ReservationHold.venue_id, ReservationHold.datetime, ReservationHold.party_size)
+    ).all()
+    for row in reservations + holds:
+        for slot in covered_slots(row.datetime):
+            key = (row.venue_id, slot)
+            counts[key] = counts.get(key, 0) + row.party_size
+    if counts:
+        connection.execute(
+            insert(SlotOccupancy),
+            [{"venue_id": v, "slot_start": slot, "seated": n} for (v, slot), n in counts.items()]
+        )
+
+
+# The slot layout the counters were last built with. release() works out a
+# booking's slots from the current settings, so they must match what claim()
+# used.
+OCCUPANCY_LAYOUT_COUNTERS = ("occupancy_slot_minutes", "occupancy_dining_duration_minutes")
+
+
+def ensure_occupancy_layout(connection) -> bool:
+    """
+    Rebuild the slot counters if slot_minutes or dining_duration_minutes
+    changed since they were built; returns whether it did
+    """
+    layout = dict(zip(OCCUPANCY_LAYOUT_COUNTERS, (settings.slot_minutes, settings.dining_duration_minutes)))
+    rows = connection.execute(select(AppCounter.name, AppCounter.value).where(AppCounter.name.in_(layout)))
+    stored = {row.name: row.value for row in rows}
+    if stored == layout:
+        return False
+    if stored:
+        print("Slot layout changed, rebuilding slot occupancy...")
+    rebuild_occupancy(connection)
+    for name, value in layout.items():
+        bump_counter(connection, name, value - stored.get(name, 0))
+    return True
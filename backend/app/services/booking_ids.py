@@ -0,0 +1,221 @@
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.database import BookingIdNode, engine
+from datetime import datetime, timedelta
+from typing import Optional
+import os
+import threading
+import time
+import uuid
+
+
+# Crockford base32: no I, L, O or U, so codes read back unambiguously
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_VALUES = {c: i for i, c in enumerate(ALPHABET)}
+_ALIASES = {"I": "1", "L": "1", "O": "0"}
+
+PREFIX = "GF-"
+
+# 50-bit layout: seconds since EPOCH | node | sequence, i.e. 10 base32 chars
+EPOCH = 1735689600  # 2025-01-01T00:00:00Z
+TIME_BITS = 32
+NODE_BITS = 8
+SEQUENCE_BITS = 10
+
+
+def _check_char(payload: str) -> str:
+    """
+    Luhn mod 32 check character; catches any single mistyped character and
+    any swap of two adjacent ones
+    """
+    total = 0
+    for i, char in enumerate(reversed(payload)):
+        value = _VALUES[char] * (2 if i % 2 == 0 else 1)
+        total += value // 32 + value % 32
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+def normalize(code: str) -> str:
+    """
+    Canonical form of a typed-in booking ID: upper case, no separators,
+    I/L read as 1 and O as 0
+    """
+    code = code.strip().upper()
+    if code.startswith(PREFIX):
+        code = code[len(PREFIX):]
+    return "".join(_ALIASES.get(c, c) for c in code if c != "-")
+
+
+def is_valid(code: str) -> bool:
+    body = normalize(code)
+    width = (TIME_BITS + NODE_BITS + SEQUENCE_BITS) // 5
+    return (
+        len(body) == width + 1
+        and all(c in _VALUES for c in body)
+        and _check_char(body[:-1]) == body[-1]
+    )
+
+
+class BookingIdGenerator:
+    """
+    Unique, time-ordered booking IDs without a round trip per ID
+
+    Each process leases a node number from the booking_id_nodes table and
+    then numbers its IDs with a per-second sequence. A background thread
+    renews the lease. A node is handed out again only after its lease runs
+    out, so two live processes never share one and their IDs can't
+    collide. A process whose renewals keep failing stops minting with that
+    node before its lease can lapse. Within a process the (second, sequence)
+    pair only moves forward. A burst of more than 2**SEQUENCE_BITS IDs in one
+    second borrows the next second rather than waiting.
+
+    Leasing writes on its own connection, so it must not happen while the
+    caller's session holds the SQLite write lock. The app leases a node at
+    startup. Booking code calls ensure_node() before opening a transaction,
+    which covers scripts and forked workers.
+    """
+
+    def __init__(self, lease_seconds: float = 300.0):
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._node: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._token = uuid.uuid4().hex
+        self._lease_until = 0.0
+        self._renewer: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._last_second = 0
+        self._sequence = 0
+
+    def ensure_node(self) -> int:
+        """
+        Lease a node for this process if it doesn't hold a live one
+        """
+        with self._lock:
+            return self._ensure_node()
+
+    def start(self):
+        self.ensure_node()
+
+    def stop(self):
+        """
+        Give the node back so the next process start can reuse it at once
+        """
+        self._stopped.set()
+        renewer, self._renewer = self._renewer, None
+        if renewer is not None and renewer.is_alive():
+            renewer.join()
+        with self._lock:
+            node, self._node = self._node, None
+        if node is not None and self._pid == os.getpid():
+            with engine.begin() as connection:
+                connection.execute(
+                    update(BookingIdNode)
+                    .where(BookingIdNode.node == node, BookingIdNode.holder == self._token)
+                    .values(expires_at=datetime.utcnow())
+                )
+
+    def _ensure_node(self) -> int:
+        # A forked worker must not keep its parent's node number
+        if self._pid != os.getpid():
+            self._node = None
+            self._token = uuid.uuid4().hex
+            self._renewer = None
+        if self._node is None or time.monotonic() >= self._lease_until:
+            # (second, sequence) carries over: it only ever moves forward,
+            # even if the same node number comes back
+            self._node = self._lease_node()
+            self._pid = os.getpid()
+            if self._renewer is None:
+                self._stopped = threading.Event()
+                self._renewer = threading.Thread(target=self._renew_loop, args=(self._stopped,), daemon=True)
+                self._renewer.start()
+        return self._node
+
+    def _lease_node(self) -> int:
+        for _ in range(5):
+            lease_until = time.monotonic() + self.lease_seconds
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=self.lease_seconds)
+            try:
+                with engine.begin() as connection:
+                    free = connection.execute(
+                        select(BookingIdNode.node).where(BookingIdNode.expires_at <= now)
+                        .order_by(BookingIdNode.node).limit(1)
+                    ).scalar()
+                    if free is not None:
+                        taken = connection.execute(
+                            update(BookingIdNode)
+                            .where(BookingIdNode.node == free, BookingIdNode.expires_at <= now)
+                            .values(holder=self._token, expires_at=expires_at)
+                        ).rowcount
+                        if not taken:
+                            continue
+                        node = free
+                    else:
+                        highest = connection.execute(select(func.max(BookingIdNode.node))).scalar()
+                        node = 0 if highest is None else highest + 1
+                        if node >> NODE_BITS:
+                            raise RuntimeError(f"All {1 << NODE_BITS} booking ID nodes are leased")
+                        connection.execute(
+                            insert(BookingIdNode).values(node=node, holder=self._token, expires_at=expires_at)
+                        )
+            except IntegrityError:
+                # Another process took the same new node number first
+                continue
+            self._lease_until = lease_until
+            return node
+        raise RuntimeError("Could not lease a booking ID node")
+
+    def _renew_loop(self, stopped: threading.Event):
+        while not stopped.wait(self.lease_seconds / 3):
+            with self._lock:
+                node = self._node
+            if node is None:
+                continue
+            try:
+                lease_until = time.monotonic() + self.lease_seconds
+                with engine.begin() as connection:
+                    renewed = connection.execute(
+                        update(BookingIdNode)
+                        .where(BookingIdNode.node == node, BookingIdNode.holder == self._token)
+                        .values(expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                    ).rowcount
+                with self._lock:
+                    if renewed:
+                        self._lease_until = lease_until
+                    elif self._node == node:
+                        # Lost the lease; the next ensure_node() takes a new one
+                        self._node = None
+            except Exception as e:
+                print(f"Booking ID node renewal error: {e}")
+
+    def next_id(self) -> str:
+        with self._lock:
+            node = self._ensure_node()
+            second = int(time.time()) - EPOCH
+            if second > self._last_second:
+                self._last_second = second
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence >> SEQUENCE_BITS:
+                    self._last_second += 1
+                    self._sequence = 0
+            value = (
+                (self._last_second % (1 << TIME_BITS)) << (NODE_BITS + SEQUENCE_BITS)
+                | node << SEQUENCE_BITS
+                | self._sequence
+            )
+
+        chars = []
+        for _ in range((TIME_BITS + NODE_BITS + SEQUENCE_BITS) // 5):
+            chars.append(ALPHABET[value & 31])
+            value >>= 5
+        payload = "".join(reversed(chars))
+        return f"{PREFIX}{payload[:5]}-{payload[5:]}{_check_char(payload)}"
+
+
+# Global booking ID generator instance
+booking_ids = BookingIdGenerator(lease_seconds=settings.booking_id_node_lease_seconds)
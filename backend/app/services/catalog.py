@@ -0,0 +1,62 @@
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import CATALOG_VERSION, catalog_commit_hooks, read_counter
+from typing import Callable, List, Optional
+import threading
+import time
+
+
+class CatalogVersion:
+    """
+    Process-local view of the shared catalog version counter
+
+    Commits made through this process report their own bumps, so in-process
+    structures that were patched on commit stay valid. The database counter
+    is re-read at most every `poll_seconds`; a version this process did not
+    produce means another worker or script changed venues, and every
+    registered listener is told to invalidate.
+    """
+
+    def __init__(self, poll_seconds: float = 1.0):
+        self.poll_seconds = poll_seconds
+        self._seen: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+    def on_change(self, listener: Callable[[], None]):
+        """
+        Register a callback for catalog changes made outside this process
+        """
+        self._listeners.append(listener)
+
+    def current(self, db: Session) -> int:
+        now = time.monotonic()
+        if self._seen is None or now - self._checked_at >= self.poll_seconds:
+            version = read_counter(db.connection(), CATALOG_VERSION)
+            with self._lock:
+                self._checked_at = now
+                changed = version != self._seen
+                self._seen = version
+            if changed:
+                self._notify()
+        return self._seen
+
+    def committed(self, before: int, after: int):
+        """
+        A local transaction moved the counter from `before` to `after`
+        """
+        with self._lock:
+            foreign = self._seen is not None and self._seen != before
+            self._seen = after
+        if foreign:
+            self._notify()
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+
+# Global catalog version tracker
+catalog_version = CatalogVersion(poll_seconds=settings.catalog_version_poll_seconds)
+catalog_commit_hooks.append(catalog_version.committed)
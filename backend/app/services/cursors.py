@@ -0,0 +1,34 @@
+from typing import Any, List, NamedTuple, Optional, Tuple
+import base64
+import binascii
+import json
+
+
+class Page(NamedTuple):
+    """
+    One page of a keyset-paginated listing; next_cursor is None on the last
+    """
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Opaque, URL-safe cursor for the sort key of the last item on a page
+    """
+    encoded = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(encoded).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """
+    Sort key packed by encode_cursor; raises ValueError for anything else
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return tuple(values)
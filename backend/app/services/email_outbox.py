@@ -0,0 +1,245 @@
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import EmailOutbox, SessionLocal, run_with_retries
+from app.services.email_service import Delivery, email_service
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+import asyncio
+import random
+import uuid
+
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any]):
+    """
+    Add an email to the caller's transaction; it is sent once that commits
+    """
+    db.add(EmailOutbox(kind=kind, recipient=payload["to_email"], payload=payload))
+    db.info["email_outbox_pending"] = True
+
+
+def enqueue_many(db: Session, kind: str, payloads: List[Dict[str, Any]]):
+    """
+    enqueue() for many emails as one bulk insert
+    """
+    if not payloads:
+        return
+    db.execute(insert(EmailOutbox), [
+        {"kind": kind, "recipient": payload["to_email"], "payload": payload}
+        for payload in payloads
+    ])
+    db.info["email_outbox_pending"] = True
+
+
+class OutboxMessage(NamedTuple):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class EmailOutboxWorker:
+    """
+    Drains the email_outbox table with a pool of async senders
+
+    A dispatcher claims due messages in batches. A single UPDATE marks them
+    "sending" with a lease, so several processes can drain the same table
+    without sending anything twice. A message whose sender died becomes due
+    again when the lease ends. Claimed messages go on a queue served by
+    `workers` sender tasks. Each sender takes up to `send_batch` queued
+    messages at a time and sends them over one pooled SMTP session.
+
+    A failed send is retried with exponential backoff and jitter. After
+    `max_attempts` tries the message is marked failed. Commits that enqueue
+    mail wake the dispatcher. Otherwise it polls every `poll_seconds`, for
+    retries and for mail from other processes.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        batch_size: int = 50,
+        send_batch: int = 20,
+        poll_seconds: float = 5.0,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 8,
+        backoff_seconds: float = 30.0,
+        backoff_max_seconds: float = 3600.0
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.send_batch = send_batch
+        self.poll_seconds = poll_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._token = uuid.uuid4().hex[:12]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._serve()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await email_service.pool.close()
+        self._loop = None
+        # Hand back what was claimed but never started, rather than waiting out the lease
+        unsent = []
+        while self._queue is not None and not self._queue.empty():
+            unsent.append(self._queue.get_nowait().id)
+        if unsent:
+            await asyncio.to_thread(self._release, unsent)
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            room = self.batch_size - self._queue.qsize()
+            claimed = 0
+            try:
+                if room > 0:
+                    for message in await asyncio.to_thread(self._claim, room):
+                        self._queue.put_nowait(message)
+                        claimed += 1
+            except Exception as e:
+                print(f"Email outbox error: {e}")
+
+            if room > 0 and claimed == room:
+                # Probably more waiting; take the next batch once this one is out
+                await self._queue.join()
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _serve(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.send_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                try:
+                    deliveries = await email_service.send_batch([(m.kind, m.payload) for m in batch])
+                except Exception as e:
+                    deliveries = [Delivery(False, f"{type(e).__name__}: {e}")] * len(batch)
+                await asyncio.to_thread(self._record, batch, deliveries)
+            except Exception as e:
+                print(f"Email outbox error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _claim(self, limit: int) -> List[OutboxMessage]:
+        db = SessionLocal()
+        try:
+            def claim() -> List[OutboxMessage]:
+                now = datetime.utcnow()
+                is_due = (
+                    EmailOutbox.status.in_(("pending", "sending")),
+                    EmailOutbox.next_attempt_at <= now,
+                )
+                due = select(EmailOutbox.id).where(*is_due).order_by(EmailOutbox.next_attempt_at).limit(limit)
+                rows = db.execute(
+                    update(EmailOutbox)
+                    # Due again in the outer WHERE, in case another worker got there first
+                    .where(EmailOutbox.id.in_(due), *is_due)
+                    .values(status="sending", claimed_by=self._token, next_attempt_at=now + self.lease)
+                    .returning(EmailOutbox.id, EmailOutbox.kind, EmailOutbox.payload, EmailOutbox.attempts)
+                    .execution_options(synchronize_session=False)
+                ).all()
+                db.commit()
+                return [OutboxMessage(*row) for row in rows]
+
+            return run_with_retries(db, claim)
+        finally:
+            db.close()
+
+    def _record(self, messages: List[OutboxMessage], deliveries: List[Delivery]):
+        now = datetime.utcnow()
+        updates = []
+        for message, delivery in zip(messages, deliveries):
+            attempts = message.attempts + 1
+            if delivery.error is None:
+                # Not sent without an error means email is disabled or unconfigured
+                values = dict(
+                    status="sent" if delivery.sent else "skipped",
+                    sent_at=now if delivery.sent else None,
+                    last_error=None
+                )
+            elif attempts >= self.max_attempts or not delivery.retry:
+                values = dict(status="failed", last_error=delivery.error)
+            else:
+                values = dict(status="pending", next_attempt_at=now + self._backoff(attempts), last_error=delivery.error)
+            updates.append((message.id, dict(attempts=attempts, **values)))
+
+        db = SessionLocal()
+        try:
+            def record():
+                for message_id, values in updates:
+                    db.execute(
+                        update(EmailOutbox)
+                        .where(EmailOutbox.id == message_id, EmailOutbox.claimed_by == self._token)
+                        .values(**values)
+                        .execution_options(synchronize_session=False)
+                    )
+                db.commit()
+
+            run_with_retries(db, record)
+        finally:
+            db.close()
+
+    def _release(self, ids: List[int]):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(ids), EmailOutbox.status == "sending")
+                .values(status="pending", next_attempt_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.backoff_seconds * (2 ** (attempts - 1)), self.backoff_max_seconds)
+        return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+# Global email outbox worker instance
+email_outbox = EmailOutboxWorker(
+    workers=settings.email_outbox_workers,
+    batch_size=settings.email_outbox_batch_size,
+    send_batch=settings.email_outbox_send_batch,
+    poll_seconds=settings.email_outbox_poll_seconds,
+    lease_seconds=settings.email_outbox_lease_seconds,
+    max_attempts=settings.email_outbox_max_attempts,
+    backoff_seconds=settings.email_outbox_backoff_seconds,
+    backoff_max_seconds=settings.email_outbox_backoff_max_seconds
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_on_commit(session):
+    if session.info.pop("email_outbox_pending", False):
+        email_outbox.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    session.info.pop("email_outbox_pending", None)
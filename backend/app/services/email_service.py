@@ -1,13 +1,44 @@
 import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email.utils import formataddr
 from app.config import settings
-from datetime import datetime
+from app.services.email_templates import (
+    RESERVATION_CANCELLATION,
+    RESERVATION_CONFIRMATION,
+    RESERVATION_REMINDER,
+    VENUE_DIGEST,
+    WAITLIST_PROMOTION,
+    EmailTemplate,
+    OutgoingEmail,
+    booking_fields,
+    build_message,
+    digest_fields,
+)
+from app.services.smtp_pool import SMTPPool
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Delivery(NamedTuple):
+    """
+    Outcome of one message in a batch; retry is False when resending can't help
+    """
+    sent: bool
+    error: Optional[str] = None
+    retry: bool = True
+
+
+def _permanent(error: Exception) -> bool:
+    """
+    True for a 5xx SMTP reply, which the same message will get again
+    """
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(_permanent(e) for e in error.recipients)
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
 
 
 class EmailService:
     """
-    Email service for sending reservation confirmations
+    Email service for reservation confirmations, cancellations, reminders,
+    waitlist promotions and venue digests
     
     Note: SMTP must be configured in .env for emails to actually send.
     If SMTP is not configured, emails will be logged but not sent.
@@ -21,8 +52,33 @@ class EmailService:
         self.password = settings.smtp_password
         self.from_email = settings.smtp_from_email
         self.from_name = settings.smtp_from_name
+        self.from_header = formataddr((self.from_name, self.from_email))
+        self.pool = SMTPPool(
+            hostname=self.host,
+            port=self.port,
+            username=self.user,
+            password=self.password,
+            start_tls=settings.smtp_start_tls,
+            size=settings.smtp_pool_size,
+            noop_after_seconds=settings.smtp_noop_after_seconds,
+            max_idle_seconds=settings.smtp_max_idle_seconds,
+            max_messages=settings.smtp_max_messages_per_connection,
+            timeout=settings.smtp_timeout_seconds
+        )
+        # Kind -> builder, for send_batch
+        self.builders = {
+            "reservation_confirmation": self.build_reservation_confirmation,
+            "reservation_cancellation": self.build_reservation_cancellation,
+            "reservation_reminder": self.build_reservation_reminder,
+            "waitlist_promotion": self.build_waitlist_promotion,
+            "venue_digest": self.build_venue_digest,
+        }
+    
+    @property
+    def configured(self) -> bool:
+        return bool(self.user and self.password and self.user != "your_email@gmail.com")
     
-    async def send_reservation_confirmation(
+    def build_reservation_confirmation(
         self,
         to_email: str,
         to_name: str,
@@ -31,175 +87,95 @@ class EmailService:
         reservation_datetime: str,
         party_size: int,
         notes: str = None
-    ) -> bool:
-        """
-        Send reservation confirmation email
-        
-        Returns True if email was sent successfully, False otherwise
-        """
-        if not self.enabled:
-            print(f"📧 Email disabled in config - Would send confirmation to {to_email}")
-            print(f"   Booking ID: {booking_id}")
-            print(f"   Venue: {venue_name}")
-            return False
-        
-        # Check if credentials are configured
-        if not self.user or not self.password or self.user == "your_email@gmail.com":
-            print(f"⚠️  Email credentials not configured - Skipping email to {to_email}")
-            print(f"   To enable emails, update SMTP_USER and SMTP_PASSWORD in backend/.env")
-            print(f"   See SETUP_EMAIL_CREDENTIALS.md for instructions")
-            return False
-        
-        try:
-            # Parse datetime for better formatting
-            try:
-                dt = datetime.fromisoformat(reservation_datetime.replace('Z', '+00:00'))
-                formatted_date = dt.strftime("%A, %B %d, %Y")
-                formatted_time = dt.strftime("%I:%M %p")
-            except:
-                formatted_date = reservation_datetime
-                formatted_time = ""
-            
-            # Create email
-            message = MIMEMultipart("alternative")
-            message["Subject"] = f"Reservation Confirmed - {venue_name}"
-            message["From"] = f"{self.from_name} <{self.from_email}>"
-            message["To"] = to_email
-            
-            # HTML email body
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                    .header {{ background: linear-gradient(135deg, #0d9488 0%, #f59e0b 100%); 
-                              color: white; padding: 30px; text-align: center; border-radius: 8px 8px 0 0; }}
-                    .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 8px 8px; }}
-                    .booking-details {{ background: white; padding: 20px; border-radius: 8px; 
-                                       margin: 20px 0; border-left: 4px solid #0d9488; }}
-                    .detail-row {{ padding: 10px 0; border-bottom: 1px solid #e5e7eb; }}
-                    .detail-label {{ font-weight: bold; color: #6b7280; }}
-                    .detail-value {{ color: #111827; }}
-                    .booking-id {{ font-size: 24px; font-weight: bold; color: #0d9488; 
-                                  text-align: center; padding: 15px; background: #f0fdfa; 
-                                  border-radius: 8px; margin: 20px 0; }}
-                    .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 14px; }}
-                    .button {{ display: inline-block; padding: 12px 24px; background: #0d9488; 
-                              color: white; text-decoration: none; border-radius: 6px; 
-                              margin: 20px 0; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1 style="margin: 0;">🎉 Reservation Confirmed!</h1>
-                        <p style="margin: 10px 0 0 0;">Your table is reserved</p>
-                    </div>
-                    
-                    <div class="content">
-                        <p>Dear {to_name},</p>
-                        
-                        <p>Great news! Your reservation at <strong>{venue_name}</strong> has been confirmed.</p>
-                        
-                        <div class="booking-id">
-                            Booking ID: {booking_id}
-                        </div>
-                        
-                        <div class="booking-details">
-                            <div class="detail-row">
-                                <span class="detail-label">📍 Restaurant:</span>
-                                <span class="detail-value">{venue_name}</span>
-                            </div>
-                            <div class="detail-row">
-                                <span class="detail-label">📅 Date:</span>
-                                <span class="detail-value">{formatted_date}</span>
-                            </div>
-                            <div class="detail-row">
-                                <span class="detail-label">🕐 Time:</span>
-                                <span class="detail-value">{formatted_time}</span>
-                            </div>
-                            <div class="detail-row">
-                                <span class="detail-label">👥 Party Size:</span>
-                                <span class="detail-value">{party_size} {"person" if party_size == 1 else "people"}</span>
-                            </div>
-                            {f'<div class="detail-row"><span class="detail-label">📝 Notes:</span><span class="detail-value">{notes}</span></div>' if notes else ''}
-                        </div>
-                        
-                        <p><strong>Important Information:</strong></p>
-                        <ul>
-                            <li>Please arrive 10 minutes before your reservation time</li>
-                            <li>If you need to cancel or modify, please do so at least 2 hours in advance</li>
-                            <li>Keep your booking ID handy when you arrive</li>
-                        </ul>
-                        
-                        <p>We look forward to serving you!</p>
-                        
-                        <p>Best regards,<br>
-                        <strong>The GoodFoods Team</strong></p>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>This is an automated confirmation email from GoodFoods.</p>
-                        <p>If you have any questions, please contact the restaurant directly.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Attach HTML content
-            html_part = MIMEText(html_content, "html")
-            message.attach(html_part)
-            
-            # Send email
-            await aiosmtplib.send(
-                message,
-                hostname=self.host,
-                port=self.port,
-                username=self.user,
-                password=self.password,
-                start_tls=True
-            )
-            
-            print(f"✅ Email sent successfully to {to_email}")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Failed to send email to {to_email}: {e}")
-            return False
+    ) -> OutgoingEmail:
+        return self._build(RESERVATION_CONFIRMATION, to_email, booking_fields(
+            to_name, booking_id, venue_name, reservation_datetime, party_size, notes
+        ))
     
-    def send_reservation_confirmation_sync(self, *args, **kwargs):
-        """
-        Synchronous wrapper for sending emails
-        Used when async context is not available
+    def build_reservation_cancellation(
+        self,
+        to_email: str,
+        to_name: str,
+        booking_id: str,
+        venue_name: str,
+        reservation_datetime: str,
+        party_size: int
+    ) -> OutgoingEmail:
+        return self._build(RESERVATION_CANCELLATION, to_email, booking_fields(
+            to_name, booking_id, venue_name, reservation_datetime, party_size
+        ))
+    
+    def build_reservation_reminder(
+        self,
+        to_email: str,
+        to_name: str,
+        booking_id: str,
+        venue_name: str,
+        reservation_datetime: str,
+        party_size: int
+    ) -> OutgoingEmail:
+        return self._build(RESERVATION_REMINDER, to_email, booking_fields(
+            to_name, booking_id, venue_name, reservation_datetime, party_size
+        ))
+    
+    def build_waitlist_promotion(
+        self,
+        to_email: str,
+        to_name: str,
+        booking_id: str,
+        venue_name: str,
+        reservation_datetime: str,
+        party_size: int
+    ) -> OutgoingEmail:
+        return self._build(WAITLIST_PROMOTION, to_email, booking_fields(
+            to_name, booking_id, venue_name, reservation_datetime, party_size
+        ))
+    
+    def build_venue_digest(
+        self,
+        to_email: str,
+        venue_name: str,
+        day: str,
+        bookings: List[Dict[str, Any]]
+    ) -> OutgoingEmail:
+        return self._build(VENUE_DIGEST, to_email, digest_fields(venue_name, day, bookings))
+    
+    def _build(self, template: EmailTemplate, to_email: str, fields: Dict[str, Any]) -> OutgoingEmail:
+        return build_message(template.render(fields), self.from_email, self.from_header, to_email)
+    
+    async def send_batch(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Delivery]:
         """
-        import asyncio
-        import threading
+        Send (kind, payload) messages over one pooled SMTP session
         
-        result = [None]
-        exception = [None]
+        Returns a Delivery per item, in order. A 5xx refusal from the server
+        is permanent and comes back with retry=False. When email is disabled
+        or unconfigured nothing is sent and each item is Delivery(False).
+        This is the only way mail goes out; callers queue it on the outbox.
+        """
+        if not self.enabled or not self.configured:
+            print(f"📧 Email disabled or not configured - Skipping {len(items)} queued emails")
+            return [Delivery(False)] * len(items)
         
-        def run_async():
+        deliveries: List[Optional[Delivery]] = [None] * len(items)
+        messages, positions = [], []
+        for i, (kind, payload) in enumerate(items):
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result[0] = loop.run_until_complete(
-                    self.send_reservation_confirmation(*args, **kwargs)
-                )
-                loop.close()
+                messages.append(self.builders[kind](**payload))
+                positions.append(i)
             except Exception as e:
-                exception[0] = e
-        
-        thread = threading.Thread(target=run_async)
-        thread.start()
-        thread.join(timeout=10)  # 10 second timeout
+                # Bad payload or unknown kind: the same bytes would fail again
+                deliveries[i] = Delivery(False, f"{type(e).__name__}: {e}", retry=False)
         
-        if exception[0]:
-            raise exception[0]
+        errors = await self.pool.send_many(messages) if messages else []
+        for i, error in zip(positions, errors):
+            if error is None:
+                deliveries[i] = Delivery(True)
+            else:
+                deliveries[i] = Delivery(False, f"{type(error).__name__}: {error}", retry=not _permanent(error))
         
-        return result[0]
+        sent = sum(1 for d in deliveries if d.sent)
+        print(f"✅ Sent {sent}/{len(items)} queued emails")
+        return deliveries
 
 
 # Global email service instance
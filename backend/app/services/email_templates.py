@@ -0,0 +1,460 @@
+from email.header import Header
+from datetime import datetime
+from html import escape
+from string import Formatter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import base64
+import textwrap
+import uuid
+
+
+class Template:
+    """
+    A template compiled once into UTF-8 static fragments and field slots
+
+    Placeholders are str.format style ({field}, with {{ and }} for literal
+    braces), without format specs or conversions. Rendering encodes only
+    the substituted values and joins them with the pre-encoded fragments.
+    In HTML templates the values are escaped. A bytes value is taken as
+    already rendered, e.g. an optional fragment from another Template, and
+    is inserted as-is.
+    """
+
+    __slots__ = ("source", "fields", "html", "_parts", "_slots")
+
+    def __init__(self, source: str, html: bool = False):
+        self.source = source
+        self.html = html
+        self._parts: List[bytes] = []
+        self._slots: List[Tuple[int, str]] = []
+        literal = []
+        for text, field, spec, conversion in Formatter().parse(source):
+            literal.append(text)
+            if field is None:
+                continue
+            if not field or spec or conversion:
+                raise ValueError(f"Unsupported placeholder {{{field}}} in email template")
+            self._parts.append("".join(literal).encode())
+            self._slots.append((len(self._parts), field))
+            self._parts.append(b"")
+            literal = []
+        self._parts.append("".join(literal).encode())
+        self.fields = frozenset(field for _, field in self._slots)
+
+    def render(self, fields: Dict[str, Any]) -> bytes:
+        parts = self._parts.copy()
+        for i, field in self._slots:
+            value = fields[field]
+            if value.__class__ is not bytes:
+                value = str(value)
+                parts[i] = (escape(value) if self.html else value).encode()
+            else:
+                parts[i] = value
+        return b"".join(parts)
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    html: bytes
+    text: bytes
+
+
+class EmailTemplate:
+    """
+    Subject, HTML body and plain-text alternative rendered from one set of fields
+    """
+
+    def __init__(self, subject: str, html: str, text: str):
+        self.subject = Template(subject)
+        self.html = Template(_body_source(html), html=True)
+        self.text = Template(_body_source(text))
+
+    def render(self, fields: Dict[str, Any]) -> RenderedEmail:
+        return RenderedEmail(
+            self.subject.render(fields).decode(),
+            self.html.render(fields),
+            self.text.render(fields)
+        )
+
+
+def _body_source(source: str) -> str:
+    return textwrap.dedent(source).strip("\n") + "\n"
+
+
+class OutgoingEmail(NamedTuple):
+    """
+    A finished message: SMTP envelope plus the bytes sent after DATA
+    """
+    sender: str
+    recipients: List[str]
+    data: bytes
+
+
+# Per-part headers; everything but the boundary is the same for every message
+_PLAIN_PART = b'Content-Type: text/plain; charset="utf-8"\r\nContent-Transfer-Encoding: base64\r\n\r\n'
+_HTML_PART = b'Content-Type: text/html; charset="utf-8"\r\nContent-Transfer-Encoding: base64\r\n\r\n'
+
+
+def build_message(rendered: RenderedEmail, from_email: str, from_header: str, to_email: str) -> OutgoingEmail:
+    """
+    multipart/alternative message, plain text first so clients prefer the HTML
+
+    Written straight to wire format: the rendered bodies are base64'd once
+    and joined with fixed headers, instead of building an email.message
+    tree that the SMTP client would then have to flatten.
+    """
+    boundary = f"=_{uuid.uuid4().hex}".encode()
+    delimiter = b"\r\n--" + boundary + b"\r\n"
+    data = b"".join((
+        b"Subject: ", _header(rendered.subject),
+        b"\r\nFrom: ", _header(from_header),
+        b"\r\nTo: ", _header(to_email),
+        b'\r\nMIME-Version: 1.0\r\nContent-Type: multipart/alternative; boundary="', boundary, b'"\r\n',
+        delimiter, _PLAIN_PART, _base64_lines(rendered.text),
+        delimiter, _HTML_PART, _base64_lines(rendered.html),
+        b"\r\n--", boundary, b"--\r\n",
+    ))
+    return OutgoingEmail(from_email, [to_email], data)
+
+
+def _header(value: str) -> bytes:
+    # Line breaks in a field value would start a new header
+    value = " ".join(value.splitlines())
+    if value.isascii():
+        return value.encode()
+    return Header(value, "utf-8").encode().encode()
+
+
+def _base64_lines(body: bytes) -> bytes:
+    encoded = base64.b64encode(body)
+    return b"\r\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+
+
+def booking_fields(
+    to_name: str,
+    booking_id: str,
+    venue_name: str,
+    reservation_datetime: str,
+    party_size: int,
+    notes: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Template fields for a booking, shared by every booking email
+    """
+    try:
+        dt = datetime.fromisoformat(reservation_datetime.replace('Z', '+00:00'))
+        formatted_date = dt.strftime("%A, %B %d, %Y")
+        formatted_time = dt.strftime("%I:%M %p")
+    except (AttributeError, ValueError):
+        formatted_date = str(reservation_datetime)
+        formatted_time = ""
+    fields = {
+        "to_name": to_name,
+        "booking_id": booking_id,
+        "venue_name": venue_name,
+        "formatted_date": formatted_date,
+        "formatted_time": formatted_time,
+        "when": f"{formatted_date} at {formatted_time}" if formatted_time else formatted_date,
+        "party": f"{party_size} {'person' if party_size == 1 else 'people'}",
+        "notes": notes or "",
+    }
+    fields["notes_html"] = NOTES_HTML.render(fields) if notes else b""
+    fields["notes_text"] = NOTES_TEXT.render(fields) if notes else b""
+    return fields
+
+
+NOTES_HTML = Template(
+    '<div class="detail-row"><span class="detail-label">📝 Notes:</span>'
+    '<span class="detail-value">{notes}</span></div>',
+    html=True
+)
+
+NOTES_TEXT = Template("Notes:       {notes}\n")
+
+SIGNATURE_TEXT = """
+        Best regards,
+        The GoodFoods Team
+"""
+
+
+RESERVATION_CONFIRMATION = EmailTemplate(
+    subject="Reservation Confirmed - {venue_name}",
+    html="""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: linear-gradient(135deg, #0d9488 0%, #f59e0b 100%);
+                          color: white; padding: 30px; text-align: center; border-radius: 8px 8px 0 0; }}
+                .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 8px 8px; }}
+                .booking-details {{ background: white; padding: 20px; border-radius: 8px;
+                                   margin: 20px 0; border-left: 4px solid #0d9488; }}
+                .detail-row {{ padding: 10px 0; border-bottom: 1px solid #e5e7eb; }}
+                .detail-label {{ font-weight: bold; color: #6b7280; }}
+                .detail-value {{ color: #111827; }}
+                .booking-id {{ font-size: 24px; font-weight: bold; color: #0d9488;
+                              text-align: center; padding: 15px; background: #f0fdfa;
+                              border-radius: 8px; margin: 20px 0; }}
+                .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 14px; }}
+                .button {{ display: inline-block; padding: 12px 24px; background: #0d9488;
+                          color: white; text-decoration: none; border-radius: 6px;
+                          margin: 20px 0; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1 style="margin: 0;">🎉 Reservation Confirmed!</h1>
+                    <p style="margin: 10px 0 0 0;">Your table is reserved</p>
+                </div>
+
+                <div class="content">
+                    <p>Dear {to_name},</p>
+
+                    <p>Great news! Your reservation at <strong>{venue_name}</strong> has been confirmed.</p>
+
+                    <div class="booking-id">
+                        Booking ID: {booking_id}
+                    </div>
+
+                    <div class="booking-details">
+                        <div class="detail-row">
+                            <span class="detail-label">📍 Restaurant:</span>
+                            <span class="detail-value">{venue_name}</span>
+                        </div>
+                        <div class="detail-row">
+                            <span class="detail-label">📅 Date:</span>
+                            <span class="detail-value">{formatted_date}</span>
+                        </div>
+                        <div class="detail-row">
+                            <span class="detail-label">🕐 Time:</span>
+                            <span class="detail-value">{formatted_time}</span>
+                        </div>
+                        <div class="detail-row">
+                            <span class="detail-label">👥 Party Size:</span>
+                            <span class="detail-value">{party}</span>
+                        </div>
+                        {notes_html}
+                    </div>
+
+                    <p><strong>Important Information:</strong></p>
+                    <ul>
+                        <li>Please arrive 10 minutes before your reservation time</li>
+                        <li>If you need to cancel or modify, please do so at least 2 hours in advance</li>
+                        <li>Keep your booking ID handy when you arrive</li>
+                    </ul>
+
+                    <p>We look forward to serving you!</p>
+
+                    <p>Best regards,<br>
+                    <strong>The GoodFoods Team</strong></p>
+                </div>
+
+                <div class="footer">
+                    <p>This is an automated confirmation email from GoodFoods.</p>
+                    <p>If you have any questions, please contact the restaurant directly.</p>
+                </div>
+            </div>
+        </body>
+        </html>
+    """,
+    text="""
+        Reservation Confirmed!
+
+        Dear {to_name},
+
+        Great news! Your reservation at {venue_name} has been confirmed.
+
+        Booking ID:  {booking_id}
+        Restaurant:  {venue_name}
+        Date:        {formatted_date}
+        Time:        {formatted_time}
+        Party Size:  {party}
+        {notes_text}
+        Important Information:
+        - Please arrive 10 minutes before your reservation time
+        - If you need to cancel or modify, please do so at least 2 hours in advance
+        - Keep your booking ID handy when you arrive
+
+        We look forward to serving you!
+    """ + SIGNATURE_TEXT
+)
+
+RESERVATION_CANCELLATION = EmailTemplate(
+    subject="Reservation Cancelled - {venue_name}",
+    html="""
+        <!DOCTYPE html>
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #6b7280;">Reservation Cancelled</h1>
+                <p>Dear {to_name},</p>
+                <p>Your reservation at <strong>{venue_name}</strong> for {party}
+                on {when} has been cancelled.</p>
+                <p style="font-size: 20px; font-weight: bold; color: #6b7280;">Booking ID: {booking_id}</p>
+                <p>We hope to see you another time.</p>
+                <p>Best regards,<br><strong>The GoodFoods Team</strong></p>
+            </div>
+        </body>
+        </html>
+    """,
+    text="""
+        Reservation Cancelled
+
+        Dear {to_name},
+
+        Your reservation at {venue_name} for {party} on {when} has been cancelled.
+
+        Booking ID: {booking_id}
+
+        We hope to see you another time.
+    """ + SIGNATURE_TEXT
+)
+
+RESERVATION_REMINDER = EmailTemplate(
+    subject="Reminder: your table at {venue_name}",
+    html="""
+        <!DOCTYPE html>
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #0d9488;">⏰ See you soon!</h1>
+                <p>Dear {to_name},</p>
+                <p>This is a reminder of your reservation at <strong>{venue_name}</strong>:
+                {party} on {when}.</p>
+                <p style="font-size: 20px; font-weight: bold; color: #0d9488;">Booking ID: {booking_id}</p>
+                <p>Please arrive 10 minutes early. If your plans have changed, please cancel
+                so another guest can have the table.</p>
+                <p>Best regards,<br><strong>The GoodFoods Team</strong></p>
+            </div>
+        </body>
+        </html>
+    """,
+    text="""
+        See you soon!
+
+        Dear {to_name},
+
+        This is a reminder of your reservation at {venue_name}: {party} on {when}.
+
+        Booking ID: {booking_id}
+
+        Please arrive 10 minutes early. If your plans have changed, please cancel
+        so another guest can have the table.
+    """ + SIGNATURE_TEXT
+)
+
+WAITLIST_PROMOTION = EmailTemplate(
+    subject="A table opened up - {venue_name}",
+    html="""
+        <!DOCTYPE html>
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #0d9488;">🎉 You're off the waitlist!</h1>
+                <p>Dear {to_name},</p>
+                <p>A table opened up at <strong>{venue_name}</strong> and it's now yours:
+                {party} on {when}.</p>
+                <p style="font-size: 20px; font-weight: bold; color: #0d9488;">Booking ID: {booking_id}</p>
+                <p>If your plans have changed, please cancel so the next guest can have it.</p>
+                <p>Best regards,<br><strong>The GoodFoods Team</strong></p>
+            </div>
+        </body>
+        </html>
+    """,
+    text="""
+        You're off the waitlist!
+
+        Dear {to_name},
+
+        A table opened up at {venue_name} and it's now yours: {party} on {when}.
+
+        Booking ID: {booking_id}
+
+        If your plans have changed, please cancel so the next guest can have it.
+    """ + SIGNATURE_TEXT
+)
+
+
+def digest_fields(venue_name: str, day: str, bookings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Template fields for a venue's daily digest; each booking is a
+    venue_digest payload entry (time, party_size, name, phone, booking_id, notes)
+    """
+    try:
+        formatted_date = datetime.fromisoformat(day).strftime("%A, %B %d, %Y")
+    except ValueError:
+        formatted_date = day
+    rows_html, rows_text = [], []
+    for booking in bookings:
+        row = {
+            "time": booking["time"],
+            "party": booking["party_size"],
+            "name": booking["name"],
+            "phone": booking["phone"],
+            "booking_id": booking["booking_id"],
+            "notes": booking.get("notes") or "",
+        }
+        rows_html.append(DIGEST_ROW_HTML.render(row))
+        rows_text.append(DIGEST_ROW_TEXT.render(row))
+        if row["notes"]:
+            rows_text.append(DIGEST_NOTES_TEXT.render(row))
+    return {
+        "venue_name": venue_name,
+        "formatted_date": formatted_date,
+        "booking_count": len(bookings),
+        "covers": sum(booking["party_size"] for booking in bookings),
+        "rows_html": b"".join(rows_html),
+        "rows_text": b"".join(rows_text),
+    }
+
+
+DIGEST_ROW_HTML = Template(
+    '<tr><td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">{time}</td>'
+    '<td style="padding: 8px; border-bottom: 1px solid #e5e7eb; text-align: center;">{party}</td>'
+    '<td style="padding: 8px; border-bottom: 1px solid #e5e7eb;">{name}<br>'
+    '<span style="color: #6b7280; font-size: 13px;">{phone} &middot; {booking_id}</span></td>'
+    '<td style="padding: 8px; border-bottom: 1px solid #e5e7eb; color: #6b7280;">{notes}</td></tr>\n',
+    html=True
+)
+
+DIGEST_ROW_TEXT = Template("{time}  party of {party}  {name}  {phone}  {booking_id}\n")
+
+DIGEST_NOTES_TEXT = Template("          Notes: {notes}\n")
+
+VENUE_DIGEST = EmailTemplate(
+    subject="Today's bookings at {venue_name} - {formatted_date}",
+    html="""
+        <!DOCTYPE html>
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 700px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #0d9488;">📋 {venue_name}</h1>
+                <p>{formatted_date}: <strong>{booking_count}</strong> bookings,
+                <strong>{covers}</strong> covers.</p>
+                <table style="width: 100%; border-collapse: collapse; font-size: 14px;">
+                    <tr style="background: #f0fdfa; text-align: left;">
+                        <th style="padding: 8px;">Time</th>
+                        <th style="padding: 8px;">Party</th>
+                        <th style="padding: 8px;">Guest</th>
+                        <th style="padding: 8px;">Notes</th>
+                    </tr>
+                    {rows_html}
+                </table>
+                <p style="color: #6b7280; font-size: 14px;">Sent every morning by GoodFoods.
+                Bookings made or cancelled after this email are not included.</p>
+            </div>
+        </body>
+        </html>
+    """,
+    text="""
+        {venue_name}
+        {formatted_date}: {booking_count} bookings, {covers} covers.
+
+        {rows_text}
+        Sent every morning by GoodFoods. Bookings made or cancelled after this
+        email are not included.
+    """
+)
@@ -0,0 +1,102 @@
+from typing import Dict, Iterator, List, Set, Tuple
+import math
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two points in kilometres
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoGrid:
+    """
+    Fixed-size lat/lon bucket index
+
+    Points are hashed into square cells of `cell_deg` degrees. A radius
+    query only visits the cells overlapping the search circle's bounding
+    box, so exact haversine distances are computed for nearby candidates
+    only.
+    """
+
+    def __init__(self, cell_deg: float = 0.1):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._points: Dict[str, Tuple[float, float]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def add(self, key: str, lat: float, lon: float):
+        self.remove(key)
+        self._points[key] = (lat, lon)
+        self._cells.setdefault(self._cell(lat, lon), set()).add(key)
+
+    def remove(self, key: str):
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._cells[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._points.clear()
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, str]]:
+        """
+        All points within `radius_km` of (lat, lon) as (distance_km, key), nearest first
+        """
+        results = []
+        for key in self._candidates(lat, lon, radius_km):
+            plat, plon = self._points[key]
+            distance = haversine_km(lat, lon, plat, plon)
+            if distance <= radius_km:
+                results.append((distance, key))
+        results.sort()
+        return results
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> Iterator[str]:
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        lat_lo, lon_lo = self._cell(min_lat, min_lon)
+        lat_hi, lon_hi = self._cell(max_lat, max_lon)
+        span = (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1)
+
+        if span > len(self._cells):
+            # Very large radius: cheaper to filter the populated cells
+            for (cell_lat, cell_lon), bucket in self._cells.items():
+                if lat_lo <= cell_lat <= lat_hi and lon_lo <= cell_lon <= lon_hi:
+                    yield from bucket
+            return
+
+        for cell_lat in range(lat_lo, lat_hi + 1):
+            for cell_lon in range(lon_lo, lon_hi + 1):
+                yield from self._cells.get((cell_lat, cell_lon), ())
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, max_lat, min_lon, max_lon) enclosing a circle of `radius_km`
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    dlon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
@@ -0,0 +1,259 @@
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import ReservationHold, SessionLocal, Venue, run_with_retries
+from app.services.availability import AvailabilityEngine, NoAvailabilityError, parse_datetime
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import asyncio
+import heapq
+import threading
+import uuid
+
+
+class HoldService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_hold(
+        self,
+        session_id: str,
+        venue_id: str,
+        datetime_str: str,
+        party_size: int,
+        ttl_minutes: Optional[int] = None
+    ) -> ReservationHold:
+        """
+        Set seats aside for `ttl_minutes` (default settings.hold_ttl_minutes)
+
+        Raises ValueError for an empty party or an unknown venue and
+        NoAvailabilityError if it can't seat the party.
+        """
+        if party_size < 1:
+            raise ValueError(f"Party size must be at least 1, got {party_size}")
+        venue = self.db.query(Venue).filter(Venue.id == venue_id).first()
+        if not venue:
+            raise ValueError(f"Venue {venue_id} not found")
+
+        hold_datetime = parse_datetime(datetime_str)
+        availability = AvailabilityEngine(self.db)
+        if not availability.is_available(venue, hold_datetime, party_size):
+            raise NoAvailabilityError(f"{venue.name} has no table for {party_size} at {datetime_str}")
+
+        ttl = timedelta(minutes=ttl_minutes or settings.hold_ttl_minutes)
+
+        def place() -> ReservationHold:
+            hold = ReservationHold(
+                id=f"hold_{uuid.uuid4().hex[:12]}",
+                venue_id=venue_id,
+                session_id=session_id,
+                datetime=hold_datetime,
+                party_size=party_size,
+                expires_at=datetime.utcnow() + ttl
+            )
+            self.db.add(hold)
+            availability.claim(venue, hold_datetime, party_size)
+            self.db.commit()
+            return hold
+
+        hold = run_with_retries(self.db, place)
+        hold_sweeper.schedule(hold.id, hold.expires_at)
+        return hold
+
+    def get_active_hold(self, hold_id: str) -> Optional[ReservationHold]:
+        hold = self.db.get(ReservationHold, hold_id)
+        if hold is None or hold.expires_at <= datetime.utcnow():
+            return None
+        return hold
+
+    def find_hold(
+        self,
+        session_id: str,
+        venue_id: str,
+        hold_datetime: datetime,
+        party_size: int
+    ) -> Optional[ReservationHold]:
+        """
+        The session's unexpired hold for exactly this booking, if any
+        """
+        return self.db.query(ReservationHold).filter(
+            ReservationHold.session_id == session_id,
+            ReservationHold.venue_id == venue_id,
+            ReservationHold.datetime == hold_datetime,
+            ReservationHold.party_size == party_size,
+            ReservationHold.expires_at > datetime.utcnow()
+        ).first()
+
+    def take_hold(self, hold_id: str, venue_id: str, hold_datetime: datetime, party_size: int) -> bool:
+        """
+        Consume a hold inside the caller's transaction
+
+        Returns True if the hold was live and matches the booking, in which
+        case its seats now belong to the booking. Otherwise the hold (if it
+        still exists) is dropped and its seats given back, and the caller
+        has to claim seats itself.
+        """
+        hold = self.db.get(ReservationHold, hold_id)
+        if hold is None or not self._delete(hold_id):
+            return False
+        if (
+            hold.expires_at > datetime.utcnow()
+            and (hold.venue_id, hold.datetime, hold.party_size) == (venue_id, hold_datetime, party_size)
+        ):
+            return True
+        AvailabilityEngine(self.db).release(hold.venue_id, hold.datetime, hold.party_size)
+        return False
+
+    def release_hold(self, hold_id: str) -> bool:
+        """
+        Give a hold's seats back before it expires
+        """
+        def release() -> bool:
+            hold = self.db.get(ReservationHold, hold_id)
+            if hold is None or not self._delete(hold_id):
+                self.db.rollback()
+                return False
+            AvailabilityEngine(self.db).release(hold.venue_id, hold.datetime, hold.party_size)
+            self.db.commit()
+            return True
+
+        return run_with_retries(self.db, release)
+
+    def expire_holds(self, hold_ids: List[str]) -> int:
+        """
+        Release the given holds if they have expired; returns how many were
+        """
+        def expire() -> int:
+            now = datetime.utcnow()
+            holds = self.db.query(ReservationHold).filter(
+                ReservationHold.id.in_(hold_ids),
+                ReservationHold.expires_at <= now
+            ).all()
+            availability = AvailabilityEngine(self.db)
+            expired = 0
+            for hold in holds:
+                if self._delete(hold.id, expired_by=now):
+                    availability.release(hold.venue_id, hold.datetime, hold.party_size)
+                    expired += 1
+            self.db.commit()
+            return expired
+
+        return run_with_retries(self.db, expire) if hold_ids else 0
+
+    def due_holds(self, before: datetime) -> List[Tuple[datetime, str]]:
+        """
+        (expires_at, hold ID) of holds expiring before `before`, soonest first
+        """
+        rows = self.db.execute(
+            select(ReservationHold.expires_at, ReservationHold.id)
+            .where(ReservationHold.expires_at < before)
+            .order_by(ReservationHold.expires_at)
+        ).all()
+        return [(row.expires_at, row.id) for row in rows]
+
+    def _delete(self, hold_id: str, expired_by: Optional[datetime] = None) -> bool:
+        """
+        Delete a hold row; only one of several racing callers sees True
+        """
+        statement = delete(ReservationHold).where(ReservationHold.id == hold_id)
+        if expired_by is not None:
+            statement = statement.where(ReservationHold.expires_at <= expired_by)
+        result = self.db.execute(statement.execution_options(synchronize_session=False))
+        return result.rowcount == 1
+
+
+class HoldSweeper:
+    """
+    Expires holds at their deadline from an in-memory min-heap
+
+    Holds created in this process are pushed as they are made. The task
+    sleeps until the earliest deadline (or until an earlier one is pushed),
+    then expires everything due in one transaction. Every
+    `hold_sweep_interval_seconds` it also pulls holds due within the next
+    interval from the expires_at index, which picks up holds made by other
+    workers and anything left over from a restart.
+    """
+
+    def __init__(self, interval_seconds: float = 60.0):
+        self.interval_seconds = interval_seconds
+        self._heap: List[Tuple[datetime, str]] = []
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, hold_id: str, expires_at: datetime):
+        with self._lock:
+            heapq.heappush(self._heap, (expires_at, hold_id))
+            earliest = self._heap[0][1] == hold_id
+        if earliest and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        next_refill = datetime.utcnow()
+        while True:
+            now = datetime.utcnow()
+            try:
+                if now >= next_refill:
+                    next_refill = now + timedelta(seconds=self.interval_seconds)
+                    await asyncio.to_thread(self._refill, next_refill)
+                due = self._pop_due(now)
+                if due:
+                    await asyncio.to_thread(self._expire, due)
+            except Exception as e:
+                print(f"Hold sweeper error: {e}")
+
+            with self._lock:
+                deadline = min(self._heap[0][0], next_refill) if self._heap else next_refill
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=max((deadline - datetime.utcnow()).total_seconds(), 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop_due(self, now: datetime) -> List[str]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def _refill(self, before: datetime):
+        db = SessionLocal()
+        try:
+            upcoming = HoldService(db).due_holds(before)
+        finally:
+            db.close()
+        with self._lock:
+            known = {hold_id for _, hold_id in self._heap}
+            for entry in upcoming:
+                if entry[1] not in known:
+                    heapq.heappush(self._heap, entry)
+
+    def _expire(self, hold_ids: List[str]):
+        db = SessionLocal()
+        try:
+            HoldService(db).expire_holds(hold_ids)
+        finally:
+            db.close()
+
+
+# Global hold sweeper instance
+hold_sweeper = HoldSweeper(interval_seconds=settings.hold_sweep_interval_seconds)
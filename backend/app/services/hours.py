@@ -0,0 +1,124 @@
+from app.config import settings
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import json
+import re
+
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+MINUTES_PER_DAY = 24 * 60
+
+# (open_minute, close_minute) from midnight; close may exceed 1440 when a
+# service period runs past midnight into the next day
+Interval = Tuple[int, int]
+
+_PERIOD = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def parse_period(text: str) -> Optional[Interval]:
+    """
+    Parse "HH:MM-HH:MM" into minutes; a close at or before the open means
+    the period ends after midnight
+    """
+    match = _PERIOD.match(text)
+    if not match:
+        return None
+    open_h, open_m, close_h, close_m = (int(g) for g in match.groups())
+    start = open_h * 60 + open_m
+    end = close_h * 60 + close_m
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return (start, end)
+
+
+def parse_operating_hours(operating_hours: Optional[Dict[str, str]]) -> Dict[int, List[Interval]]:
+    """
+    Map weekday (0 = Monday) to its service periods
+
+    Values look like "11:00-22:00", "12:00-14:30, 18:00-23:00" or "Closed".
+    Venues without hours are treated as always open; days missing from an
+    otherwise filled-in dict, and unparseable values, as closed.
+    """
+    if not operating_hours:
+        return {day: [(0, MINUTES_PER_DAY)] for day in range(7)}
+
+    hours = {key.strip().lower(): value for key, value in operating_hours.items()}
+    parsed: Dict[int, List[Interval]] = {}
+    for day, name in enumerate(WEEKDAYS):
+        periods = []
+        for part in re.split(r"[,;]", hours.get(name) or ""):
+            period = parse_period(part)
+            if period:
+                periods.append(period)
+        parsed[day] = sorted(periods)
+    return parsed
+
+
+class CompiledHours:
+    """
+    Weekly opening hours compiled to slot granularity for O(1) lookups
+
+    The week is split into fixed-size slots (settings.slot_minutes). For
+    each slot we store how many consecutive slots from there on lie inside
+    a service period, wrapping from Sunday night into Monday. "Open at t"
+    is one array read; "can seat a booking of d minutes at t" compares
+    that run length against the slots the booking covers.
+    """
+
+    __slots__ = ("slot_minutes", "slots_per_day", "_runs")
+
+    def __init__(self, periods: Dict[int, List[Interval]], slot_minutes: int):
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = MINUTES_PER_DAY // slot_minutes
+        week = 7 * self.slots_per_day
+
+        is_open = bytearray(week)
+        for day, intervals in periods.items():
+            for start, end in intervals:
+                # Only slots lying entirely inside the period count as open
+                first = day * self.slots_per_day - (-start // slot_minutes)
+                last = day * self.slots_per_day + end // slot_minutes
+                for i in range(first, last):
+                    is_open[i % week] = 1
+
+        runs = array("H", bytes(2 * week))
+        run = 0
+        for i in reversed(range(2 * week)):
+            run = run + 1 if is_open[i % week] else 0
+            if i < week:
+                runs[i] = min(run, week)
+        self._runs = runs
+
+    def _slot(self, dt: datetime) -> int:
+        return dt.weekday() * self.slots_per_day + (dt.hour * 60 + dt.minute) // self.slot_minutes
+
+    def is_open_at(self, dt: datetime) -> bool:
+        return self._runs[self._slot(dt)] > 0
+
+    def can_seat(self, dt: datetime, duration_minutes: int) -> bool:
+        """
+        True if [dt, dt + duration) lies inside one continuous service period
+        """
+        offset = (dt.hour * 60 + dt.minute) % self.slot_minutes
+        needed = -(-(offset + duration_minutes) // self.slot_minutes)
+        return self._runs[self._slot(dt)] >= needed
+
+
+_compiled: Dict[Tuple[str, int], CompiledHours] = {}
+
+
+def compile_hours(operating_hours: Optional[Dict[str, str]], slot_minutes: Optional[int] = None) -> CompiledHours:
+    """
+    Compiled form of a venue's operating_hours
+
+    Compiled objects are shared between venues with identical hours, so
+    memory grows with the number of distinct schedules, not venues.
+    """
+    slot_minutes = slot_minutes or settings.slot_minutes
+    key = (json.dumps(operating_hours, sort_keys=True) if operating_hours else "", slot_minutes)
+    hours = _compiled.get(key)
+    if hours is None:
+        hours = _compiled[key] = CompiledHours(parse_operating_hours(operating_hours), slot_minutes)
+    return hours
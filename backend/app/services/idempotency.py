@@ -0,0 +1,120 @@
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import IdempotencyKey
+from app.services.cache import TTLCache
+from datetime import datetime, timedelta
+from typing import Any, Dict, NamedTuple, Optional
+import hashlib
+import json
+import time
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: Dict[str, Any]
+
+
+def fingerprint(payload: Any) -> str:
+    """
+    Stable hash of a request, to spot a key reused for a different request
+    """
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key -> response, persisted with a TTL
+
+    Responses are written to the idempotency_keys table in the same
+    transaction as the work they describe, so a stored response always
+    means the work committed, and a concurrent duplicate fails on the
+    primary key instead of doing the work twice. A bounded TTLCache in
+    front answers repeat lookups without a query.
+    """
+
+    PURGE_INTERVAL_SECONDS = 600
+
+    def __init__(self, ttl_hours: float = 24.0, cache_size: int = 4096):
+        self.ttl = timedelta(hours=ttl_hours)
+        self._cache = TTLCache(maxsize=cache_size, ttl=self.ttl.total_seconds())
+        self._purged_at = 0.0
+
+    def lookup(self, db: Session, key: str) -> Optional[StoredResponse]:
+        stored = self._cache.get(key)
+        if stored is not None:
+            return stored
+        row = db.get(IdempotencyKey, key)
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        stored = StoredResponse(row.request_hash, row.status_code, row.response)
+        self._remember(key, stored, row.expires_at)
+        return stored
+
+    def record(
+        self,
+        db: Session,
+        key: str,
+        request_hash: str,
+        body: Dict[str, Any],
+        status_code: int = 200
+    ):
+        """
+        Add the response to the caller's transaction; cached once it commits
+
+        An expired row for the same key may still be waiting for the purge;
+        it is replaced rather than tripping the primary key.
+        """
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        self._purge_expired(db)
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.expires_at <= now))
+        db.add(IdempotencyKey(
+            key=key,
+            request_hash=request_hash,
+            status_code=status_code,
+            response=body,
+            expires_at=expires_at
+        ))
+        db.info.setdefault("idempotency_pending", []).append(
+            (key, StoredResponse(request_hash, status_code, body), expires_at)
+        )
+
+    def _committed(self, db: Session):
+        for key, stored, expires_at in db.info.pop("idempotency_pending", []):
+            self._remember(key, stored, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+    def _remember(self, key: str, stored: StoredResponse, expires_at: datetime):
+        remaining = (expires_at - datetime.utcnow()).total_seconds()
+        if remaining > 0:
+            self._cache.set(key, stored, ttl=remaining)
+
+    def _purge_expired(self, db: Session):
+        # An expires_at index range delete, at most every PURGE_INTERVAL_SECONDS
+        now = time.monotonic()
+        if now - self._purged_at < self.PURGE_INTERVAL_SECONDS:
+            return
+        self._purged_at = now
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore(
+    ttl_hours=settings.idempotency_ttl_hours,
+    cache_size=settings.idempotency_cache_size
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed(session):
+    idempotency_store._committed(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_uncommitted(session):
+    session.info.pop("idempotency_pending", None)
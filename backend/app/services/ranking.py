@@ -0,0 +1,187 @@
+import numpy as np
+from app.services.geo import EARTH_RADIUS_KM
+from app.services.venue_index import IndexedVenue, VenueIndex
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+
+
+# Relative weight of each score component; override per request with
+# prefs["weights"], e.g. {"rating": 1.0, "distance": 2.0}
+DEFAULT_WEIGHTS = {
+    "rating": 1.0,
+    "text": 1.0,
+    "distance": 0.5,
+    "price": 0.3,
+    "cuisine": 0.5,
+    "tags": 0.5,
+    "capacity": 0.2,
+}
+
+# Distance at which the distance component has decayed to ~37%
+DEFAULT_DISTANCE_SCALE_KM = 5.0
+
+
+def _bitmask(vocab: Dict[str, int], terms: Iterable[str], words: int) -> np.ndarray:
+    mask = np.zeros(words, dtype=np.uint64)
+    for term in terms:
+        bit = vocab.get(term)
+        if bit is not None:
+            mask[bit // 64] |= np.uint64(1 << (bit % 64))
+    return mask
+
+
+class RankingEngine:
+    """
+    Columnar venue features for vectorized relevance scoring
+
+    Rating, price tier, capacity, coordinates and cuisine/tag bitmasks are
+    kept in NumPy arrays mirroring the venue index. A request scores every
+    candidate in one vectorized pass and selects the top k with
+    argpartition, so the Python-level work does not grow with the catalog.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = -1
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._cuisine_vocab: Dict[str, int] = {}
+        self._tag_vocab: Dict[str, int] = {}
+        self._build([])
+
+    def sync(self, index: VenueIndex):
+        """
+        Rebuild the columns if the venue index changed since the last build
+        """
+        if index.generation != self._generation:
+            with self._lock:
+                generation = index.generation
+                if generation != self._generation:
+                    self._build(index.records())
+                    self._generation = generation
+
+    def _build(self, records: List[IndexedVenue]):
+        self._ids = [r.id for r in records]
+        self._row_of = {venue_id: row for row, venue_id in enumerate(self._ids)}
+        self.rating = np.array([r.rating for r in records], dtype=np.float64)
+        self.price_tier = np.array([r.price_tier for r in records], dtype=np.int8)
+        self.capacity = np.array([r.capacity for r in records], dtype=np.int32)
+        # Coordinates are stored in radians, with cos(lat) precomputed for haversine
+        self.lat = np.radians(np.array([np.nan if r.latitude is None else r.latitude for r in records], dtype=np.float64))
+        self.lon = np.radians(np.array([np.nan if r.longitude is None else r.longitude for r in records], dtype=np.float64))
+        self.cos_lat = np.cos(self.lat)
+
+        self._cuisine_vocab = {t: i for i, t in enumerate(sorted({c for r in records for c in r.cuisines}))}
+        self._tag_vocab = {t: i for i, t in enumerate(sorted({t for r in records for t in r.tags}))}
+        self.cuisine_mask = self._masks(self._cuisine_vocab, [r.cuisines for r in records])
+        self.tag_mask = self._masks(self._tag_vocab, [r.tags for r in records])
+
+    @staticmethod
+    def _masks(vocab: Dict[str, int], terms_per_row: List[Tuple[str, ...]]) -> np.ndarray:
+        """
+        (rows, words) uint64 bitmask matrix, one bit per vocabulary term
+        """
+        words = max(1, (len(vocab) + 63) // 64)
+        rows, bits = [], []
+        for row, terms in enumerate(terms_per_row):
+            for term in terms:
+                rows.append(row)
+                bits.append(vocab[term])
+        rows = np.array(rows, dtype=np.intp)
+        bits = np.array(bits, dtype=np.uint64)
+        mask = np.zeros((len(terms_per_row), words), dtype=np.uint64)
+        np.bitwise_or.at(mask, (rows, (bits // 64).astype(np.intp)), np.left_shift(np.uint64(1), bits % 64))
+        return mask
+
+    def rank(
+        self,
+        venue_ids: Optional[List[str]] = None,
+        relevance: Optional[List[float]] = None,
+        prefs: Optional[Dict[str, Any]] = None,
+        party_size: Optional[int] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        limit: int = 10
+    ) -> List[Tuple[str, float]]:
+        """
+        Score the candidates (all venues if `venue_ids` is None) and return
+        the best `limit` as (venue ID, score) pairs, highest first
+
+        `relevance` is an optional per-candidate text match score in [0, 1],
+        aligned with `venue_ids`.
+
+        Recognized prefs: weights, price_tier, cuisines, tags, distance_scale_km
+        """
+        prefs = prefs or {}
+        weights = {**DEFAULT_WEIGHTS, **(prefs.get("weights") or {})}
+
+        # Snapshot the columns so a concurrent rebuild can't tear them
+        with self._lock:
+            ids = self._ids
+            # A full-catalog slice keeps the columns as views instead of copies
+            if venue_ids is None:
+                rows = slice(None)
+            else:
+                known = [i for i, v in enumerate(venue_ids) if v in self._row_of]
+                rows = np.fromiter((self._row_of[venue_ids[i]] for i in known), dtype=np.intp, count=len(known))
+                if relevance is not None:
+                    relevance = np.asarray(relevance, dtype=np.float64)[known]
+            rating = self.rating[rows]
+            price_tier = self.price_tier[rows]
+            capacity = self.capacity[rows]
+            lat = self.lat[rows]
+            lon = self.lon[rows]
+            cos_lat = self.cos_lat[rows]
+            cuisine_mask = self.cuisine_mask[rows]
+            tag_mask = self.tag_mask[rows]
+            cuisine_vocab = self._cuisine_vocab
+            tag_vocab = self._tag_vocab
+
+        if len(rating) == 0:
+            return []
+
+        components: List[Tuple[float, np.ndarray]] = [(weights["rating"], rating / 5.0)]
+
+        if relevance is not None:
+            components.append((weights["text"], relevance))
+
+        if prefs.get("price_tier"):
+            components.append((weights["price"], 1.0 - np.abs(price_tier - int(prefs["price_tier"])) / 3.0))
+
+        if prefs.get("cuisines"):
+            wanted = _bitmask(cuisine_vocab, (c.strip().lower() for c in prefs["cuisines"]), cuisine_mask.shape[1])
+            components.append((weights["cuisine"], (cuisine_mask & wanted).any(axis=1).astype(np.float64)))
+
+        if prefs.get("tags"):
+            tags = {t.strip().lower() for t in prefs["tags"]}
+            wanted = _bitmask(tag_vocab, tags, tag_mask.shape[1])
+            matched = np.zeros(len(rating), dtype=np.uint8)
+            for word in np.flatnonzero(wanted):
+                matched += np.bitwise_count(tag_mask[:, word] & wanted[word])
+            components.append((weights["tags"], matched / len(tags)))
+
+        if party_size:
+            components.append((weights["capacity"], np.clip(1.0 - party_size / np.maximum(capacity, 1), 0.0, 1.0)))
+
+        if latitude is not None and longitude is not None:
+            phi = np.radians(latitude)
+            a = (
+                np.sin((lat - phi) / 2) ** 2
+                + np.cos(phi) * cos_lat * np.sin((lon - np.radians(longitude)) / 2) ** 2
+            )
+            distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+            scale = float(prefs.get("distance_scale_km") or DEFAULT_DISTANCE_SCALE_KM)
+            components.append((weights["distance"], np.nan_to_num(np.exp(-distance / scale), nan=0.0)))
+
+        total_weight = sum(w for w, _ in components) or 1.0
+        score = sum(w * values for w, values in components) / total_weight
+
+        k = min(limit, len(score))
+        top = np.argpartition(-score, k - 1)[:k] if k < len(score) else np.arange(len(score))
+        top = top[np.argsort(-score[top], kind="stable")]
+        row_ids = range(len(ids)) if venue_ids is None else rows
+        return [(ids[row_ids[i]], round(float(score[i]), 4)) for i in top]
+
+
+# Global ranking engine instance
+ranking_engine = RankingEngine()
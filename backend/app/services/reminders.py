@@ -0,0 +1,258 @@
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import Reservation, ReminderSchedule, SessionLocal, run_with_retries
+from app.services.email_outbox import enqueue_many
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import heapq
+import threading
+
+
+def reminder_rows(reservations: Iterable[Tuple[str, datetime]], now: datetime) -> List[Dict[str, Any]]:
+    """
+    reminder_schedule rows for (reservation ID, datetime) pairs
+
+    One per settings.reminder_lead_minutes, skipping any already due at
+    `now`. Reservation times are local wall-clock times with no zone, so
+    due_at is too, and `now` is datetime.now(), not UTC.
+    """
+    return [
+        {
+            "reservation_id": reservation_id,
+            "lead_minutes": lead,
+            "due_at": reservation_datetime - timedelta(minutes=lead),
+            "status": "pending",
+        }
+        for reservation_id, reservation_datetime in reservations
+        for lead in settings.reminder_lead_minutes
+        if reservation_datetime - timedelta(minutes=lead) > now
+    ]
+
+
+def schedule_reminders(db: Session, reservations: Iterable[Tuple[str, datetime]]):
+    """
+    Add reminders for (reservation ID, datetime) pairs to the caller's transaction
+
+    The scheduler hears about them once the transaction commits.
+    """
+    rows = reminder_rows(reservations, datetime.now())
+    if not rows:
+        return
+    scheduled = db.execute(
+        insert(ReminderSchedule).returning(ReminderSchedule.due_at, ReminderSchedule.id),
+        rows
+    ).all()
+    db.info.setdefault("reminders_pending", []).extend((due_at, reminder_id) for due_at, reminder_id in scheduled)
+
+
+def cancel_reminders(db: Session, reservation_id: str):
+    """
+    Drop a reservation's unsent reminders, in the caller's transaction
+    """
+    db.execute(
+        update(ReminderSchedule)
+        .where(ReminderSchedule.reservation_id == reservation_id, ReminderSchedule.status == "pending")
+        .values(status="cancelled")
+        .execution_options(synchronize_session=False)
+    )
+
+
+class ReminderScheduler:
+    """
+    Hands reservation reminders to the email outbox as they fall due
+
+    Works like the HoldSweeper: reminders due before the next refill sit in
+    an in-memory min-heap of (due_at, reminder ID), and the task sleeps
+    until the earliest one. Reminders committed in this process are pushed
+    as they are made. Every `refill_seconds` the heap is topped up from the
+    (status, due_at) index, which picks up other workers' reminders and
+    anything left over from a restart.
+
+    The heap only says when to wake. What is due is claimed from the index
+    in batches of `batch_size`. One UPDATE ... WHERE id IN (SELECT ...
+    LIMIT) AND status = 'pending' marks them queued, and the same
+    transaction writes the reminder emails to the outbox. So a reminder is
+    sent once even with several workers, and is never lost between the
+    two. Cancelling a reservation marks its reminders cancelled, which takes
+    them out of the pending range for good. The heap entries left behind
+    just wake the task to an empty claim.
+
+    due_at is local wall-clock time like Reservation.datetime, so the
+    scheduler keeps time with datetime.now().
+    """
+
+    def __init__(self, batch_size: int = 500, refill_seconds: float = 300.0):
+        self.batch_size = batch_size
+        self.refill_seconds = refill_seconds
+        self._heap: List[Tuple[datetime, int]] = []
+        self._horizon: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, reminders: List[Tuple[datetime, int]]):
+        """
+        Push committed (due_at, reminder ID) pairs; later ones wait for a refill
+        """
+        with self._lock:
+            if self._horizon is None:
+                return
+            earliest = self._heap[0][0] if self._heap else None
+            for entry in reminders:
+                if entry[0] < self._horizon:
+                    heapq.heappush(self._heap, entry)
+            woke = self._heap and (earliest is None or self._heap[0][0] < earliest)
+        if woke and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+    async def _run(self):
+        next_refill = datetime.now()
+        while True:
+            now = datetime.now()
+            try:
+                if now >= next_refill:
+                    next_refill = now + timedelta(seconds=self.refill_seconds)
+                    await asyncio.to_thread(self._refill, next_refill)
+                if self._pop_due(now):
+                    while await asyncio.to_thread(self._claim, now) == self.batch_size:
+                        pass
+            except Exception as e:
+                print(f"Reminder scheduler error: {e}")
+
+            with self._lock:
+                deadline = min(self._heap[0][0], next_refill) if self._heap else next_refill
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=max((deadline - datetime.now()).total_seconds(), 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop_due(self, now: datetime) -> int:
+        due = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+                due += 1
+        return due
+
+    def _refill(self, before: datetime):
+        # Widen the horizon first, so reminders committed during the read are pushed
+        with self._lock:
+            self._horizon = before
+        db = SessionLocal()
+        try:
+            upcoming = db.execute(
+                select(ReminderSchedule.due_at, ReminderSchedule.id)
+                .where(ReminderSchedule.status == "pending", ReminderSchedule.due_at < before)
+                .order_by(ReminderSchedule.due_at)
+            ).all()
+        finally:
+            db.close()
+        with self._lock:
+            known = {reminder_id for _, reminder_id in self._heap}
+            for due_at, reminder_id in upcoming:
+                if reminder_id not in known:
+                    heapq.heappush(self._heap, (due_at, reminder_id))
+
+    def _claim(self, now: datetime) -> int:
+        """
+        Queue the emails for up to batch_size due reminders; returns how many were claimed
+        """
+        db = SessionLocal()
+        try:
+            def claim() -> int:
+                is_due = (ReminderSchedule.status == "pending", ReminderSchedule.due_at <= now)
+                due = select(ReminderSchedule.id).where(*is_due).order_by(ReminderSchedule.due_at).limit(self.batch_size)
+                claimed = db.execute(
+                    update(ReminderSchedule)
+                    .where(ReminderSchedule.id.in_(due), *is_due)
+                    .values(status="queued", queued_at=datetime.utcnow())
+                    .returning(ReminderSchedule.id, ReminderSchedule.reservation_id, ReminderSchedule.lead_minutes)
+                    .execution_options(synchronize_session=False)
+                ).all()
+                if not claimed:
+                    db.rollback()
+                    return 0
+
+                # One email per reservation: if a restart left several of its
+                # reminders due, only the latest (shortest lead) is worth sending
+                latest = {}
+                for row in sorted(claimed, key=lambda row: row.lead_minutes, reverse=True):
+                    latest[row.reservation_id] = row.id
+                reservations = db.execute(
+                    select(
+                        Reservation.id, Reservation.contact_email, Reservation.contact_name,
+                        Reservation.booking_id, Reservation.venue_name, Reservation.datetime,
+                        Reservation.party_size
+                    ).where(
+                        Reservation.id.in_(latest),
+                        Reservation.status == "confirmed",
+                        Reservation.datetime > now
+                    )
+                ).all()
+                enqueue_many(db, "reservation_reminder", [
+                    dict(
+                        to_email=r.contact_email,
+                        to_name=r.contact_name,
+                        booking_id=r.booking_id,
+                        venue_name=r.venue_name,
+                        reservation_datetime=r.datetime.isoformat(),
+                        party_size=r.party_size
+                    )
+                    for r in reservations
+                ])
+                sent = {latest[r.id] for r in reservations}
+                skipped = [row.id for row in claimed if row.id not in sent]
+                if skipped:
+                    db.execute(
+                        update(ReminderSchedule)
+                        .where(ReminderSchedule.id.in_(skipped))
+                        .values(status="skipped")
+                        .execution_options(synchronize_session=False)
+                    )
+                db.commit()
+                return len(claimed)
+
+            return run_with_retries(db, claim)
+        finally:
+            db.close()
+
+
+# Global reminder scheduler instance
+reminder_scheduler = ReminderScheduler(
+    batch_size=settings.reminder_batch_size,
+    refill_seconds=settings.reminder_refill_seconds
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_on_commit(session):
+    reminders = session.info.pop("reminders_pending", None)
+    if reminders:
+        reminder_scheduler.schedule(reminders)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    session.info.pop("reminders_pending", None)
@@ -1,11 +1,74 @@
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from app.database import Reservation, Venue
-from datetime import datetime
-from typing import List, Optional
+from app.config import settings
+from app.database import Reservation, Venue, next_change_seqs, run_with_retries
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
 import uuid
-import random
-import string
-from app.services.email_service import email_service
+from app.services.booking_ids import booking_ids
+from app.services.cursors import Page, decode_cursor, encode_cursor
+from app.services.availability import AvailabilityEngine, NoAvailabilityError, parse_datetime
+from app.services.email_outbox import enqueue, enqueue_many
+from app.services.hold_service import HoldService
+from app.services.reminders import cancel_reminders, schedule_reminders
+from app.services.venue_index import venue_hours
+from app.services.waitlist_service import WaitlistService
+
+
+# Just what a ReservationResponse needs; listings read these columns as
+# plain rows instead of hydrating Reservation objects
+LISTING_COLUMNS = (
+    Reservation.id,
+    Reservation.booking_id,
+    Reservation.venue_id,
+    Reservation.venue_name,
+    Reservation.datetime,
+    Reservation.party_size,
+    Reservation.status,
+    Reservation.contact_name,
+    Reservation.contact_phone,
+    Reservation.contact_email,
+    Reservation.notes,
+)
+
+CHANGE_COLUMNS = LISTING_COLUMNS + (
+    Reservation.updated_at,
+    Reservation.change_seq,
+)
+
+EXPORT_COLUMNS = LISTING_COLUMNS + (
+    Reservation.session_id,
+    Reservation.created_at,
+)
+
+# A venue digest line, plus where to send the venue's digest
+DIGEST_COLUMNS = (
+    Reservation.venue_id,
+    Reservation.booking_id,
+    Reservation.datetime,
+    Reservation.party_size,
+    Reservation.contact_name,
+    Reservation.contact_phone,
+    Reservation.notes,
+    Venue.name.label("venue_name"),
+    Venue.email.label("venue_email"),
+)
+
+# Everything but "cancelled"; the session listing checks it against the
+# status column of ix_reservations_session_datetime_id_status as it walks
+LIVE_STATUSES = ("confirmed", "pending")
+
+
+class ChangeBatch(NamedTuple):
+    rows: List[Row]
+    cursor: str
+    has_more: bool
+
+
+class BatchItemResult(NamedTuple):
+    reservation: Optional[Reservation]  # Not attached to the session
+    error: Optional[str]
 
 
 class ReservationService:
@@ -21,43 +84,76 @@ class ReservationService:
         contact_name: str,
         contact_phone: str,
         contact_email: str,
-        notes: Optional[str] = None
+        notes: Optional[str] = None,
+        hold_id: Optional[str] = None,
+        on_booked: Optional[Callable[[Reservation], None]] = None
     ) -> Reservation:
         """
         Create a new reservation
+        
+        Raises ValueError for an empty party and NoAvailabilityError if the
+        venue can't seat the party. The seat claim and the insert commit
+        together, so concurrent bookings can't overbook a slot.
+        
+        A live hold for the same venue, time and party size (`hold_id`, or
+        else the session's matching hold) is converted: its seats carry over
+        to the reservation instead of being claimed again.
+        
+        `on_booked` is called with the new reservation inside its
+        transaction, just before commit, to write related rows atomically.
         """
+        if party_size < 1:
+            raise ValueError(f"Party size must be at least 1, got {party_size}")
+        
+        # Lease the booking ID node before the claim takes the write lock
+        booking_ids.ensure_node()
+        
         # Get venue name
         venue = self.db.query(Venue).filter(Venue.id == venue_id).first()
         venue_name = venue.name if venue else "Unknown Venue"
         
         # Parse datetime
-        reservation_datetime = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
+        reservation_datetime = parse_datetime(datetime_str)
         
-        # Generate booking ID
-        booking_id = f"GF-{''.join(random.choices(string.ascii_uppercase + string.digits, k=6))}"
-        
-        reservation = Reservation(
-            id=f"res_{uuid.uuid4().hex[:12]}",
-            booking_id=booking_id,
-            venue_id=venue_id,
-            venue_name=venue_name,
-            session_id=session_id,
-            datetime=reservation_datetime,
-            party_size=party_size,
-            status="confirmed",
-            contact_name=contact_name,
-            contact_phone=contact_phone,
-            contact_email=contact_email,
-            notes=notes
+        holds = HoldService(self.db)
+        hold = holds.get_active_hold(hold_id) if hold_id else holds.find_hold(
+            session_id, venue_id, reservation_datetime, party_size
         )
+        hold_key = hold.id if hold is not None else None
         
-        self.db.add(reservation)
-        self.db.commit()
-        self.db.refresh(reservation)
+        # Cheap read-only check first, so obviously full slots take no locks.
+        # A hold's own seats count as taken here, so leave that case to claim.
+        availability = AvailabilityEngine(self.db)
+        if venue and hold is None and not availability.is_available(venue, reservation_datetime, party_size):
+            raise NoAvailabilityError(f"{venue_name} has no table for {party_size} at {datetime_str}")
+        
+        # Generate booking ID
+        booking_id = booking_ids.next_id()
         
-        # Send confirmation email
-        try:
-            email_service.send_reservation_confirmation_sync(
+        def book() -> Reservation:
+            reservation = Reservation(
+                id=f"res_{uuid.uuid4().hex[:12]}",
+                booking_id=booking_id,
+                venue_id=venue_id,
+                venue_name=venue_name,
+                session_id=session_id,
+                datetime=reservation_datetime,
+                party_size=party_size,
+                status="confirmed",
+                contact_name=contact_name,
+                contact_phone=contact_phone,
+                contact_email=contact_email,
+                notes=notes
+            )
+            self.db.add(reservation)
+            taken = hold_key is not None and holds.take_hold(hold_key, venue_id, reservation_datetime, party_size)
+            if venue and not taken:
+                availability.claim(venue, reservation_datetime, party_size)
+            if on_booked:
+                on_booked(reservation)
+            schedule_reminders(self.db, [(reservation.id, reservation_datetime)])
+            # Sent from the outbox after commit, so SMTP never holds up the booking
+            enqueue(self.db, "reservation_confirmation", dict(
                 to_email=contact_email,
                 to_name=contact_name,
                 booking_id=booking_id,
@@ -65,23 +161,180 @@ class ReservationService:
                 reservation_datetime=datetime_str,
                 party_size=party_size,
                 notes=notes
-            )
-        except Exception as e:
-            import traceback
-            print(f"❌ Warning: Failed to send confirmation email: {e}")
-            print(f"   Full error: {traceback.format_exc()}")
-            # Don't fail the reservation if email fails
+            ))
+            self.db.commit()
+            return reservation
         
+        reservation = run_with_retries(self.db, book)
+        self.db.refresh(reservation)
         return reservation
     
-    def get_reservations(self, session_id: str) -> List[Reservation]:
+    def create_reservations_batch(
+        self,
+        session_id: str,
+        items: List[Dict[str, Any]]
+    ) -> List[BatchItemResult]:
         """
-        Get all reservations for a session
+        Create many reservations in one transaction
+        
+        Each item has the create_reservation arguments (venue_id,
+        datetime_str, party_size, contact_name, contact_phone,
+        contact_email, notes). Venues are loaded with one query, seats are
+        claimed for the whole batch at once, and the rows go in with a
+        single executemany insert. Items that can't be booked are reported
+        in their result instead of failing the batch. Confirmation emails
+        and reminders go in with one more bulk insert each.
         """
-        return self.db.query(Reservation).filter(
-            Reservation.session_id == session_id,
-            Reservation.status != "cancelled"
-        ).order_by(Reservation.datetime.desc()).all()
+        booking_ids.ensure_node()
+        results: List[Optional[BatchItemResult]] = [None] * len(items)
+        venue_ids = {item["venue_id"] for item in items}
+        venues = {v.id: v for v in self.db.query(Venue).filter(Venue.id.in_(venue_ids))}
+        
+        bookable = []  # (item index, venue, datetime)
+        for index, item in enumerate(items):
+            venue = venues.get(item["venue_id"])
+            if not venue:
+                results[index] = BatchItemResult(None, f"Venue {item['venue_id']} not found")
+                continue
+            try:
+                reservation_datetime = parse_datetime(item["datetime_str"])
+            except ValueError:
+                results[index] = BatchItemResult(None, f"Invalid datetime {item['datetime_str']}")
+                continue
+            if not 1 <= item["party_size"] <= venue.capacity:
+                results[index] = BatchItemResult(None, f"{venue.name} can't seat a party of {item['party_size']}")
+                continue
+            if not venue_hours(venue).can_seat(reservation_datetime, settings.dining_duration_minutes):
+                results[index] = BatchItemResult(None, f"{venue.name} is closed at {item['datetime_str']}")
+                continue
+            bookable.append((index, venue, reservation_datetime))
+        
+        def book() -> List[Dict[str, Any]]:
+            fits = AvailabilityEngine(self.db).claim_batch(
+                [(venue, dt, items[index]["party_size"]) for index, venue, dt in bookable]
+            )
+            rows = []
+            for (index, venue, dt), ok in zip(bookable, fits):
+                item = items[index]
+                if not ok:
+                    results[index] = BatchItemResult(
+                        None, f"{venue.name} has no table for {item['party_size']} at {item['datetime_str']}"
+                    )
+                    continue
+                rows.append({
+                    "id": f"res_{uuid.uuid4().hex[:12]}",
+                    "booking_id": booking_ids.next_id(),
+                    "venue_id": venue.id,
+                    "venue_name": venue.name,
+                    "session_id": session_id,
+                    "datetime": dt,
+                    "party_size": item["party_size"],
+                    "status": "confirmed",
+                    "contact_name": item["contact_name"],
+                    "contact_phone": item["contact_phone"],
+                    "contact_email": item["contact_email"],
+                    "notes": item.get("notes"),
+                })
+                results[index] = BatchItemResult(Reservation(**rows[-1]), None)
+            if rows:
+                # Bulk inserts skip mapper events; number the rows as one block
+                for row, change_seq in zip(rows, next_change_seqs(self.db.connection(), len(rows))):
+                    row["change_seq"] = change_seq
+                self.db.execute(insert(Reservation), rows)
+                schedule_reminders(self.db, [(row["id"], row["datetime"]) for row in rows])
+                enqueue_many(self.db, "reservation_confirmation", [
+                    dict(
+                        to_email=row["contact_email"],
+                        to_name=row["contact_name"],
+                        booking_id=row["booking_id"],
+                        venue_name=row["venue_name"],
+                        reservation_datetime=row["datetime"].isoformat(),
+                        party_size=row["party_size"],
+                        notes=row["notes"]
+                    )
+                    for row in rows
+                ])
+            self.db.commit()
+            return rows
+        
+        if bookable:
+            run_with_retries(self.db, book)
+        return results
+    
+    def get_reservations(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Page:
+        """
+        Get reservations for a session, newest first
+        
+        Rows carry the LISTING_COLUMNS attributes. Without a limit the page
+        holds all of them. The session's entries of
+        ix_reservations_session_datetime_id_status are walked in page order
+        from the cursor, so there is no sort and a page stops at `limit`.
+        """
+        return self._listing_page(
+            select(*LISTING_COLUMNS).where(
+                Reservation.session_id == session_id,
+                Reservation.status.in_(LIVE_STATUSES)
+            ),
+            limit,
+            cursor
+        )
+    
+    def export_reservations(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        statuses: Optional[List[str]] = None,
+        batch_size: Optional[int] = None
+    ) -> Iterator[List[Row]]:
+        """
+        Stream reservations in [start, end), oldest first, in batches
+        
+        Rows carry the EXPORT_COLUMNS attributes and are read through a
+        server-side cursor `batch_size` at a time, so memory stays flat
+        however many rows match.
+        """
+        statement = select(*EXPORT_COLUMNS).order_by(Reservation.datetime)
+        if start is not None:
+            statement = statement.where(Reservation.datetime >= start)
+        if end is not None:
+            statement = statement.where(Reservation.datetime < end)
+        if statuses:
+            statement = statement.where(Reservation.status.in_(statuses))
+        
+        result = self.db.execute(
+            statement.execution_options(yield_per=batch_size or settings.export_batch_size)
+        )
+        for batch in result.partitions():
+            yield batch
+    
+    def day_bookings(self, day: date, batch_size: Optional[int] = None) -> Iterator[Row]:
+        """
+        Stream a day's confirmed reservations grouped by venue, earliest first
+        
+        Rows carry DIGEST_COLUMNS and arrive ordered by (venue_id, datetime),
+        so each venue's bookings are contiguous. They are read through a
+        server-side cursor `batch_size` at a time, like export_reservations.
+        """
+        start = datetime.combine(day, datetime.min.time())
+        statement = (
+            select(*DIGEST_COLUMNS)
+            .join(Venue, Venue.id == Reservation.venue_id)
+            .where(
+                Reservation.datetime >= start,
+                Reservation.datetime < start + timedelta(days=1),
+                Reservation.status == "confirmed"
+            )
+            .order_by(Reservation.venue_id, Reservation.datetime)
+        )
+        result = self.db.execute(
+            statement.execution_options(yield_per=batch_size or settings.digest_batch_size)
+        )
+        yield from result
     
     def get_reservation(self, reservation_id: str) -> Optional[Reservation]:
         """
@@ -92,19 +345,149 @@ class ReservationService:
     def cancel_reservation(self, reservation_id: str) -> bool:
         """
         Cancel a reservation
+        
+        The freed seats go to parties on the venue's waitlist for any time
+        overlapping the freed slots, in the same transaction, which also
+        queues the guest's cancellation email and the promoted parties' emails.
         """
-        reservation = self.get_reservation(reservation_id)
-        if not reservation:
+        if not self.get_reservation(reservation_id):
             return False
+        # Promoted waiters get booking IDs once the release holds the write lock
+        booking_ids.ensure_node()
         
-        reservation.status = "cancelled"
-        self.db.commit()
+        def cancel():
+            reservation = self.get_reservation(reservation_id)
+            if reservation.status == "confirmed":
+                AvailabilityEngine(self.db).release(
+                    reservation.venue_id, reservation.datetime, reservation.party_size
+                )
+                promotions = self._promote_waiters(reservation.venue_id, reservation.datetime)
+                schedule_reminders(self.db, [(promoted.id, promoted.datetime) for promoted in promotions])
+                for promoted in promotions:
+                    enqueue(self.db, "waitlist_promotion", dict(
+                        to_email=promoted.contact_email,
+                        to_name=promoted.contact_name,
+                        booking_id=promoted.booking_id,
+                        venue_name=promoted.venue_name,
+                        reservation_datetime=promoted.datetime.isoformat(),
+                        party_size=promoted.party_size
+                    ))
+            if reservation.status != "cancelled":
+                cancel_reminders(self.db, reservation.id)
+                enqueue(self.db, "reservation_cancellation", dict(
+                    to_email=reservation.contact_email,
+                    to_name=reservation.contact_name,
+                    booking_id=reservation.booking_id,
+                    venue_name=reservation.venue_name,
+                    reservation_datetime=reservation.datetime.isoformat(),
+                    party_size=reservation.party_size
+                ))
+            reservation.status = "cancelled"
+            self.db.commit()
+        
+        run_with_retries(self.db, cancel)
         return True
     
-    def get_all_reservations(self, limit: int = 100) -> List[Reservation]:
+    def _promote_waiters(self, venue_id: str, freed_datetime: datetime) -> List[Reservation]:
         """
-        Get all reservations (for admin)
+        Turn waitlist entries into reservations while seats last
+        
+        Every waiter whose booking overlaps the freed slots is a candidate,
+        not just those at the cancelled time. They are taken oldest first,
+        each at its own time; a party that doesn't fit is skipped so smaller
+        parties further back can still get in. Runs in the caller's
+        transaction.
         """
-        return self.db.query(Reservation).order_by(
-            Reservation.datetime.desc()
-        ).limit(limit).all()
+        venue = self.db.query(Venue).filter(Venue.id == venue_id).first()
+        waiters = WaitlistService(self.db).waiting(venue_id, freed_datetime)
+        if not venue or not waiters:
+            return []
+        
+        availability = AvailabilityEngine(self.db)
+        promoted = []
+        for entry in waiters:
+            try:
+                # A savepoint, so a claim that doesn't fit undoes only itself
+                with self.db.begin_nested():
+                    availability.claim(venue, entry.datetime, entry.party_size)
+            except NoAvailabilityError:
+                continue
+            reservation = Reservation(
+                id=f"res_{uuid.uuid4().hex[:12]}",
+                booking_id=booking_ids.next_id(),
+                venue_id=venue_id,
+                venue_name=venue.name,
+                session_id=entry.session_id,
+                datetime=entry.datetime,
+                party_size=entry.party_size,
+                status="confirmed",
+                contact_name=entry.contact_name,
+                contact_phone=entry.contact_phone,
+                contact_email=entry.contact_email,
+                notes=entry.notes
+            )
+            self.db.add(reservation)
+            entry.status = "promoted"
+            entry.reservation_id = reservation.id
+            promoted.append(reservation)
+        return promoted
+    
+    def get_all_reservations(self, limit: int = 100, cursor: Optional[str] = None) -> Page:
+        """
+        Get all reservations (for admin), newest first
+        
+        Rows carry the LISTING_COLUMNS attributes. Each page is a range scan
+        of ix_reservations_datetime_id_status starting at the cursor, so
+        page 1000 costs the same as page 1.
+        """
+        return self._listing_page(select(*LISTING_COLUMNS), limit, cursor)
+    
+    def get_changes(self, since: Optional[str] = None, limit: int = 100) -> ChangeBatch:
+        """
+        Reservations inserted or updated after the `since` cursor, oldest first
+        
+        Rows carry the CHANGE_COLUMNS attributes. Pass the returned cursor as
+        `since` on the next poll; with nothing new it comes back unchanged,
+        after a single probe of ix_reservations_change_seq.
+        """
+        after = 0
+        if since:
+            (after,) = decode_cursor(since, 1)
+            if not isinstance(after, int):
+                raise ValueError("Invalid cursor")
+        
+        rows = self.db.execute(
+            select(*CHANGE_COLUMNS)
+            .where(Reservation.change_seq > after)
+            .order_by(Reservation.change_seq)
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            after = rows[-1].change_seq
+        return ChangeBatch(rows, encode_cursor(after), has_more)
+    
+    def _listing_page(self, statement, limit: Optional[int], cursor: Optional[str]) -> Page:
+        """
+        Keyset page over (datetime, id) descending, after `cursor`
+        
+        Raises ValueError for a cursor this method didn't hand out.
+        """
+        if cursor:
+            after_datetime, after_id = decode_cursor(cursor, 2)
+            if not isinstance(after_datetime, str) or not isinstance(after_id, str):
+                raise ValueError("Invalid cursor")
+            statement = statement.where(
+                tuple_(Reservation.datetime, Reservation.id) < (parse_datetime(after_datetime), after_id)
+            )
+        statement = statement.order_by(Reservation.datetime.desc(), Reservation.id.desc())
+        
+        if limit is None:
+            return Page(self.db.execute(statement).all(), None)
+        # One extra row tells whether there is a next page
+        rows = self.db.execute(statement.limit(limit + 1)).all()
+        if len(rows) <= limit:
+            return Page(rows, None)
+        last = rows[limit - 1]
+        return Page(rows[:limit], encode_cursor(last.datetime.isoformat(), last.id))
@@ -0,0 +1,185 @@
+import aiosmtplib
+from email.message import Message
+from app.services.email_templates import OutgoingEmail
+from typing import List, Optional, Union
+import asyncio
+import time
+
+
+# Errors after which a connection can't be trusted with another message
+CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+    asyncio.TimeoutError,
+    OSError,
+)
+
+
+# A message object, or one already in wire format
+Outgoing = Union[Message, OutgoingEmail]
+
+
+class PooledConnection:
+    __slots__ = ("smtp", "last_used", "sent")
+
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPPool:
+    """
+    Authenticated SMTP sessions kept open and reused across messages
+
+    Connecting costs a TCP handshake, EHLO, STARTTLS and AUTH. The pool
+    pays that once per connection and then sends message after message
+    over it. Up to `size` connections are open at once. An idle connection
+    is checked with NOOP before reuse once it has been idle for
+    `noop_after_seconds`. After `max_idle_seconds` the server has likely
+    dropped it, so it is replaced without asking. A connection is also
+    recycled after `max_messages` sends, because servers cap messages per
+    session.
+
+    Connections belong to the event loop that opened them. If the pool is
+    used from another loop, it starts over.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: Optional[bool] = True,
+        size: int = 4,
+        noop_after_seconds: float = 30.0,
+        max_idle_seconds: float = 240.0,
+        max_messages: int = 100,
+        timeout: float = 30.0
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username or None
+        self.password = password or None
+        self.start_tls = start_tls
+        self.size = size
+        self.noop_after_seconds = noop_after_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[PooledConnection] = []
+        self.connects = 0
+
+    async def send(self, message: Outgoing):
+        """
+        Send one message; a dropped connection is replaced and the send retried once
+        """
+        errors = await self.send_many([message])
+        if errors[0] is not None:
+            raise errors[0]
+
+    async def send_many(self, messages: List[Outgoing]) -> List[Optional[Exception]]:
+        """
+        Send messages back to back over one pooled session
+
+        Returns the error for each message, or None if it was sent. If the
+        connection drops part way through, a fresh one takes over, and the
+        message that was in flight is retried once on it. If no connection
+        can be made, the remaining messages all get that error.
+        """
+        errors: List[Optional[Exception]] = [None] * len(messages)
+        self._bind_loop()
+        async with self._slots:
+            connection = None
+            try:
+                for i, message in enumerate(messages):
+                    for attempt in range(2):
+                        if connection is None:
+                            try:
+                                connection = await self._checkout()
+                            except (aiosmtplib.SMTPException, *CONNECTION_ERRORS) as e:
+                                errors[i:] = [e] * (len(messages) - i)
+                                return errors
+                        try:
+                            if isinstance(message, OutgoingEmail):
+                                await connection.smtp.sendmail(message.sender, message.recipients, message.data)
+                            else:
+                                await connection.smtp.send_message(message)
+                            connection.sent += 1
+                            break
+                        except CONNECTION_ERRORS as e:
+                            self._discard(connection)
+                            connection = None
+                            if attempt:
+                                errors[i] = e
+                        except aiosmtplib.SMTPException as e:
+                            # Refused by the server; the session itself is fine
+                            errors[i] = e
+                            break
+                    if connection is not None and connection.sent >= self.max_messages:
+                        await self._quit(connection)
+                        connection = None
+            finally:
+                if connection is not None:
+                    connection.last_used = time.monotonic()
+                    self._idle.append(connection)
+        return errors
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(self._quit(c) for c in idle), return_exceptions=True)
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.size)
+            for connection in self._idle:
+                connection.smtp.close()
+            self._idle = []
+
+    async def _checkout(self) -> PooledConnection:
+        # Most recently used first: the likeliest still to be alive
+        while self._idle:
+            connection = self._idle.pop()
+            idle_for = time.monotonic() - connection.last_used
+            if idle_for >= self.max_idle_seconds or not connection.smtp.is_connected:
+                self._discard(connection)
+                continue
+            if idle_for >= self.noop_after_seconds:
+                try:
+                    await connection.smtp.noop()
+                except (aiosmtplib.SMTPException, *CONNECTION_ERRORS):
+                    self._discard(connection)
+                    continue
+            return connection
+        return await self._connect()
+
+    async def _connect(self) -> PooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        self.connects += 1
+        return PooledConnection(smtp)
+
+    async def _quit(self, connection: PooledConnection):
+        try:
+            await connection.smtp.quit()
+        except (aiosmtplib.SMTPException, *CONNECTION_ERRORS):
+            connection.smtp.close()
+
+    @staticmethod
+    def _discard(connection: Optional[PooledConnection]):
+        if connection is not None:
+            connection.smtp.close()
@@ -0,0 +1,98 @@
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal, run_with_retries
+from app.services.email_outbox import enqueue_many
+from app.services.reservation_service import ReservationService
+from datetime import date
+from itertools import groupby
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+
+class VenueDigest(NamedTuple):
+    venue_id: str
+    venue_name: str
+    email: Optional[str]
+    bookings: List[Dict[str, Any]]
+
+
+class DigestRun(NamedTuple):
+    venues: int  # Venues with bookings that day
+    queued: int  # Digests handed to the email outbox
+    no_email: int  # Venues skipped because they have no email address
+
+
+def venue_digests(db: Session, day: date, batch_size: Optional[int] = None) -> Iterator[VenueDigest]:
+    """
+    One digest per venue with confirmed bookings on `day`, in a single pass
+
+    Reads ReservationService.day_bookings as a stream and splits it at each
+    new venue_id with itertools.groupby. Only the current venue's bookings
+    are held in memory.
+    """
+    rows = ReservationService(db).day_bookings(day, batch_size)
+    for venue_id, group in groupby(rows, key=attrgetter("venue_id")):
+        first = next(group)
+        bookings = [_digest_line(first)]
+        bookings.extend(_digest_line(row) for row in group)
+        yield VenueDigest(venue_id, first.venue_name, first.venue_email, bookings)
+
+
+def queue_venue_digests(
+    day: date,
+    flush_venues: Optional[int] = None,
+    batch_size: Optional[int] = None
+) -> DigestRun:
+    """
+    Queue the day's venue digests on the email outbox
+
+    Digests are written `flush_venues` at a time with one bulk insert, on a
+    second session so the read stream stays open. The outbox then sends
+    them in batches over pooled SMTP connections. Meant to run once a
+    morning; running it again for the same day queues the digests again.
+    """
+    flush_venues = flush_venues or settings.digest_flush_venues
+    reader, writer = SessionLocal(), SessionLocal()
+    venues = queued = 0
+    pending: List[Dict[str, Any]] = []
+
+    def flush():
+        def write():
+            enqueue_many(writer, "venue_digest", pending)
+            writer.commit()
+
+        run_with_retries(writer, write)
+        pending.clear()
+
+    try:
+        for digest in venue_digests(reader, day, batch_size):
+            venues += 1
+            if not digest.email:
+                continue
+            pending.append(dict(
+                to_email=digest.email,
+                venue_name=digest.venue_name,
+                day=day.isoformat(),
+                bookings=digest.bookings
+            ))
+            queued += 1
+            if len(pending) >= flush_venues:
+                flush()
+        if pending:
+            flush()
+    finally:
+        reader.close()
+        writer.close()
+    return DigestRun(venues, queued, venues - queued)
+
+
+def _digest_line(row: Row) -> Dict[str, Any]:
+    return {
+        "time": row.datetime.strftime("%I:%M %p"),
+        "party_size": row.party_size,
+        "name": row.contact_name,
+        "phone": row.contact_phone,
+        "booking_id": row.booking_id,
+        "notes": row.notes,
+    }
@@ -0,0 +1,388 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.database import Venue
+from app.services.catalog import catalog_version
+from app.services.geo import GeoGrid
+from app.services.hours import CompiledHours, compile_hours
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import heapq
+import threading
+
+
+# A posting entry sorts by rating (best first), then id for a stable order
+PostingEntry = Tuple[float, str]
+
+
+class IndexedVenue(NamedTuple):
+    id: str
+    rating: float
+    capacity: int
+    price_tier: int
+    city: str
+    cuisines: Tuple[str, ...]
+    tags: Tuple[str, ...]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    hours: CompiledHours
+
+
+def _norm(value: str) -> str:
+    return value.strip().lower()
+
+
+def snapshot_venue(venue: Venue) -> IndexedVenue:
+    """
+    Copy the searchable fields of a venue into an immutable index record
+    """
+    return IndexedVenue(
+        id=venue.id,
+        rating=venue.rating or 0.0,
+        capacity=venue.capacity or 0,
+        price_tier=venue.price_tier or 0,
+        city=_norm(venue.city or ""),
+        cuisines=tuple(_norm(c) for c in (venue.cuisine or [])),
+        tags=tuple(_norm(t) for t in (venue.tags or [])),
+        latitude=venue.latitude,
+        longitude=venue.longitude,
+        hours=compile_hours(venue.operating_hours),
+    )
+
+
+def _posting_keys(record: IndexedVenue) -> Set[Tuple[str, object]]:
+    keys = {("city", record.city), ("price", record.price_tier)}
+    keys.update(("cuisine", c) for c in record.cuisines)
+    keys.update(("tag", t) for t in record.tags)
+    return keys
+
+
+class VenueIndex:
+    """
+    Process-local inverted index over active venues
+
+    Each cuisine, tag, city and price tier maps to a posting list of venue
+    IDs kept sorted by rating, plus a set for O(1) membership tests. A
+    search walks the shortest matching posting list in rating order, checks
+    the remaining filters against the sets and stops at `limit`, so its cost
+    follows the result size rather than the catalog size. Venue coordinates
+    are bucketed in a GeoGrid for radius ("near me") searches.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._venues: Dict[str, IndexedVenue] = {}
+        self._all: List[PostingEntry] = []
+        self._postings: Dict[Tuple[str, object], List[PostingEntry]] = {}
+        self._members: Dict[Tuple[str, object], Set[str]] = {}
+        self._geo = GeoGrid()
+        self._stale = True
+        self._generation = 0
+
+    @property
+    def stale(self) -> bool:
+        return self._stale
+
+    @property
+    def generation(self) -> int:
+        """
+        Bumped on every change, so derived structures know when to refresh
+        """
+        return self._generation
+
+    def records(self) -> List[IndexedVenue]:
+        with self._lock:
+            return list(self._venues.values())
+
+    def invalidate(self):
+        """
+        Force a full rebuild on the next search
+        """
+        self._stale = True
+
+    def ensure_built(self, db: Session):
+        if self._stale:
+            self.rebuild(db)
+
+    def rebuild(self, db: Session):
+        """
+        Load every active venue and rebuild all posting lists
+        """
+        venues = db.query(Venue).filter(Venue.is_active == True).all()
+        with self._lock:
+            self._venues = {}
+            self._all = []
+            self._postings = {}
+            self._members = {}
+            self._geo.clear()
+            for venue in venues:
+                self._add(snapshot_venue(venue))
+            self._all.sort()
+            for posting in self._postings.values():
+                posting.sort()
+            self._stale = False
+            self._generation += 1
+
+    def upsert(self, record: IndexedVenue):
+        """
+        Insert or replace a single venue without rebuilding
+        """
+        with self._lock:
+            self._remove(record.id)
+            self._add(record, keep_sorted=True)
+            self._generation += 1
+
+    def remove(self, venue_id: str):
+        with self._lock:
+            self._remove(venue_id)
+            self._generation += 1
+
+    def search(
+        self,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        party_size: Optional[int] = None,
+        price_tier: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        open_at: Optional[datetime] = None,
+        limit: int = 10,
+        after: Optional[PostingEntry] = None
+    ) -> List[str]:
+        """
+        Return up to `limit` matching venue IDs, best rated first
+
+        With `after`, the (-rating, id) of the last venue of the previous
+        page, the walk starts right behind it: each posting list is entered
+        by binary search, so later pages cost the same as the first.
+        """
+        with self._lock:
+            driver, checks = self._plan(cuisine, city, price_tier, tags, after=after)
+            results: List[str] = []
+            for _, venue_id in driver:
+                if self._matches(venue_id, checks, party_size, open_at):
+                    results.append(venue_id)
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        party_size: Optional[int] = None,
+        price_tier: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        open_at: Optional[datetime] = None,
+        limit: int = 10
+    ) -> List[Tuple[str, float]]:
+        """
+        Return up to `limit` matching (venue ID, distance_km) pairs within
+        `radius_km`, nearest first
+        """
+        with self._lock:
+            _, checks = self._plan(cuisine, city, price_tier, tags, driver_filter=False)
+            results: List[Tuple[str, float]] = []
+            for distance, venue_id in self._geo.within(latitude, longitude, radius_km):
+                if self._matches(venue_id, checks, party_size, open_at):
+                    results.append((venue_id, distance))
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def get(self, venue_id: str) -> Optional[IndexedVenue]:
+        return self._venues.get(venue_id)
+
+    def __len__(self) -> int:
+        return len(self._venues)
+
+    def _plan(
+        self,
+        cuisine: Optional[str],
+        city: Optional[str],
+        price_tier: Optional[int],
+        tags: Optional[List[str]],
+        driver_filter: bool = True,
+        after: Optional[PostingEntry] = None
+    ) -> Tuple[Iterable[PostingEntry], List[List[Set[str]]]]:
+        """
+        Pick the posting list to walk and the membership sets to check.
+
+        Each filter resolves to one or more posting lists (city matches by
+        substring, so it may union several cities). The shortest one drives
+        the scan unless `driver_filter` is False.
+        """
+        filters: List[List[Tuple[str, object]]] = []
+        if cuisine:
+            filters.append([("cuisine", _norm(cuisine))])
+        if city:
+            filters.append(self._city_keys(_norm(city)))
+        if price_tier:
+            filters.append([("price", price_tier)])
+        for tag in tags or []:
+            filters.append([("tag", _norm(tag))])
+
+        driver: Iterable[PostingEntry] = _tail(self._all, after)
+        if filters and driver_filter:
+            filters.sort(key=lambda keys: sum(len(self._members.get(k, ())) for k in keys))
+            driver = self._merged(filters.pop(0), after)
+        checks = [[self._members[k] for k in keys if k in self._members] for keys in filters]
+        return driver, checks
+
+    def _matches(
+        self,
+        venue_id: str,
+        checks: List[List[Set[str]]],
+        party_size: Optional[int],
+        open_at: Optional[datetime] = None
+    ) -> bool:
+        record = self._venues[venue_id]
+        if party_size and record.capacity < party_size:
+            return False
+        if open_at is not None and not record.hours.is_open_at(open_at):
+            return False
+        return all(any(venue_id in members for members in check) for check in checks)
+
+    def _city_keys(self, city: str) -> List[Tuple[str, object]]:
+        key = ("city", city)
+        if key in self._members:
+            return [key]
+        # Keep the old ILIKE '%city%' behaviour; there are few distinct cities
+        return [k for k in self._members if k[0] == "city" and city in k[1]]
+
+    def _merged(
+        self,
+        keys: List[Tuple[str, object]],
+        after: Optional[PostingEntry] = None
+    ) -> Iterable[PostingEntry]:
+        postings = [_tail(self._postings[k], after) for k in keys if k in self._postings]
+        if len(postings) == 1:
+            return postings[0]
+        return heapq.merge(*postings)
+
+    def _add(self, record: IndexedVenue, keep_sorted: bool = False):
+        entry = (-record.rating, record.id)
+        self._venues[record.id] = record
+        self._insert(self._all, entry, keep_sorted)
+        for key in _posting_keys(record):
+            self._insert(self._postings.setdefault(key, []), entry, keep_sorted)
+            self._members.setdefault(key, set()).add(record.id)
+        if record.latitude is not None and record.longitude is not None:
+            self._geo.add(record.id, record.latitude, record.longitude)
+
+    def _remove(self, venue_id: str):
+        record = self._venues.pop(venue_id, None)
+        if record is None:
+            return
+        entry = (-record.rating, record.id)
+        self._geo.remove(venue_id)
+        self._discard(self._all, entry)
+        for key in _posting_keys(record):
+            self._discard(self._postings[key], entry)
+            self._members[key].discard(venue_id)
+            if not self._members[key]:
+                del self._postings[key]
+                del self._members[key]
+
+    @staticmethod
+    def _insert(posting: List[PostingEntry], entry: PostingEntry, keep_sorted: bool):
+        if keep_sorted:
+            posting.insert(_bisect(posting, entry), entry)
+        else:
+            posting.append(entry)
+
+    @staticmethod
+    def _discard(posting: List[PostingEntry], entry: PostingEntry):
+        i = _bisect(posting, entry)
+        if i < len(posting) and posting[i] == entry:
+            del posting[i]
+
+
+def _tail(posting: List[PostingEntry], after: Optional[PostingEntry]) -> Iterable[PostingEntry]:
+    """
+    The entries of a posting list strictly after `after`
+    """
+    if after is None:
+        return posting
+    start = _bisect(posting, after)
+    if start < len(posting) and posting[start] == after:
+        start += 1
+    return (posting[i] for i in range(start, len(posting)))
+
+
+def _bisect(posting: List[PostingEntry], entry: PostingEntry) -> int:
+    lo, hi = 0, len(posting)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if posting[mid] < entry:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# Global venue index instance
+venue_index = VenueIndex()
+
+
+def venue_hours(venue: Venue) -> CompiledHours:
+    """
+    Compiled hours for a venue, from its index record when the index is current
+    """
+    record = None if venue_index.stale else venue_index.get(venue.id)
+    return record.hours if record is not None else compile_hours(venue.operating_hours)
+
+# Venue writes from other processes can't be patched in; rebuild instead
+catalog_version.on_change(venue_index.invalidate)
+
+
+# Keep the index in step with committed venue writes. Changes are collected
+# per session and applied only after commit so a rollback never leaks in.
+_PENDING_KEY = "venue_index_pending"
+
+
+def _pending(session: Session) -> Dict[str, Optional[IndexedVenue]]:
+    return session.info.setdefault(_PENDING_KEY, {})
+
+
+@event.listens_for(Venue, "after_insert")
+@event.listens_for(Venue, "after_update")
+def _venue_written(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _pending(session)[target.id] = snapshot_venue(target) if target.is_active else None
+
+
+@event.listens_for(Venue, "after_delete")
+def _venue_deleted(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        _pending(session)[target.id] = None
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _venues_bulk_changed(state):
+    # UPDATE / DELETE statements, 2.0 style or through Query
+    mapper = state.bind_mapper
+    if (state.is_update or state.is_delete) and mapper is not None and mapper.class_ is Venue:
+        state.session.info["venue_index_rebuild"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if session.info.pop("venue_index_rebuild", False):
+        venue_index.invalidate()
+        return
+    for venue_id, record in (pending or {}).items():
+        if record is None:
+            venue_index.remove(venue_id)
+        else:
+            venue_index.upsert(record)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop("venue_index_rebuild", False)
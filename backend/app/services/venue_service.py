@@ -1,7 +1,61 @@
+from sqlalchemy import column, func, intersect, literal_column, or_, select, table, text as sql_text, tuple_
 from sqlalchemy.orm import Session
-from app.database import Venue
-from typing import List, Optional
+from app.config import settings
+from app.database import Venue, VenueCuisine, VenueTag, normalize_term
+from app.services.availability import AvailabilityEngine, parse_datetime
+from app.services.cache import TTLCache
+from app.services.catalog import catalog_version
+from app.services.cursors import Page, decode_cursor, encode_cursor
+from app.services.geo import bounding_box, haversine_km
+from app.services.ranking import ranking_engine
+from app.services.hours import compile_hours
+from app.services.venue_index import venue_hours, venue_index
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
+import json
+import re
+
+
+venues_fts = table("venues_fts", column("rowid"))
+
+# Conversational filler that would otherwise match half the venue names
+FTS_STOPWORDS = {
+    "a", "an", "and", "at", "for", "in", "of", "on", "or", "place", "restaurant",
+    "spot", "that", "the", "this", "with",
+}
+
+
+def _fts_terms(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in FTS_STOPWORDS]
+
+
+# A search result before hydration: (venue_id, distance_km, score)
+Hit = Tuple[str, Optional[float], Optional[float]]
+
+# Results of repeated searches, keyed on the catalog version plus the
+# normalized filters, so any venue write makes old entries unreachable
+search_cache = TTLCache(maxsize=settings.search_cache_size, ttl=settings.search_cache_ttl_seconds)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(_normalize(v) for v in value))
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True, default=str)
+    return value
+
+
+def _cache_key(kind: str, version: int, params: Dict[str, Any]) -> tuple:
+    filters = tuple(
+        (name, _normalize(value))
+        for name, value in sorted(params.items())
+        if value not in (None, "", [], {})
+    )
+    return (kind, version, filters)
 
 
 class VenueService:
@@ -15,16 +69,302 @@ class VenueService:
         party_size: Optional[int] = None,
         price_tier: Optional[int] = None,
         tags: Optional[List[str]] = None,
-        limit: int = 10
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        text: Optional[str] = None,
+        open_at: Optional[str] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
     ) -> List[Venue]:
         """
         Search venues with filters
+        
+        If latitude/longitude are given, only venues within radius_km are
+        returned, nearest first, with distance_km set on each venue. If text
+        is given, venues are matched on name, description, tags and address
+        and returned in BM25 relevance order, still only those within the
+        radius if coordinates are given too. If open_at (ISO datetime) is
+        given, only venues open at that time are returned. Otherwise venues
+        come best rated first, and `cursor` (see search_venues_page) resumes
+        after a previous page.
+        """
+        params = dict(
+            cuisine=cuisine, city=city, party_size=party_size, price_tier=price_tier,
+            tags=tags, latitude=latitude, longitude=longitude, radius_km=radius_km,
+            text=text, open_at=open_at, limit=limit, cursor=cursor
+        )
+        hits = self._cached("search", params, lambda: self._search_hits(**params))
+        return self._hydrate(hits)
+    
+    def search_venues_page(self, limit: int = 10, cursor: Optional[str] = None, **filters) -> Page:
+        """
+        Best-rated-first search_venues, one keyset page at a time
+        
+        The cursor holds the (rating, id) of the page's last venue, so the
+        next page starts right behind it instead of skipping an offset.
+        Raises ValueError with text or coordinates, which order otherwise.
+        """
+        venues = self.search_venues(limit=limit + 1, cursor=cursor, **filters)
+        if len(venues) <= limit:
+            return Page(venues, None)
+        last = venues[limit - 1]
+        return Page(venues[:limit], encode_cursor(last.rating or 0.0, last.id))
+    
+    def recommend_venues(
+        self,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        party_size: Optional[int] = None,
+        price_tier: Optional[int] = None,
+        prefs: Optional[Dict[str, Any]] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        text: Optional[str] = None,
+        open_at: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Venue]:
+        """
+        Venues matching the hard filters, ranked by weighted relevance
+        
+        cuisine, city, party_size, price_tier, text, open_at and the geo
+        radius filter; everything in prefs (price tier, tags, weights, ...)
+        only affects the score, which is set on each returned venue.
+        """
+        params = dict(
+            cuisine=cuisine, city=city, party_size=party_size, price_tier=price_tier, prefs=prefs,
+            latitude=latitude, longitude=longitude, radius_km=radius_km,
+            text=text, open_at=open_at, limit=limit
+        )
+        if not settings.venue_index_enabled:
+            params.pop("prefs")
+            return self.search_venues(**params)
+        hits = self._cached("recommend", params, lambda: self._recommend_hits(**params))
+        return self._hydrate(hits)
+    
+    def _cached(self, kind: str, params: Dict[str, Any], compute: Callable[[], List[Hit]]) -> List[Hit]:
+        """
+        Serve a search from the result cache, computing it on a miss
+        """
+        version = catalog_version.current(self.db)
+        if not settings.search_cache_enabled:
+            return compute()
+        key = _cache_key(kind, version, params)
+        hits = search_cache.get(key)
+        if hits is None:
+            hits = tuple(compute())
+            search_cache.set(key, hits)
+        return hits
+    
+    def _search_hits(
+        self,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        party_size: Optional[int] = None,
+        price_tier: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        text: Optional[str] = None,
+        open_at: Optional[str] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> List[Hit]:
+        filters = dict(cuisine=cuisine, city=city, party_size=party_size, price_tier=price_tier, tags=tags)
+        open_dt = parse_datetime(open_at) if open_at else None
+        after = self._rating_cursor(cursor) if cursor else None
+        if after and ((text and _fts_terms(text)) or (latitude is not None and longitude is not None)):
+            raise ValueError("Cursors only page best-rated-first searches, not text or nearby ones")
+        
+        geo = latitude is not None and longitude is not None
+        if geo:
+            radius_km = radius_km or settings.geo_default_radius_km
+        
+        if text and _fts_terms(text):
+            # Near text searches keep BM25 order, limited to the radius
+            box = bounding_box(latitude, longitude, radius_km) if geo else None
+            matches = self._text_matches(
+                text, limit=settings.text_search_candidates if open_dt or geo else limit, box=box, **filters
+            )
+            venue_ids = self._open_at([vid for vid, _ in matches], open_dt)
+            if not geo:
+                return [(vid, None, None) for vid in venue_ids][:limit]
+            distances = self._distances(venue_ids, latitude, longitude)
+            return [(vid, distances[vid], None) for vid in venue_ids if distances.get(vid, radius_km + 1) <= radius_km][:limit]
+        
+        if geo:
+            return [
+                (vid, distance, None)
+                for vid, distance in self._search_nearby(
+                    latitude, longitude, radius_km, open_at=open_dt, limit=limit, **filters
+                )
+            ]
+        
+        if settings.venue_index_enabled:
+            venue_index.ensure_built(self.db)
+            return [
+                (vid, None, None)
+                for vid in venue_index.search(open_at=open_dt, limit=limit, after=after, **filters)
+            ]
+        
+        # Same order as the index: rating descending, id ascending
+        rating = func.coalesce(Venue.rating, 0.0)
+        query = self._filtered_query(**filters)
+        if after:
+            query = query.filter(tuple_(-rating, Venue.id) > after)
+        query = query.order_by(rating.desc(), Venue.id)
+        
+        if open_dt is None:
+            return [(row.id, None, None) for row in query.with_entities(Venue.id).limit(limit)]
+        
+        # Hours can't be filtered in SQL; scan in rating order until the page is full
+        hits = []
+        for row in query.with_entities(Venue.id, Venue.operating_hours).yield_per(500):
+            if compile_hours(row.operating_hours).is_open_at(open_dt):
+                hits.append((row.id, None, None))
+                if len(hits) >= limit:
+                    break
+        return hits
+    
+    @staticmethod
+    def _rating_cursor(cursor: str) -> Tuple[float, str]:
+        """
+        The (-rating, id) sort key a search_venues_page cursor points after
+        """
+        rating, venue_id = decode_cursor(cursor, 2)
+        if not isinstance(rating, (int, float)) or not isinstance(venue_id, str):
+            raise ValueError("Invalid cursor")
+        return (-float(rating), venue_id)
+    
+    def _recommend_hits(
+        self,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        party_size: Optional[int] = None,
+        price_tier: Optional[int] = None,
+        prefs: Optional[Dict[str, Any]] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        text: Optional[str] = None,
+        open_at: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Hit]:
+        venue_index.ensure_built(self.db)
+        ranking_engine.sync(venue_index)
+        
+        open_dt = parse_datetime(open_at) if open_at else None
+        distances = {}
+        relevance = None
+        geo = latitude is not None and longitude is not None
+        if text and _fts_terms(text):
+            relevance = dict(self._text_matches(
+                text, cuisine=cuisine, city=city, party_size=party_size, price_tier=price_tier,
+                limit=settings.text_search_candidates
+            ))
+            candidates = self._open_at(list(relevance), open_dt)
+            if geo:
+                radius_km = radius_km or settings.geo_default_radius_km
+                distances = dict(venue_index.nearby(latitude, longitude, radius_km, limit=len(venue_index)))
+                candidates = [vid for vid in candidates if vid in distances]
+        elif geo:
+            radius_km = radius_km or settings.geo_default_radius_km
+            distances = dict(venue_index.nearby(
+                latitude, longitude, radius_km,
+                cuisine=cuisine, city=city, party_size=party_size, price_tier=price_tier, open_at=open_dt,
+                limit=len(venue_index)
+            ))
+            candidates = list(distances)
+        elif cuisine or city or party_size or price_tier or open_dt:
+            candidates = venue_index.search(
+                cuisine=cuisine, city=city, party_size=party_size, price_tier=price_tier, open_at=open_dt,
+                limit=len(venue_index)
+            )
+        else:
+            candidates = None  # Score the whole catalog
+        
+        ranked = ranking_engine.rank(
+            candidates,
+            relevance=[relevance[vid] for vid in candidates] if relevance else None,
+            prefs=prefs,
+            party_size=party_size,
+            latitude=latitude,
+            longitude=longitude,
+            limit=limit
+        )
+        return [(vid, distances.get(vid), score) for vid, score in ranked]
+    
+    def _text_matches(
+        self,
+        text: str,
+        limit: int = 10,
+        box: Optional[Tuple[float, float, float, float]] = None,
+        **filters
+    ) -> List[Tuple[str, float]]:
+        """
+        Full-text matches as (venue ID, relevance in (0, 1]), best first
+        
+        One FTS5 query joined with the other filters and, if given, a
+        (min_lat, max_lat, min_lon, max_lon) bounding box; relevance is the
+        BM25 score relative to the best match. Databases without FTS5 fall
+        back to a substring match with equal relevance.
+        """
+        terms = _fts_terms(text)
+        query = self._filtered_query(**filters)
+        if box:
+            min_lat, max_lat, min_lon, max_lon = box
+            query = query.filter(
+                Venue.latitude.between(min_lat, max_lat),
+                Venue.longitude.between(min_lon, max_lon)
+            )
+        
+        if self.db.bind.dialect.name != "sqlite":
+            patterns = [f"%{term}%" for term in terms]
+            query = query.filter(or_(*(
+                or_(Venue.name.ilike(p), Venue.description.ilike(p), Venue.address.ilike(p))
+                for p in patterns
+            )))
+            rows = query.with_entities(Venue.id).order_by(Venue.rating.desc()).limit(limit).all()
+            return [(row.id, 1.0) for row in rows]
+        
+        # Any term may match; BM25 ranks venues matching more (and rarer) terms first
+        match = " OR ".join(f'"{term}"*' for term in terms)
+        # Column weights: name, description, tags, address
+        bm25 = literal_column("bm25(venues_fts, 3.0, 1.0, 2.0, 0.5)")
+        rows = (
+            query.join(venues_fts, venues_fts.c.rowid == literal_column("venues.rowid"))
+            .filter(sql_text("venues_fts MATCH :match"))
+            .params(match=match)
+            .with_entities(Venue.id, bm25.label("bm25"))
+            .order_by(bm25, Venue.rating.desc())
+            .limit(limit)
+            .all()
+        )
+        best = rows[0].bm25 if rows and rows[0].bm25 < 0 else None
+        return [(row.id, row.bm25 / best if best else 1.0) for row in rows]
+    
+    def _filtered_query(
+        self,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        party_size: Optional[int] = None,
+        price_tier: Optional[int] = None,
+        tags: Optional[List[str]] = None
+    ):
+        """
+        SQL query for active venues matching the filters
         """
         query = self.db.query(Venue).filter(Venue.is_active == True)
         
         if cuisine:
-            # SQLite JSON search
-            query = query.filter(Venue.cuisine.contains(cuisine))
+            query = query.filter(Venue.id.in_(
+                select(VenueCuisine.venue_id).where(
+                    VenueCuisine.cuisine == normalize_term(cuisine),
+                    VenueCuisine.is_active == True
+                )
+            ))
         
         if city:
             query = query.filter(Venue.city.ilike(f"%{city}%"))
@@ -36,13 +376,94 @@ class VenueService:
             query = query.filter(Venue.price_tier == price_tier)
         
         if tags:
-            for tag in tags:
-                query = query.filter(Venue.tags.contains(tag))
+            # Each tag is an index range scan; the intersection keeps venues having all of them
+            tag_queries = [
+                select(VenueTag.venue_id).where(
+                    VenueTag.tag == normalize_term(tag),
+                    VenueTag.is_active == True
+                )
+                for tag in tags
+            ]
+            tagged = tag_queries[0] if len(tag_queries) == 1 else intersect(*tag_queries)
+            query = query.filter(Venue.id.in_(tagged))
+        
+        return query
+    
+    def _search_nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        open_at: Optional[datetime] = None,
+        limit: int = 10,
+        **filters
+    ) -> List[Tuple[str, float]]:
+        """
+        Geo search: spatial candidates first, exact haversine distance second
         
-        # Order by rating
-        query = query.order_by(Venue.rating.desc())
+        Returns (venue ID, distance_km) pairs, nearest first
+        """
+        if settings.venue_index_enabled:
+            venue_index.ensure_built(self.db)
+            return venue_index.nearby(latitude, longitude, radius_km, open_at=open_at, limit=limit, **filters)
         
-        return query.limit(limit).all()
+        # Bounding-box prefilter in SQL, exact distance for the candidates only
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        candidates = self._filtered_query(**filters).filter(
+            Venue.latitude.between(min_lat, max_lat),
+            Venue.longitude.between(min_lon, max_lon)
+        ).with_entities(Venue.id, Venue.latitude, Venue.longitude, Venue.operating_hours).all()
+        within = sorted(
+            (haversine_km(latitude, longitude, c.latitude, c.longitude), c.id)
+            for c in candidates
+            if open_at is None or compile_hours(c.operating_hours).is_open_at(open_at)
+        )
+        return [(vid, d) for d, vid in within if d <= radius_km][:limit]
+    
+    def _distances(self, venue_ids: List[str], latitude: float, longitude: float) -> Dict[str, float]:
+        """
+        Haversine distance in km from the given point to each venue
+        """
+        if not venue_ids:
+            return {}
+        rows = self.db.query(Venue.id, Venue.latitude, Venue.longitude).filter(Venue.id.in_(venue_ids)).all()
+        return {row.id: haversine_km(latitude, longitude, row.latitude, row.longitude) for row in rows}
+    
+    def _open_at(self, venue_ids: List[str], open_at: Optional[datetime]) -> List[str]:
+        """
+        Keep the venues open at `open_at`, preserving order
+        """
+        if open_at is None:
+            return venue_ids
+        if settings.venue_index_enabled:
+            venue_index.ensure_built(self.db)
+            records = (venue_index.get(vid) for vid in venue_ids)
+            return [r.id for r in records if r is not None and r.hours.is_open_at(open_at)]
+        rows = self.db.query(Venue.id, Venue.operating_hours).filter(Venue.id.in_(venue_ids)).all()
+        hours = {row.id: compile_hours(row.operating_hours) for row in rows}
+        return [vid for vid in venue_ids if vid in hours and hours[vid].is_open_at(open_at)]
+    
+    def _hydrate(self, hits: List[Hit]) -> List[Venue]:
+        """
+        Load the venues for search hits, with distance_km and score set
+        """
+        venues = self._load_venues([vid for vid, _, _ in hits])
+        details = {vid: (distance, score) for vid, distance, score in hits}
+        for venue in venues:
+            distance, score = details[venue.id]
+            venue.distance_km = round(distance, 2) if distance is not None else None
+            venue.score = score
+        return venues
+    
+    def _load_venues(self, venue_ids: List[str]) -> List[Venue]:
+        """
+        Fetch venues by primary key, preserving the given order
+        """
+        if not venue_ids:
+            return []
+        venues = self.db.query(Venue).filter(Venue.id.in_(venue_ids)).all()
+        by_id = {v.id: v for v in venues}
+        return [by_id[vid] for vid in venue_ids if vid in by_id]
     
     def get_venue(self, venue_id: str) -> Optional[Venue]:
         """
@@ -57,20 +478,60 @@ class VenueService:
         party_size: int
     ) -> bool:
         """
-        Check if venue has availability
-        Simple logic: check capacity
+        Check if venue can seat the party for the whole dining duration
         """
         venue = self.get_venue(venue_id)
         if not venue:
             return False
         
-        # Check if party size fits
-        if party_size > venue.capacity:
-            return False
+        return AvailabilityEngine(self.db).is_available(venue, parse_datetime(datetime_str), party_size)
+    
+    def find_available_venues(
+        self,
+        datetime_str: str,
+        party_size: int,
+        cuisine: Optional[str] = None,
+        city: Optional[str] = None,
+        prefs: Optional[Dict[str, Any]] = None,
+        text: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Venue]:
+        """
+        Ranked venues matching the filters that can seat the party at the
+        given time, with remaining_seats set on each
         
-        # TODO: Check existing reservations for that time slot
-        # For now, always return True if capacity fits
-        return True
+        The ranked candidates are checked against their compiled hours and
+        then against slot occupancy in a single grouped query instead of one
+        availability check per venue. They are taken
+        settings.availability_search_candidates at a time, doubling, until
+        `limit` venues have room or the matching venues run out, so a busy
+        night doesn't come back empty just because the best-ranked venues
+        are full.
+        """
+        dt = parse_datetime(datetime_str)
+        availability = AvailabilityEngine(self.db)
+        available = []
+        checked = set()
+        page = settings.availability_search_candidates
+        while True:
+            ranked = self.recommend_venues(
+                cuisine=cuisine, city=city, party_size=party_size, prefs=prefs, text=text,
+                open_at=datetime_str, limit=page
+            )
+            candidates = [
+                v for v in ranked
+                if v.id not in checked and venue_hours(v).can_seat(dt, settings.dining_duration_minutes)
+            ]
+            checked.update(v.id for v in ranked)
+            if candidates:
+                peaks = availability.peak_seated([v.id for v in candidates], dt)
+                for venue in candidates:
+                    venue.remaining_seats = venue.capacity - peaks.get(venue.id, 0)
+                    if venue.remaining_seats >= party_size:
+                        available.append(venue)
+            if len(available) >= limit or len(ranked) < page:
+                return available[:limit]
+            page *= 2
     
     def get_all_venues(self) -> List[Venue]:
         """
@@ -0,0 +1,101 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import Venue, WaitlistEntry
+from app.services.availability import AvailabilityEngine, parse_datetime, slot_floor
+from datetime import datetime, timedelta
+from typing import List, Optional
+import uuid
+
+
+class WaitlistService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def join_waitlist(
+        self,
+        session_id: str,
+        venue_id: str,
+        datetime_str: str,
+        party_size: int,
+        contact_name: str,
+        contact_phone: str,
+        contact_email: str,
+        notes: Optional[str] = None
+    ) -> WaitlistEntry:
+        """
+        Queue a party for a venue and time that is currently full
+
+        Raises ValueError for an empty party, an unknown venue, a party larger
+        than the venue, or a time that can be booked right away.
+        """
+        if party_size < 1:
+            raise ValueError(f"Party size must be at least 1, got {party_size}")
+        venue = self.db.query(Venue).filter(Venue.id == venue_id).first()
+        if not venue:
+            raise ValueError(f"Venue {venue_id} not found")
+        if party_size > venue.capacity:
+            raise ValueError(f"{venue.name} can't seat a party of {party_size}")
+
+        waitlist_datetime = parse_datetime(datetime_str)
+        if AvailabilityEngine(self.db).is_available(venue, waitlist_datetime, party_size):
+            raise ValueError(f"{venue.name} has a table for {party_size} at {datetime_str}; book it directly")
+
+        entry = WaitlistEntry(
+            id=f"wait_{uuid.uuid4().hex[:12]}",
+            venue_id=venue_id,
+            session_id=session_id,
+            datetime=waitlist_datetime,
+            party_size=party_size,
+            status="waiting",
+            contact_name=contact_name,
+            contact_phone=contact_phone,
+            contact_email=contact_email,
+            notes=notes
+        )
+        self.db.add(entry)
+        self.db.commit()
+        self.db.refresh(entry)
+        return entry
+
+    def leave_waitlist(self, entry_id: str) -> bool:
+        entry = self.db.get(WaitlistEntry, entry_id)
+        if not entry or entry.status != "waiting":
+            return False
+        entry.status = "cancelled"
+        self.db.commit()
+        return True
+
+    def get_entry(self, entry_id: str) -> Optional[WaitlistEntry]:
+        return self.db.get(WaitlistEntry, entry_id)
+
+    def waiting(self, venue_id: str, freed_datetime: datetime) -> List[WaitlistEntry]:
+        """
+        Parties waiting for this venue whose booking would overlap the slots
+        a booking at `freed_datetime` occupied, first come first served
+
+        A range scan of ix_waitlist_entries_slot over the times within one
+        dining duration either side, capped at settings.waitlist_promotion_scan
+        entries. Whether a waiter's own slots have room is left to the claim.
+        """
+        duration = timedelta(minutes=settings.dining_duration_minutes)
+        return self.db.query(WaitlistEntry).filter(
+            WaitlistEntry.venue_id == venue_id,
+            WaitlistEntry.datetime > slot_floor(freed_datetime) - duration,
+            WaitlistEntry.datetime < freed_datetime + duration,
+            WaitlistEntry.status == "waiting"
+        ).order_by(
+            WaitlistEntry.created_at, WaitlistEntry.party_size
+        ).limit(settings.waitlist_promotion_scan).all()
+
+    def position(self, entry: WaitlistEntry) -> int:
+        """
+        1-based place in line for a waiting entry
+        """
+        ahead = self.db.query(func.count(WaitlistEntry.id)).filter(
+            WaitlistEntry.venue_id == entry.venue_id,
+            WaitlistEntry.datetime == entry.datetime,
+            WaitlistEntry.status == "waiting",
+            WaitlistEntry.created_at < entry.created_at
+        ).scalar()
+        return ahead + 1
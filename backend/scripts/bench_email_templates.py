@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark email rendering
+
+Times the compiled templates against producing the same document the old
+way: str.format over the whole HTML on every send, MIMEText to encode it,
+and the email package flattening the message for SMTP. Reports
+microseconds per email, for rendering alone and for the finished bytes
+that go over the wire.
+
+    python -m scripts.bench_email_templates [iterations]
+"""
+from app.services.email_service import email_service
+from app.services.email_templates import RESERVATION_CONFIRMATION, booking_fields
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import sys
+import time
+
+BOOKING = dict(
+    to_email="guest@example.com",
+    to_name="Ada Lovelace",
+    booking_id="GF-20250601-0042",
+    venue_name="The Copper Kettle",
+    reservation_datetime="2025-06-01T19:30:00",
+    party_size=4,
+    notes="Window seat please, celebrating an anniversary"
+)
+
+
+def old_render(booking):
+    # What every send used to do: format the whole document, then MIMEText it
+    fields = booking_fields(**{k: v for k, v in booking.items() if k != "to_email"})
+    fields = {k: (v.decode() if isinstance(v, bytes) else v) for k, v in fields.items()}
+    html = RESERVATION_CONFIRMATION.html.source.format(**fields)
+    message = MIMEMultipart("alternative")
+    message["Subject"] = f"Reservation Confirmed - {booking['venue_name']}"
+    message["From"] = email_service.from_header
+    message["To"] = booking["to_email"]
+    message.attach(MIMEText(html, "html"))
+    return message
+
+
+def new_render(booking):
+    fields = booking_fields(**{k: v for k, v in booking.items() if k != "to_email"})
+    return RESERVATION_CONFIRMATION.render(fields)
+
+
+def new_build(booking):
+    return email_service.build_reservation_confirmation(**booking)
+
+
+def time_call(fn, iterations: int) -> float:
+    """
+    Mean microseconds per call
+    """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) * 1_000_000 / iterations
+
+
+def bench(iterations: int = 20_000):
+    print(f"✉️  Rendering the confirmation email {iterations} times per case...")
+    old_message = old_render(BOOKING)
+    new_message = new_build(BOOKING)
+    cases = [
+        ("render only", None, lambda: new_render(BOOKING)),
+        ("wire bytes", lambda: old_render(BOOKING).as_bytes(), lambda: new_build(BOOKING).data),
+    ]
+
+    print("\n⏱️  Mean time per email:")
+    print(f"  {'':16}{'old':>12}{'templates':>12}{'speedup':>10}")
+    for label, old, new in cases:
+        after = time_call(new, iterations)
+        if old is None:
+            print(f"  {label:16}{'':>12}{after:>10.1f}µs")
+            continue
+        before = time_call(old, iterations)
+        print(f"  {label:16}{before:>10.1f}µs{after:>10.1f}µs{before / after:>9.1f}x")
+
+    print(f"\n📏 Message size: old {len(old_message.as_bytes())} bytes (HTML only), "
+          f"templates {len(new_message.data)} bytes (HTML + plain text)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    bench(*args)
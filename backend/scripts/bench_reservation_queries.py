@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark the reservation listing queries
+
+Builds a throwaway SQLite database of synthetic reservations and compares
+the old listings (session_id index only, full ORM rows) with the new ones
+(composite / covering indexes, column-projected rows): query plans first,
+then timings.
+
+    python -m scripts.bench_reservation_queries [reservations] [sessions]
+"""
+from app.database import Base, Reservation
+from app.services.reservation_service import LISTING_COLUMNS, LIVE_STATUSES, ReservationService
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import tempfile
+import time
+
+NEW_INDEXES = ["ix_reservations_session_datetime_id_status", "ix_reservations_datetime_id_status"]
+
+
+def build_database(path: str, reservations: int, sessions: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine, tables=[Reservation.__table__])
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1, 12, 0)
+    rows = [
+        {
+            "id": f"res_{i:08d}",
+            "booking_id": f"GF-BENCH-{i:08d}",
+            "venue_id": f"venue_{rng.randrange(500):04d}",
+            "venue_name": "Bench Venue",
+            "session_id": f"session_{rng.randrange(sessions):05d}",
+            "datetime": start + timedelta(minutes=30 * rng.randrange(20000)),
+            "party_size": rng.randint(1, 8),
+            "status": "cancelled" if rng.random() < 0.15 else "confirmed",
+            "contact_name": "Bench Guest",
+            "contact_phone": "555-0100",
+            "contact_email": "guest@example.com",
+            "notes": "Window seat please, celebrating an anniversary. " * 4,
+        }
+        for i in range(reservations)
+    ]
+    with engine.begin() as connection:
+        connection.execute(Reservation.__table__.insert(), rows)
+        connection.execute(text("ANALYZE"))
+    return engine
+
+
+def session_orm(db: Session, session_id: str):
+    return db.query(Reservation).filter(
+        Reservation.session_id == session_id,
+        Reservation.status != "cancelled"
+    ).order_by(Reservation.datetime.desc()).all()
+
+
+def session_projected(db: Session, session_id: str):
+    return ReservationService(db).get_reservations(session_id)
+
+
+def admin_orm(db: Session, limit: int):
+    return db.query(Reservation).order_by(Reservation.datetime.desc()).limit(limit).all()
+
+
+def admin_projected(db: Session, limit: int):
+    return ReservationService(db).get_all_reservations(limit=limit)
+
+
+def show_plan(engine, label: str, statement):
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as connection:
+        plan = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    print(f"  {label}:")
+    for row in plan:
+        print(f"    {row[-1]}")
+
+
+def time_query(engine, query, args, repeat: int) -> float:
+    """
+    Mean milliseconds per call, each on a fresh Session
+    """
+    started = time.perf_counter()
+    for arg in args[:repeat]:
+        with Session(engine) as db:
+            query(db, arg)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def bench(reservations: int = 200_000, sessions: int = 2_000):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"🏗️  Building {reservations} reservations across {sessions} sessions...")
+    engine = build_database(path, reservations, sessions)
+
+    session_ids = [f"session_{i:05d}" for i in random.Random(7).sample(range(sessions), min(200, sessions))]
+    old_session_statement = select(Reservation).where(
+        Reservation.session_id == session_ids[0],
+        Reservation.status != "cancelled"
+    ).order_by(Reservation.datetime.desc())
+    new_session_statement = select(*LISTING_COLUMNS).where(
+        Reservation.session_id == session_ids[0],
+        Reservation.status.in_(LIVE_STATUSES)
+    ).order_by(Reservation.datetime.desc(), Reservation.id.desc())
+    old_admin_statement = select(Reservation).order_by(Reservation.datetime.desc()).limit(100)
+    new_admin_statement = select(*LISTING_COLUMNS).order_by(
+        Reservation.datetime.desc(), Reservation.id.desc()
+    ).limit(100)
+
+    results = {}
+    for phase in ["before", "after"]:
+        with engine.begin() as connection:
+            for name in NEW_INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            if phase == "after":
+                for index in Reservation.__table__.indexes:
+                    index.create(connection, checkfirst=True)
+                connection.execute(text("ANALYZE"))
+
+        print(f"\n📋 Query plans ({phase}):")
+        show_plan(engine, "session listing", old_session_statement if phase == "before" else new_session_statement)
+        show_plan(engine, "admin listing", old_admin_statement if phase == "before" else new_admin_statement)
+
+        query_session, query_admin = (
+            (session_orm, admin_orm) if phase == "before" else (session_projected, admin_projected)
+        )
+        results[phase] = (
+            time_query(engine, query_session, session_ids, len(session_ids)),
+            time_query(engine, query_admin, [100] * 50, 50),
+        )
+
+    print("\n⏱️  Mean time per call:")
+    print(f"  {'':18}{'before':>12}{'after':>12}{'speedup':>10}")
+    for i, label in enumerate(["session listing", "admin listing"]):
+        before, after = results["before"][i], results["after"][i]
+        print(f"  {label:18}{before:>10.3f}ms{after:>10.3f}ms{before / after:>9.1f}x")
+
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    bench(*args)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark pooled against unpooled SMTP sending
+
+Starts a local aiosmtpd server that accepts and discards mail, then sends
+the same confirmation emails two ways: one aiosmtplib.send() per message
+(a fresh connection each time, as before), and through SMTPPool, which
+sends many messages over a few long-lived sessions. Reports messages per
+second and connections opened. A real relay adds TLS and AUTH to every
+connection, so the gap there is wider than it is here.
+
+Needs aiosmtpd, which is not an app dependency:
+
+    pip install aiosmtpd
+    python -m scripts.bench_smtp_pool [messages] [concurrency] [latency_ms]
+
+latency_ms adds a delay to each SMTP reply, to stand in for a remote server.
+"""
+from app.services.email_service import email_service
+from app.services.smtp_pool import SMTPPool
+import aiosmtplib
+import asyncio
+import socket
+import sys
+import time
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class DiscardHandler:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_messages(count: int):
+    return [
+        email_service.build_reservation_confirmation(
+            to_email=f"guest{i}@example.com",
+            to_name=f"Guest {i}",
+            booking_id=f"GF-BENCH-{i:06d}",
+            venue_name="Bench Venue",
+            reservation_datetime="2025-06-01T19:30:00",
+            party_size=2,
+            notes="Window seat please"
+        )
+        for i in range(count)
+    ]
+
+
+async def send_unpooled(port: int, messages, concurrency: int) -> int:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(message):
+        async with slots:
+            await aiosmtplib.send(
+                message.data,
+                sender=message.sender,
+                recipients=message.recipients,
+                hostname="127.0.0.1",
+                port=port,
+                start_tls=False
+            )
+
+    await asyncio.gather(*(send(m) for m in messages))
+    return len(messages)
+
+
+async def send_pooled(pool: SMTPPool, messages, concurrency: int, batch: int) -> int:
+    batches = [messages[i:i + batch] for i in range(0, len(messages), batch)]
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(chunk):
+        async with slots:
+            errors = await pool.send_many(chunk)
+            failed = [e for e in errors if e is not None]
+            if failed:
+                raise failed[0]
+
+    await asyncio.gather(*(send(b) for b in batches))
+    await pool.close()
+    return pool.connects
+
+
+async def bench(count: int = 2000, concurrency: int = 4, latency_ms: float = 0.0):
+    handler = DiscardHandler(latency_ms / 1000)
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        print(f"📨 Building {count} confirmation emails...")
+        messages = build_messages(count)
+
+        started = time.perf_counter()
+        unpooled_connects = await send_unpooled(port, messages, concurrency)
+        unpooled = time.perf_counter() - started
+
+        pool = SMTPPool("127.0.0.1", port, start_tls=False, size=concurrency)
+        started = time.perf_counter()
+        pooled_connects = await send_pooled(pool, messages, concurrency, batch=20)
+        pooled = time.perf_counter() - started
+    finally:
+        controller.stop()
+
+    print(f"\n⏱️  {count} messages, concurrency {concurrency}, reply latency {latency_ms:g}ms:")
+    print(f"  {'':10}{'msgs/sec':>12}{'connections':>14}")
+    print(f"  {'unpooled':10}{count / unpooled:>12.0f}{unpooled_connects:>14}")
+    print(f"  {'pooled':10}{count / pooled:>12.0f}{pooled_connects:>14}")
+    print(f"  speedup: {unpooled / pooled:.1f}x   (server received {handler.received})")
+
+
+if __name__ == "__main__":
+    if Controller is None:
+        print("❌ aiosmtpd is not installed. Run: pip install aiosmtpd")
+        sys.exit(1)
+    args = [float(a) for a in sys.argv[1:4]]
+    count, concurrency = (int(a) for a in (args + [2000, 4])[:2])
+    asyncio.run(bench(count, concurrency, *args[2:]))
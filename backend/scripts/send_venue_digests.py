@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Queue each venue's daily booking digest
+
+Streams the day's confirmed reservations venue by venue and queues one
+digest email per venue on the email outbox. The running app's outbox
+worker sends them. Run it once each morning, e.g. from cron:
+
+    python -m scripts.send_venue_digests [YYYY-MM-DD]
+
+The day defaults to today, in local time like reservation times.
+"""
+from app.services.venue_digest import queue_venue_digests
+from datetime import date
+import sys
+import time
+
+
+def send_digests(day: date):
+    print(f"📋 Building venue digests for {day.isoformat()}...")
+    started = time.perf_counter()
+    run = queue_venue_digests(day)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Queued {run.queued} digests for {run.venues} venues in {elapsed:.2f}s")
+    if run.no_email:
+        print(f"⚠️  {run.no_email} venues have no email address and were skipped")
+
+
+if __name__ == "__main__":
+    day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else date.today()
+    send_digests(day)
@@ -0,0 +1,73 @@
+"""
+Shared setup for the backend behaviour tests
+
+The app reads its settings on import, so a throwaway SQLite database is
+configured here before anything under backend/app is imported.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+TEST_DB_DIR = tempfile.mkdtemp(prefix="goodfoods-tests-")
+TEST_DATABASE_URL = f"sqlite:///{os.path.join(TEST_DB_DIR, 'test.db')}"
+
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ["SMTP_ENABLED"] = "false"
+os.environ["SEARCH_CACHE_ENABLED"] = "false"
+sys.path.insert(0, BACKEND_DIR)
+
+from app.database import SessionLocal, Venue, init_db  # noqa: E402
+
+init_db()
+
+# Opening hours wide enough that any evening test booking can be seated
+ALL_WEEK = {
+    day: "08:00-23:59"
+    for day in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+}
+
+CONTACT = dict(contact_name="Ada Lovelace", contact_phone="+1-555-0100", contact_email="ada@example.com")
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_venue(db):
+    """
+    Create an active venue of the given capacity, open every day unless
+    operating_hours says otherwise
+    """
+    def make(capacity: int = 10, **fields) -> Venue:
+        venue = Venue(
+            id=f"test_{uuid.uuid4().hex[:10]}",
+            name=fields.pop("name", "Test Kitchen"),
+            cuisine=fields.pop("cuisine", ["Italian"]),
+            rating=fields.pop("rating", 4.0),
+            capacity=capacity,
+            price_tier=fields.pop("price_tier", 2),
+            city=fields.pop("city", "Testville"),
+            tags=fields.pop("tags", []),
+            operating_hours=fields.pop("operating_hours", ALL_WEEK),
+            email=fields.pop("email", "venue@example.com"),
+            is_active=True,
+            **fields
+        )
+        db.add(venue)
+        db.commit()
+        return venue
+
+    return make
+
+
+@pytest.fixture
+def session_id():
+    return f"session_{uuid.uuid4().hex[:8]}"
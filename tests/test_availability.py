@@ -0,0 +1,116 @@
+"""
+Slot counters, the availability calendar and compiled opening hours
+"""
+from datetime import date, datetime, timedelta
+
+from conftest import CONTACT
+from app.config import settings
+from app.database import engine
+from app.services.availability import AvailabilityEngine, ensure_occupancy_layout, parse_datetime
+from app.services.hours import MINUTES_PER_DAY, compile_hours, parse_operating_hours
+from app.services.reservation_service import ReservationService
+from app.services.venue_index import venue_hours
+
+DINNER = "2030-09-10T19:00:00"  # A Tuesday
+
+
+def _relayout() -> bool:
+    with engine.begin() as connection:
+        return ensure_occupancy_layout(connection)
+
+
+def test_counters_are_rebuilt_when_the_slot_layout_changes(db, make_venue, session_id, monkeypatch):
+    venue = make_venue(capacity=4)
+    booked = ReservationService(db).create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+    booked_id = booked.id
+    availability = AvailabilityEngine(db)
+    dt = parse_datetime(DINNER)
+    assert not _relayout()
+
+    try:
+        # Longer sittings: the booking now also covers 20:30-21:00
+        monkeypatch.setattr(settings, "dining_duration_minutes", 120)
+        monkeypatch.setattr(settings, "slot_minutes", 30)
+        assert _relayout()
+        assert not _relayout()
+        db.expire_all()
+        assert availability.remaining(venue, dt + timedelta(minutes=100)) == 0
+
+        # Cancelling frees exactly the slots the rebuilt counters hold
+        ReservationService(db).cancel_reservation(booked_id)
+        for minutes in range(0, 120, 30):
+            assert availability.remaining(venue, dt + timedelta(minutes=minutes)) == 4
+    finally:
+        monkeypatch.undo()
+        _relayout()
+    db.expire_all()
+    assert availability.remaining(venue, dt) == 4
+
+
+def test_calendar_matches_per_slot_availability_within_opening_hours(db, make_venue, session_id):
+    venue = make_venue(capacity=6, operating_hours={"tuesday": "12:00-14:00, 18:00-22:00"})
+    other = make_venue(capacity=3)
+    service = ReservationService(db)
+    service.create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+    service.create_reservation(session_id, other.id, "2030-09-11T12:30:00", 3, **CONTACT)
+
+    availability = AvailabilityEngine(db)
+    calendar = availability.calendar([venue, other], date(2030, 9, 10), days=2)
+
+    # Lunch and dinner starts that leave a full sitting before closing, Tuesday only
+    starts = [slot for slot, _ in calendar[venue.id]]
+    assert starts[0] == parse_datetime("2030-09-10T12:00:00")
+    assert starts[-1] == parse_datetime("2030-09-10T20:30:00")
+    assert parse_datetime("2030-09-10T12:45:00") not in starts
+    assert parse_datetime("2030-09-10T17:45:00") not in starts
+
+    for v in (venue, other):
+        for slot, remaining in calendar[v.id]:
+            assert venue_hours(v).can_seat(slot, settings.dining_duration_minutes)
+            assert remaining == availability.remaining(v, slot)
+    dinner = dict(calendar[venue.id])
+    assert dinner[parse_datetime("2030-09-10T18:00:00")] == 2
+    assert dinner[parse_datetime("2030-09-10T20:30:00")] == 6
+    assert dict(calendar[other.id])[parse_datetime("2030-09-11T11:45:00")] == 0
+
+
+SCHEDULES = [
+    None,
+    {"monday": "11:00-22:00", "tuesday": "Closed"},
+    {"friday": "12:00-14:30, 18:00-23:00", "saturday": "18:00-02:00"},
+    {"sunday": "20:00-01:30", "monday": "garbage", "wednesday": "12:00-14:00; 14:00-16:00"},
+    {"Thursday": " 17:10 - 21:50 "},
+]
+
+
+def _open_minutes(operating_hours) -> set:
+    """
+    Minutes of the week (0 = Monday 00:00) inside a service period
+    """
+    week = 7 * MINUTES_PER_DAY
+    return {
+        (day * MINUTES_PER_DAY + minute) % week
+        for day, intervals in parse_operating_hours(operating_hours).items()
+        for start, end in intervals
+        for minute in range(start, end)
+    }
+
+
+def test_compiled_hours_match_a_minute_by_minute_reading():
+    step = settings.slot_minutes
+    week = 7 * MINUTES_PER_DAY
+    monday = datetime(2030, 6, 3)
+    for operating_hours in SCHEDULES:
+        open_minutes = _open_minutes(operating_hours)
+        hours = compile_hours(operating_hours)
+
+        def slots_open(first: int, last: int) -> bool:
+            # Every whole slot from the one holding `first` to the one holding `last - 1`
+            start = first - first % step
+            return all(m % week in open_minutes for m in range(start, last + (-last % step)))
+
+        for minute in range(0, week, 5):
+            dt = monday + timedelta(minutes=minute)
+            assert hours.is_open_at(dt) == slots_open(minute, minute + 1), (operating_hours, dt)
+            for duration in (60, 90):
+                assert hours.can_seat(dt, duration) == slots_open(minute, minute + duration), (operating_hours, dt)
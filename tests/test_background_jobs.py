@@ -0,0 +1,146 @@
+"""
+Claiming work in the email outbox and the reminder scheduler, and queueing
+venue digests
+"""
+from datetime import date, datetime, timedelta
+
+from conftest import CONTACT
+from app.database import EmailOutbox, ReminderSchedule
+from app.services.email_outbox import EmailOutboxWorker, enqueue
+from app.services.email_service import Delivery
+from app.services.reminders import ReminderScheduler
+from app.services.reservation_service import ReservationService
+from app.services.venue_digest import DigestRun, queue_venue_digests, venue_digests
+
+FAR_FUTURE = datetime(2100, 1, 1)
+
+
+def _drain_outbox():
+    drain = EmailOutboxWorker()
+    while drain._claim(1000):
+        pass
+
+
+def test_outbox_messages_are_claimed_once_and_recorded(db):
+    _drain_outbox()
+    for name in ("sent", "retry", "refused"):
+        enqueue(db, "reservation_cancellation", dict(to_email=f"{name}@example.com", to_name=name))
+    db.commit()
+
+    first, second = EmailOutboxWorker(), EmailOutboxWorker()
+    claimed = first._claim(10)
+    assert sorted(m.payload["to_name"] for m in claimed) == ["refused", "retry", "sent"]
+    assert second._claim(10) == []
+
+    deliveries = {
+        "sent": Delivery(True),
+        "retry": Delivery(False, "SMTPServerDisconnected: gone"),
+        "refused": Delivery(False, "SMTPRecipientsRefused: 550", retry=False),
+    }
+    # Only the worker holding the claim can record the outcome
+    second._record(claimed, [Delivery(True)] * len(claimed))
+    first._record(claimed, [deliveries[m.payload["to_name"]] for m in claimed])
+
+    rows = {m.payload["to_name"]: db.get(EmailOutbox, m.id) for m in claimed}
+    assert rows["sent"].status == "sent" and rows["sent"].sent_at is not None
+    assert rows["retry"].status == "pending" and rows["retry"].attempts == 1
+    assert rows["retry"].next_attempt_at > datetime.utcnow()
+    assert rows["refused"].status == "failed" and rows["refused"].last_error.startswith("SMTPRecipientsRefused")
+
+
+def test_outbox_claim_lapses_if_the_sender_dies(db):
+    _drain_outbox()
+    enqueue(db, "reservation_cancellation", dict(to_email="lost@example.com"))
+    db.commit()
+
+    dead = EmailOutboxWorker(lease_seconds=300)
+    [message] = dead._claim(10)
+    survivor = EmailOutboxWorker()
+    assert survivor._claim(10) == []
+
+    row = db.get(EmailOutbox, message.id)
+    row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert [m.id for m in survivor._claim(10)] == [message.id]
+
+
+def _reminders_sent_to(db, booking_id):
+    return [
+        row for row in db.query(EmailOutbox).filter(EmailOutbox.kind == "reservation_reminder")
+        if row.payload["booking_id"] == booking_id
+    ]
+
+
+def test_reminders_are_claimed_when_due_and_only_once(db, make_venue, session_id):
+    scheduler = ReminderScheduler(batch_size=100)
+    while scheduler._claim(FAR_FUTURE):
+        pass
+
+    venue = make_venue(capacity=10)
+    service = ReservationService(db)
+    kept = service.create_reservation(session_id, venue.id, "2031-03-04T19:00:00", 2, **CONTACT)
+    dropped = service.create_reservation(session_id, venue.id, "2031-03-04T19:00:00", 2, **CONTACT)
+    kept_id, kept_booking, dropped_booking, dinner = kept.id, kept.booking_id, dropped.booking_id, kept.datetime
+    service.cancel_reservation(dropped.id)
+
+    leads = {row.lead_minutes: row.status for row in db.query(ReminderSchedule).filter_by(reservation_id=kept_id)}
+    assert leads == {24 * 60: "pending", 2 * 60: "pending"}
+
+    # A day out only the 24 hour reminder is due, and the cancelled booking has none
+    assert scheduler._claim(dinner - timedelta(hours=23)) == 1
+    assert scheduler._claim(dinner - timedelta(hours=23)) == 0
+    db.expire_all()
+    assert len(_reminders_sent_to(db, kept_booking)) == 1
+    assert _reminders_sent_to(db, dropped_booking) == []
+
+    assert scheduler._claim(dinner - timedelta(hours=1)) == 1
+    db.expire_all()
+    assert len(_reminders_sent_to(db, kept_booking)) == 2
+    statuses = {row.lead_minutes: row.status for row in db.query(ReminderSchedule).filter_by(reservation_id=kept_id)}
+    assert statuses == {24 * 60: "queued", 2 * 60: "queued"}
+
+
+def test_only_the_latest_overdue_reminder_is_sent(db, make_venue, session_id):
+    scheduler = ReminderScheduler(batch_size=100)
+    while scheduler._claim(FAR_FUTURE):
+        pass
+
+    venue = make_venue(capacity=10)
+    reservation = ReservationService(db).create_reservation(
+        session_id, venue.id, "2031-03-05T19:00:00", 2, **CONTACT
+    )
+    booking_id, dinner, reservation_id = reservation.booking_id, reservation.datetime, reservation.id
+
+    # Down for a day: both reminders are overdue by the time it comes back
+    assert scheduler._claim(dinner - timedelta(minutes=30)) == 2
+    db.expire_all()
+    assert len(_reminders_sent_to(db, booking_id)) == 1
+    statuses = {row.lead_minutes: row.status for row in db.query(ReminderSchedule).filter_by(reservation_id=reservation_id)}
+    assert statuses == {24 * 60: "skipped", 2 * 60: "queued"}
+
+
+def test_venue_digests_group_a_days_bookings_by_venue(db, make_venue, session_id):
+    day = date(2032, 5, 10)
+    venues = [make_venue(capacity=20, email=email) for email in ("a@example.com", "b@example.com", None)]
+    service = ReservationService(db)
+    booked = {}
+    for hour, venue in [(20, 0), (12, 1), (19, 0), (13, 2), (18, 1), (12, 0)]:
+        reservation = service.create_reservation(
+            session_id, venues[venue].id, f"{day.isoformat()}T{hour}:00:00", 2, **CONTACT
+        )
+        booked[(venue, hour)] = (reservation.id, reservation.booking_id)
+    service.cancel_reservation(booked[(1, 18)][0])
+    service.create_reservation(session_id, venues[0].id, "2032-05-11T12:00:00", 2, **CONTACT)
+
+    digests = {d.venue_id: d for d in venue_digests(db, day, batch_size=1)}
+    assert set(digests) == {v.id for v in venues}
+    for venue, hours in [(0, [12, 19, 20]), (1, [12]), (2, [13])]:
+        digest = digests[venues[venue].id]
+        assert [line["booking_id"] for line in digest.bookings] == [booked[(venue, h)][1] for h in hours]
+        assert digest.email == venues[venue].email
+
+    assert queue_venue_digests(day, flush_venues=1, batch_size=2) == DigestRun(venues=3, queued=2, no_email=1)
+    queued = db.query(EmailOutbox).filter(EmailOutbox.kind == "venue_digest").all()
+    queued = {m.payload["to_email"]: m.payload for m in queued if m.payload["day"] == day.isoformat()}
+    assert sorted(queued) == ["a@example.com", "b@example.com"]
+    assert [line["time"] for line in queued["a@example.com"]["bookings"]] == ["12:00 PM", "07:00 PM", "08:00 PM"]
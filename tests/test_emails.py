@@ -0,0 +1,62 @@
+"""
+Precompiled email templates and the wire-format messages built from them
+"""
+from email import message_from_bytes, policy
+
+import pytest
+
+from app.services.email_service import email_service
+from app.services.email_templates import Template
+
+
+def _parts(data: bytes):
+    message = message_from_bytes(data, policy=policy.default)
+    text, html = [part.get_content() for part in message.iter_parts()]
+    return message, text, html
+
+
+def test_templates_fill_slots_and_escape_only_html():
+    text = Template("{{literal}} {name} owes {amount}")
+    html = Template("<b>{name}</b>{extra}", html=True)
+    fields = dict(name="Tom & <Jerry>", amount=12, extra=b"<i>kept</i>")
+    assert text.render(fields) == "{literal} Tom & <Jerry> owes 12".encode()
+    assert html.render(fields) == b"<b>Tom &amp; &lt;Jerry&gt;</b><i>kept</i>"
+    assert text.fields == {"name", "amount"}
+
+    for source in ("{name:>10}", "{name!r}", "{}"):
+        with pytest.raises(ValueError):
+            Template(source)
+
+
+def test_confirmation_renders_both_bodies_with_optional_notes():
+    common = dict(
+        to_email="ada@example.com", to_name="Ada <Admin>", booking_id="GF-ABCD-EFGH",
+        venue_name="Café Bleu", reservation_datetime="2030-06-14T19:00:00", party_size=1
+    )
+    message, text, html = _parts(email_service.build_reservation_confirmation(**common, notes="Window & quiet").data)
+    assert message["Subject"] == "Reservation Confirmed - Café Bleu"
+    assert message["To"] == "ada@example.com"
+    assert message.get_content_type() == "multipart/alternative"
+    for body in (text, html):
+        assert "GF-ABCD-EFGH" in body and "Friday, June 14, 2030" in body and "07:00 PM" in body
+        assert "1 person" in body
+    assert "Dear Ada <Admin>," in text and "Window & quiet" in text
+    assert "Ada &lt;Admin&gt;" in html and "Window &amp; quiet" in html
+
+    _, text, html = _parts(email_service.build_reservation_confirmation(**common).data)
+    assert "Notes" not in text and "Notes:" not in html
+
+
+def test_digest_lists_each_booking_and_the_day_totals():
+    bookings = [
+        dict(time="12:30 PM", party_size=2, name="Ada", phone="555-0100", booking_id="GF-AAAA", notes=None),
+        dict(time="07:00 PM", party_size=5, name="Grace", phone="555-0101", booking_id="GF-BBBB", notes="<nuts>"),
+    ]
+    message, text, html = _parts(email_service.build_venue_digest(
+        to_email="venue@example.com", venue_name="Café\nBleu", day="2030-06-14", bookings=bookings
+    ).data)
+    # A line break in a field can't start a new header
+    assert message["Subject"] == "Today's bookings at Café Bleu - Friday, June 14, 2030"
+    assert "2 bookings, 7 covers" in text
+    assert text.index("GF-AAAA") < text.index("GF-BBBB") < text.index("Notes: <nuts>")
+    assert html.count("<tr><td") == 2 and "&lt;nuts&gt;" in html
@@ -0,0 +1,177 @@
+"""
+Keyset-paged listings, the reservation changes feed and the admin export
+"""
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from conftest import CONTACT
+from app.database import engine
+from app.main import app
+from app.services.cursors import encode_cursor
+from app.services.reservation_service import ReservationService
+from app.services.venue_service import VenueService
+
+
+def _book_evenings(db, venue, session_id, count, start=datetime(2030, 7, 1, 18, 0)):
+    service = ReservationService(db)
+    return [
+        service.create_reservation(
+            session_id, venue.id, (start + timedelta(days=i // 2, minutes=30 * (i % 2))).isoformat(), 2, **CONTACT
+        ).id
+        for i in range(count)
+    ]
+
+
+def _walk(fetch):
+    pages, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        pages.append([row.id for row in page.items])
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+def test_session_pages_cover_every_booking_once_newest_first(db, make_venue, session_id):
+    venue = make_venue(capacity=20)
+    booked = _book_evenings(db, venue, session_id, 7)
+    service = ReservationService(db)
+
+    pages = _walk(lambda cursor: service.get_reservations(session_id, limit=3, cursor=cursor))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [rid for page in pages for rid in page] == list(reversed(booked))
+    assert [row.id for row in service.get_reservations(session_id).items] == list(reversed(booked))
+
+
+def test_admin_pages_match_the_unpaged_order(db, make_venue, session_id):
+    venue = make_venue(capacity=20)
+    _book_evenings(db, venue, session_id, 5)
+    service = ReservationService(db)
+
+    everything = [row.id for row in service.get_all_reservations(limit=100000).items]
+    pages = _walk(lambda cursor: service.get_all_reservations(limit=4, cursor=cursor))
+    assert [rid for page in pages for rid in page] == everything
+
+
+def _query_plans(run) -> list:
+    """
+    EXPLAIN QUERY PLAN details of the reservations queries `run` executes
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM reservations" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    with engine.connect() as connection:
+        return [
+            [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            for statement, parameters in statements
+        ]
+
+
+def test_listings_walk_an_index_without_sorting(db, make_venue, session_id):
+    venue = make_venue(capacity=20)
+    _book_evenings(db, venue, session_id, 3)
+    service = ReservationService(db)
+    cursor = service.get_reservations(session_id, limit=1).next_cursor
+
+    for run in (
+        lambda: service.get_reservations(session_id, limit=1, cursor=cursor),
+        lambda: service.get_all_reservations(limit=1, cursor=cursor),
+    ):
+        [plan] = _query_plans(run)
+        assert any("USING INDEX ix_reservations_" in step for step in plan), plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_cancelled_bookings_leave_the_session_listing(db, make_venue, session_id):
+    venue = make_venue(capacity=20)
+    first, second = _book_evenings(db, venue, session_id, 2)
+    service = ReservationService(db)
+    service.cancel_reservation(first)
+    assert [row.id for row in service.get_reservations(session_id).items] == [second]
+
+
+def test_bad_cursors_are_rejected(db, session_id):
+    service = ReservationService(db)
+    for cursor in ("not-a-cursor", encode_cursor(1, 2), encode_cursor("2030-01-01T00:00:00")):
+        with pytest.raises(ValueError):
+            service.get_reservations(session_id, limit=2, cursor=cursor)
+
+
+def test_venue_pages_walk_best_rated_first(db, make_venue):
+    city = "Pageton"
+    venues = [make_venue(city=city, rating=rating) for rating in (4.9, 3.1, 4.4, 4.4, 2.0)]
+    expected = [v.id for v in sorted(venues, key=lambda v: (-v.rating, v.id))]
+    service = VenueService(db)
+
+    pages = _walk(lambda cursor: service.search_venues_page(limit=2, cursor=cursor, city=city))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [vid for page in pages for vid in page] == expected
+
+    # Text and nearby searches have their own order, so cursors don't apply
+    with pytest.raises(ValueError):
+        service.search_venues_page(limit=2, cursor=encode_cursor(4.0, "x"), city=city, text="kitchen")
+
+
+def test_changes_feed_sees_creates_and_cancels_once(db, make_venue, session_id):
+    venue = make_venue(capacity=20)
+    service = ReservationService(db)
+    cursor = service.get_changes(limit=100000).cursor
+
+    first, second = _book_evenings(db, venue, session_id, 2)
+    batch = service.get_changes(since=cursor, limit=1)
+    assert [row.id for row in batch.rows] == [first] and batch.has_more
+    batch = service.get_changes(since=batch.cursor)
+    assert [row.id for row in batch.rows] == [second] and not batch.has_more
+
+    # Nothing new: the cursor comes back unchanged
+    idle = service.get_changes(since=batch.cursor)
+    assert idle.rows == [] and idle.cursor == batch.cursor
+
+    service.cancel_reservation(first)
+    batch = service.get_changes(since=batch.cursor)
+    assert [(row.id, row.status) for row in batch.rows] == [(first, "cancelled")]
+
+
+def test_export_streams_a_date_range_in_batches(db, make_venue, session_id):
+    venue = make_venue(capacity=20)
+    start = datetime(2032, 2, 1, 18, 0)
+    booked = _book_evenings(db, venue, session_id, 5, start=start)
+    service = ReservationService(db)
+    service.cancel_reservation(booked[1])
+    window = dict(start=datetime(2032, 2, 1), end=datetime(2032, 2, 3))
+
+    batches = list(service.export_reservations(batch_size=2, **window))
+    assert [len(batch) for batch in batches] == [2, 2]
+    rows = [row for batch in batches for row in batch]
+    assert [row.id for row in rows] == booked[:4]
+    assert [row.datetime for row in rows] == sorted(row.datetime for row in rows)
+    confirmed = [row.id for batch in service.export_reservations(statuses=["confirmed"], **window) for row in batch]
+    assert confirmed == [booked[0], booked[2], booked[3]]
+
+    client = TestClient(app)
+    query = "start=2032-02-01&end=2032-02-03T00:00:00&status=confirmed"
+    lines = client.get(f"/api/reservations/admin/export?{query}").text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == confirmed
+    assert json.loads(lines[0])["session_id"] == session_id
+
+    exported = client.get(f"/api/reservations/admin/export?format=csv&{query}")
+    assert exported.headers["content-type"].startswith("text/csv")
+    records = list(csv.DictReader(io.StringIO(exported.text)))
+    assert [r["id"] for r in records] == confirmed
+    assert records[0]["datetime"] == "2032-02-01T18:00:00"
+
+    assert client.get("/api/reservations/admin/export?start=soon").status_code == 400
@@ -0,0 +1,325 @@
+"""
+Booking writes: seat claims, holds, waitlist promotion, batches, booking
+IDs and idempotent retries
+"""
+from datetime import datetime, timedelta
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from conftest import BACKEND_DIR, CONTACT, TEST_DATABASE_URL
+from app.database import IdempotencyKey, Reservation, ReservationHold, WaitlistEntry, run_with_retries
+from app.main import app
+from app.services.availability import AvailabilityEngine, NoAvailabilityError, parse_datetime
+from app.services.booking_ids import ALPHABET, booking_ids, is_valid
+from app.services.hold_service import HoldService
+from app.services.idempotency import idempotency_store
+from app.services.reservation_service import ReservationService
+from app.services.waitlist_service import WaitlistService
+
+DINNER = "2030-06-14T19:00:00"
+
+
+def _locked() -> OperationalError:
+    return OperationalError("UPDATE venue_slot_occupancy", {}, Exception("database is locked"))
+
+
+def test_run_with_retries_retries_lock_contention(db):
+    calls = []
+
+    def work():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _locked()
+        return "done"
+
+    assert run_with_retries(db, work) == "done"
+    assert len(calls) == 3
+
+
+def test_run_with_retries_gives_up_on_other_errors(db):
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise OperationalError("SELECT 1", {}, Exception("no such table: nope"))
+
+    with pytest.raises(OperationalError):
+        run_with_retries(db, work)
+    assert len(calls) == 1
+
+
+def test_claim_stops_at_capacity_and_release_frees_seats(db, make_venue):
+    venue = make_venue(capacity=6)
+    availability = AvailabilityEngine(db)
+    dt = parse_datetime(DINNER)
+
+    availability.claim(venue, dt, 4)
+    db.commit()
+    with pytest.raises(NoAvailabilityError):
+        availability.claim(venue, dt, 4)
+    db.rollback()
+    assert availability.remaining(venue, dt) == 2
+
+    # Overlapping start times share slots; a later sitting does not
+    assert availability.remaining(venue, dt + timedelta(minutes=45)) == 2
+    assert availability.remaining(venue, dt + timedelta(minutes=90)) == 6
+
+    availability.release(venue.id, dt, 4)
+    db.commit()
+    assert availability.remaining(venue, dt) == 6
+
+
+def test_booking_fails_when_full(db, make_venue, session_id):
+    venue = make_venue(capacity=4)
+    service = ReservationService(db)
+    service.create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+    with pytest.raises(NoAvailabilityError):
+        service.create_reservation(session_id, venue.id, DINNER, 2, **CONTACT)
+
+
+def test_empty_and_negative_parties_are_refused(db, make_venue, session_id):
+    venue = make_venue(capacity=4)
+    service = ReservationService(db)
+    availability = AvailabilityEngine(db)
+    dt = parse_datetime(DINNER)
+    for party_size in (0, -4):
+        with pytest.raises(ValueError):
+            service.create_reservation(session_id, venue.id, DINNER, party_size, **CONTACT)
+        with pytest.raises(ValueError):
+            availability.claim(venue, dt, party_size)
+        with pytest.raises(ValueError):
+            availability.claim_batch([(venue, dt, party_size)])
+    db.rollback()
+
+    response = TestClient(app).post(
+        f"/api/reservations/create?session_id={session_id}",
+        json=dict(venue_id=venue.id, datetime=DINNER, party_size=-4,
+                  contact=dict(name="Ada Lovelace", phone="+1-555-0100", email="ada@example.com"))
+    )
+    assert response.status_code == 422
+
+    # A negative party used to lower the counters and let the venue overbook
+    service.create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+    with pytest.raises(NoAvailabilityError):
+        service.create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+    assert availability.remaining(venue, dt) == 0
+
+
+def test_hold_keeps_seats_and_converts_into_the_booking(db, make_venue, session_id):
+    venue = make_venue(capacity=4)
+    holds = HoldService(db)
+    hold_id = holds.create_hold(session_id, venue.id, DINNER, 4).id
+    availability = AvailabilityEngine(db)
+    assert availability.remaining(venue, parse_datetime(DINNER)) == 0
+
+    # Someone else can't book the held seats, but the holder can
+    with pytest.raises(NoAvailabilityError):
+        ReservationService(db).create_reservation("someone_else", venue.id, DINNER, 2, **CONTACT)
+    reservation = ReservationService(db).create_reservation(
+        session_id, venue.id, DINNER, 4, hold_id=hold_id, **CONTACT
+    )
+    assert reservation.status == "confirmed"
+    assert db.get(ReservationHold, hold_id) is None
+    assert availability.remaining(venue, parse_datetime(DINNER)) == 0
+
+
+def test_released_and_expired_holds_give_seats_back(db, make_venue, session_id):
+    venue = make_venue(capacity=4)
+    holds = HoldService(db)
+    availability = AvailabilityEngine(db)
+    dt = parse_datetime(DINNER)
+
+    released_id = holds.create_hold(session_id, venue.id, DINNER, 4).id
+    assert holds.release_hold(released_id)
+    assert not holds.release_hold(released_id)
+    assert availability.remaining(venue, dt) == 4
+
+    expiring = holds.create_hold(session_id, venue.id, DINNER, 4)
+    expiring_id = expiring.id
+    assert holds.expire_holds([expiring_id]) == 0
+    expiring.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert holds.get_active_hold(expiring_id) is None
+    assert holds.expire_holds([expiring_id]) == 1
+    assert availability.remaining(venue, dt) == 4
+
+
+def test_holds_and_waitlist_refuse_empty_parties(db, make_venue, session_id):
+    venue = make_venue(capacity=4)
+    ReservationService(db).create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+    for party_size in (0, -3):
+        with pytest.raises(ValueError):
+            HoldService(db).create_hold(session_id, venue.id, DINNER, party_size)
+        with pytest.raises(ValueError):
+            WaitlistService(db).join_waitlist(session_id, venue.id, DINNER, party_size, **CONTACT)
+    assert AvailabilityEngine(db).remaining(venue, parse_datetime(DINNER)) == 0
+
+    client = TestClient(app)
+    hold = client.post(
+        f"/api/reservations/holds?session_id={session_id}",
+        json=dict(venue_id=venue.id, datetime=DINNER, party_size=-3)
+    )
+    wait = client.post(
+        f"/api/reservations/waitlist?session_id={session_id}",
+        json=dict(venue_id=venue.id, datetime=DINNER, party_size=0,
+                  contact=dict(name="Ada Lovelace", phone="+1-555-0100", email="ada@example.com"))
+    )
+    assert hold.status_code == wait.status_code == 422
+    assert hold.json()["detail"][0]["loc"][-1] == wait.json()["detail"][0]["loc"][-1] == "party_size"
+
+
+def test_cancel_promotes_waiters_with_overlapping_times(db, make_venue, session_id):
+    venue = make_venue(capacity=4)
+    service = ReservationService(db)
+    booked = service.create_reservation(session_id, venue.id, DINNER, 4, **CONTACT)
+
+    waitlist = WaitlistService(db)
+    too_big = waitlist.join_waitlist("big", venue.id, "2030-06-14T19:00:00", 4, **CONTACT)
+    later = waitlist.join_waitlist("later", venue.id, "2030-06-14T19:15:00", 2, **CONTACT)
+    same_time = waitlist.join_waitlist("same", venue.id, "2030-06-14T19:00:00", 2, **CONTACT)
+    too_big.party_size = 5  # Outgrew the venue while waiting
+    db.commit()
+
+    assert service.cancel_reservation(booked.id)
+    db.expire_all()
+    assert db.get(WaitlistEntry, too_big.id).status == "waiting"
+    for entry in (later, same_time):
+        entry = db.get(WaitlistEntry, entry.id)
+        assert entry.status == "promoted"
+        promoted = db.get(Reservation, entry.reservation_id)
+        assert promoted.status == "confirmed"
+        assert promoted.datetime == entry.datetime
+    assert db.get(WaitlistEntry, later.id).reservation_id != db.get(WaitlistEntry, same_time.id).reservation_id
+
+
+def test_batch_books_what_fits_and_reports_the_rest(db, make_venue, session_id):
+    venue = make_venue(capacity=6)
+    item = dict(venue_id=venue.id, datetime_str=DINNER, party_size=2, notes=None, **CONTACT)
+    results = ReservationService(db).create_reservations_batch(session_id, [
+        item, item, item, item,
+        dict(item, venue_id="missing"),
+        dict(item, datetime_str="not a date"),
+    ])
+
+    booked = [r.reservation for r in results if r.reservation is not None]
+    assert len(booked) == 3
+    assert results[3].reservation is None and results[3].error
+    assert "not found" in results[4].error
+    assert "Invalid datetime" in results[5].error
+    assert len({r.booking_id for r in booked}) == 3
+    assert AvailabilityEngine(db).remaining(venue, parse_datetime(DINNER)) == 0
+
+
+def test_booking_ids_are_unique_and_self_checking():
+    ids = [booking_ids.next_id() for _ in range(5000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    for booking_id in ids[:50]:
+        assert is_valid(booking_id)
+        assert is_valid(booking_id.lower())
+        assert is_valid(booking_id[len("GF-"):].replace("-", ""))
+        body = booking_id[len("GF-"):]
+        typo = ALPHABET[(ALPHABET.index(body[0]) + 1) % 32] + body[1:]
+        assert not is_valid("GF-" + typo)
+
+
+def _run_fresh(script: str) -> str:
+    """
+    Run a script in a new interpreter against the test database
+    """
+    env = dict(os.environ, DATABASE_URL=TEST_DATABASE_URL, SMTP_ENABLED="false")
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(script)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=20
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_fresh_process_batch_and_cancel_do_not_lock_up(db, make_venue):
+    # The first booking ID a process mints leases its node. Doing that while
+    # the booking transaction holds the SQLite write lock used to hang until
+    # "database is locked".
+    venue = make_venue(capacity=4)
+    booked = ReservationService(db).create_reservation("first", venue.id, DINNER, 4, **CONTACT)
+    WaitlistService(db).join_waitlist("waiting", venue.id, DINNER, 4, **CONTACT)
+    parent_id = booking_ids.next_id()
+
+    out = _run_fresh(f"""
+        from app.database import SessionLocal
+        from app.services.reservation_service import ReservationService
+        results = ReservationService(SessionLocal()).create_reservations_batch("fresh", [
+            dict(venue_id={venue.id!r}, datetime_str="2030-06-15T19:00:00", party_size=2,
+                 contact_name="A", contact_phone="1", contact_email="a@example.com", notes=None)
+        ])
+        print(results[0].reservation.booking_id)
+    """)
+    assert out.strip() and out.strip() != parent_id
+
+    _run_fresh(f"""
+        from app.database import SessionLocal
+        from app.services.reservation_service import ReservationService
+        assert ReservationService(SessionLocal()).cancel_reservation({booked.id!r})
+    """)
+    db.expire_all()
+    promoted = db.query(WaitlistEntry).filter(WaitlistEntry.session_id == "waiting").one()
+    assert promoted.status == "promoted"
+
+
+def test_idempotent_create_replays_the_first_response(db, make_venue, session_id):
+    venue = make_venue(capacity=10)
+    client = TestClient(app)
+    body = dict(
+        venue_id=venue.id,
+        datetime=DINNER,
+        party_size=2,
+        contact=dict(name="Ada Lovelace", phone="+1-555-0100", email="ada@example.com")
+    )
+    headers = {"Idempotency-Key": "retry-me"}
+    url = f"/api/reservations/create?session_id={session_id}"
+
+    first = client.post(url, json=body, headers=headers)
+    again = client.post(url, json=body, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json()
+    assert again.headers.get("Idempotent-Replayed") == "true"
+    assert db.query(Reservation).filter(Reservation.session_id == session_id).count() == 1
+
+    different = client.post(url, json=dict(body, party_size=3), headers=headers)
+    assert different.status_code == 422
+
+
+def test_an_expired_idempotency_key_can_be_used_again(db, make_venue, session_id):
+    venue = make_venue(capacity=10)
+    client = TestClient(app)
+    body = dict(
+        venue_id=venue.id,
+        datetime=DINNER,
+        party_size=2,
+        contact=dict(name="Ada Lovelace", phone="+1-555-0100", email="ada@example.com")
+    )
+    headers = {"Idempotency-Key": "reused-later"}
+    url = f"/api/reservations/create?session_id={session_id}"
+    first = client.post(url, json=body, headers=headers)
+    assert first.status_code == 200
+
+    # The key expires, but the purge has run recently and leaves the row behind
+    key = f"create:{session_id}:reused-later"
+    db.get(IdempotencyKey, key).expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    idempotency_store._cache.pop(key)
+    idempotency_store._purged_at = time.monotonic()
+
+    again = client.post(url, json=dict(body, party_size=3), headers=headers)
+    assert again.status_code == 200
+    assert again.json()["id"] != first.json()["id"]
+    assert again.headers.get("Idempotent-Replayed") is None
+    db.expire_all()
+    assert db.get(IdempotencyKey, key).expires_at > datetime.utcnow()
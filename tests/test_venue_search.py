@@ -0,0 +1,217 @@
+"""
+Venue search: the in-memory index and the SQL fallback must agree
+"""
+import asyncio
+import uuid
+
+from sqlalchemy import delete, update
+
+from app.agent.agent import Agent
+from app.config import settings
+from app.database import CATALOG_VERSION, Venue, bump_counter, engine
+from app.services.catalog import catalog_version
+from app.services.geo import KM_PER_DEGREE_LAT, haversine_km
+from app.services.venue_service import VenueService, search_cache
+
+
+def _city() -> str:
+    return f"City {uuid.uuid4().hex[:8]}"
+
+
+def _both_paths(db, monkeypatch, **filters):
+    """
+    Run a search through the index and through SQL; returns both id lists
+    """
+    service = VenueService(db)
+    found = []
+    for enabled in (True, False):
+        monkeypatch.setattr(settings, "venue_index_enabled", enabled)
+        found.append([v.id for v in service.search_venues(limit=100, **filters)])
+    return found
+
+
+def _catalog(make_venue, city):
+    """
+    A small city whose venues differ in every filterable way
+    """
+    late = {day: "17:00-23:30" for day in ("monday", "tuesday", "wednesday", "thursday", "friday")}
+    specs = [
+        dict(cuisine=["Italian"], tags=["romantic", "patio"], rating=4.8, price_tier=3, capacity=40),
+        dict(cuisine=["Italian", "Pizza"], tags=["family"], rating=4.1, price_tier=1, capacity=8),
+        dict(cuisine=["Thai"], tags=["patio"], rating=4.1, price_tier=2, capacity=20, operating_hours=late),
+        dict(cuisine=["Japanese"], tags=["Romantic"], rating=3.2, price_tier=3, capacity=4),
+        dict(cuisine=["thai "], tags=[], rating=None, price_tier=2, capacity=60),
+    ]
+    return [make_venue(city=city, **spec).id for spec in specs]
+
+
+def test_index_and_sql_agree_on_filtered_searches(db, make_venue, monkeypatch):
+    city = _city()
+    italian, pizza, thai, japanese, unrated = _catalog(make_venue, city)
+    for filters, expected in [
+        (dict(), [italian, *sorted([pizza, thai]), japanese, unrated]),  # Rating ties go by id
+        (dict(cuisine="Italian"), [italian, pizza]),
+        (dict(cuisine="thai"), [thai, unrated]),
+        (dict(tags=["romantic"]), [italian, japanese]),
+        (dict(tags=["patio", "Romantic"]), [italian]),
+        (dict(party_size=10), [italian, thai, unrated]),
+        (dict(price_tier=2, cuisine="THAI"), [thai, unrated]),
+        (dict(open_at="2030-06-03T12:00:00"), [italian, pizza, japanese, unrated]),  # A Monday
+        (dict(open_at="2030-06-08T22:00:00"), [italian, pizza, japanese, unrated]),  # A Saturday
+        (dict(open_at="2030-06-04T23:00:00", party_size=10), [italian, thai, unrated]),
+    ]:
+        found = _both_paths(db, monkeypatch, city=city, **filters)
+        assert found == [expected, expected], filters
+
+
+def test_index_and_sql_page_the_same_way(db, make_venue, monkeypatch):
+    city = _city()
+    _catalog(make_venue, city)
+    service = VenueService(db)
+    walks = []
+    for enabled in (True, False):
+        monkeypatch.setattr(settings, "venue_index_enabled", enabled)
+        seen, cursor = [], None
+        while True:
+            page = service.search_venues_page(limit=2, cursor=cursor, city=city)
+            seen.append([v.id for v in page.items])
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        walks.append(seen)
+    assert walks[0] == walks[1]
+    assert [len(page) for page in walks[0]] == [2, 2, 1]
+
+
+def test_nearby_searches_agree_and_come_nearest_first(db, make_venue, monkeypatch):
+    city = _city()
+    lat, lon = 60.17, 24.94
+    near = {
+        km: make_venue(city=city, latitude=lat + km / KM_PER_DEGREE_LAT, longitude=lon, capacity=capacity).id
+        for km, capacity in ((0.5, 4), (2.0, 30), (8.0, 30), (15.0, 30))
+    }
+
+    point = dict(city=city, latitude=lat, longitude=lon)
+    assert _both_paths(db, monkeypatch, **point) == [[near[0.5], near[2.0], near[8.0]]] * 2
+    assert _both_paths(db, monkeypatch, radius_km=20, **point) == [list(near.values())] * 2
+    assert _both_paths(db, monkeypatch, radius_km=3, party_size=10, **point) == [[near[2.0]]] * 2
+
+    [first] = VenueService(db).search_venues(radius_km=1, **point)
+    assert first.distance_km == round(haversine_km(lat, lon, first.latitude, first.longitude), 2) == 0.5
+
+
+def _reference_score(venue, prefs, party_size):
+    """
+    The ranking formula, one venue at a time
+    """
+    weights = dict(rating=1.0, price=0.3, cuisine=0.5, tags=0.5, capacity=0.2)
+    cuisines = {c.strip().lower() for c in venue.cuisine}
+    tags = {t.strip().lower() for t in venue.tags}
+    wanted = {t.lower() for t in prefs["tags"]}
+    parts = dict(
+        rating=(venue.rating or 0.0) / 5.0,
+        price=1.0 - abs(venue.price_tier - prefs["price_tier"]) / 3.0,
+        cuisine=float(any(c.lower() in cuisines for c in prefs["cuisines"])),
+        tags=len(wanted & tags) / len(wanted),
+        capacity=min(max(1.0 - party_size / venue.capacity, 0.0), 1.0),
+    )
+    return sum(weights[name] * value for name, value in parts.items()) / sum(weights.values())
+
+
+def test_recommendations_score_like_the_reference_formula(db, make_venue):
+    city = _city()
+    _catalog(make_venue, city)
+    # Enough distinct tags that the wanted one sits past the first 64-bit word
+    many_tags = [f"tag {i:03d}" for i in range(80)]
+    make_venue(city=city, cuisine=["Thai"], tags=many_tags, rating=3.9, price_tier=1, capacity=12)
+
+    prefs = dict(price_tier=1, cuisines=["Thai"], tags=["patio", "tag 079"])
+    ranked = VenueService(db).recommend_venues(city=city, party_size=2, prefs=prefs, limit=3)
+    venues = db.query(Venue).filter(Venue.city == city).all()
+    expected = sorted(
+        ((round(_reference_score(v, prefs, 2), 4), v.id) for v in venues if v.capacity >= 2),
+        key=lambda scored: -scored[0]
+    )
+    assert [(v.score, v.id) for v in ranked] == expected[:3]
+
+    # price_tier as an argument is a filter, not a preference
+    filtered = VenueService(db).recommend_venues(city=city, price_tier=3, prefs=prefs)
+    assert {v.price_tier for v in filtered} == {3} and len(filtered) == 2
+
+
+def test_bulk_updates_reach_both_search_paths(db, make_venue, monkeypatch):
+    city = _city()
+    thai = make_venue(city=city, cuisine=["Thai"], tags=["cosy"], rating=4.5)
+    other = make_venue(city=city, cuisine=["Thai"], rating=3.0)
+    thai_id, other_id = thai.id, other.id
+    VenueService(db).search_venues(city=city)  # Build the index first
+
+    db.execute(update(Venue).where(Venue.id == thai_id).values(cuisine=["Greek"], tags=["patio"]))
+    db.query(Venue).filter(Venue.id == other_id).update({"rating": 4.9})
+    db.commit()
+
+    assert _both_paths(db, monkeypatch, city=city, cuisine="greek") == [[thai_id], [thai_id]]
+    assert _both_paths(db, monkeypatch, city=city, cuisine="thai") == [[other_id], [other_id]]
+    assert _both_paths(db, monkeypatch, city=city, tags=["patio"]) == [[thai_id], [thai_id]]
+    assert _both_paths(db, monkeypatch, city=city, tags=["cosy"]) == [[], []]
+    assert _both_paths(db, monkeypatch, city=city) == [[other_id, thai_id], [other_id, thai_id]]
+
+    db.execute(update(Venue), [{"id": other_id, "is_active": False}])
+    db.execute(delete(Venue).where(Venue.id == thai_id))
+    db.commit()
+    assert _both_paths(db, monkeypatch, city=city) == [[], []]
+
+
+def test_text_search_ranks_by_relevance_within_the_filters(db, make_venue, monkeypatch):
+    city = _city()
+    lat, lon = 48.85, 2.35
+    in_name = make_venue(
+        city=city, name="Sushi Kaito", cuisine=["Japanese"], rating=3.5, latitude=lat, longitude=lon
+    ).id
+    in_description = make_venue(
+        city=city, name="Harbour Table", description="Seafood, with sushi on Fridays", rating=4.9,
+        latitude=lat + 30 / 111.32, longitude=lon
+    ).id
+    make_venue(city=city, name="Pasta Bar", description="Fresh pasta daily", rating=5.0)
+
+    for text in ("sushi", "Sush", "the sushi"):
+        assert _both_paths(db, monkeypatch, city=city, text=text) == [[in_name, in_description]] * 2, text
+    assert _both_paths(db, monkeypatch, city=city, text="sushi", cuisine="japanese") == [[in_name]] * 2
+    near = dict(city=city, text="sushi", latitude=lat, longitude=lon, radius_km=5)
+    assert _both_paths(db, monkeypatch, **near) == [[in_name]] * 2
+
+    # Only stopwords: an ordinary best-rated-first search
+    assert len(_both_paths(db, monkeypatch, city=city, text="the")[0]) == 3
+
+
+def test_search_cache_follows_the_catalog_version(db, make_venue, monkeypatch):
+    monkeypatch.setattr(settings, "search_cache_enabled", True)
+    monkeypatch.setattr(catalog_version, "poll_seconds", 0)
+    city = _city()
+    first = make_venue(city=city, rating=4.0).id
+    service = VenueService(db)
+    search = lambda: [v.id for v in service.search_venues(city=city)]
+    assert search() == [first]
+    assert search() == [first]
+
+    # A write in this process moves the version at commit
+    second = make_venue(city=city, rating=4.5).id
+    assert search() == [second, first]
+
+    # So does one from another process, seen on the next poll
+    with engine.begin() as connection:
+        connection.execute(update(Venue.__table__).where(Venue.__table__.c.id == first).values(rating=5.0))
+        bump_counter(connection, CATALOG_VERSION)
+    assert search() == [first, second]
+
+
+def test_open_now_searches_share_a_cache_entry(db, make_venue, session_id, monkeypatch):
+    monkeypatch.setattr(settings, "search_cache_enabled", True)
+    city = _city()
+    make_venue(city=city, operating_hours={})  # Always open
+    search_cache.clear()
+    agent = Agent(db)
+    call = dict(name="search_venues", arguments=dict(city=city, open_now=True))
+    for _ in range(3):
+        assert len(asyncio.run(agent._execute_tool(call, session_id))["venues"]) == 1
+    assert len(search_cache) == 1